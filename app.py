@@ -2,7 +2,7 @@ from dash import html, dcc, Input, Output, State, callback_context
 import dash_bootstrap_components as dbc
 import dash
 import os
-from flask import send_from_directory, Response
+from flask import send_from_directory, Response, jsonify
 
 from load_data import data
 from pages.home import home_page, navbar, sidebar_content, sidebar
@@ -14,6 +14,10 @@ from pages.demographics import demographics_callbacks, demographics_layout
 from pages.methodology import methodology_layout
 from pages.about import about_layout
 from utils import generate_sitemap
+from figure_cache import init_figure_cache, prerender
+from query_vectors.cache import embedding_cache, response_cache
+from query_vectors.single_flight import single_flight
+from query_vectors import embedding_micro_batcher
 
 # Initialize the app
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.LUX,
@@ -24,6 +28,9 @@ app.title = "Parleh-mate!"
 
 server = app.server  # Expose the Flask app as a variable
 
+# Server-side cache of the chart figures, keyed by callback inputs and data snapshot version
+init_figure_cache(server)
+
 # Route for robots.txt
 @server.route('/robots.txt')
 def robots():
@@ -145,6 +152,21 @@ def sitemap():
     sitemap_xml = generate_sitemap()
     return Response(sitemap_xml, mimetype='application/xml')
 
+# Route reporting the active data snapshot and how long it took to load
+@server.route('/snapshot-status', methods=['GET'])
+def snapshot_status():
+    return jsonify(data.status())
+
+# Route reporting hit rates of the query caches in this worker
+@server.route('/cache-status', methods=['GET'])
+def cache_status():
+    return jsonify({
+        'embeddings': embedding_cache.stats(),
+        'responses': response_cache.stats(),
+        'single_flight': single_flight.stats(),
+        'embedding_batches': embedding_micro_batcher.stats() if embedding_micro_batcher is not None else None
+    })
+
 # Callback to control page visibility
 @app.callback(
     [i for i in page_outputs.values()],
@@ -185,6 +207,9 @@ member_metrics_callbacks(app, data)
 topics_questions_callbacks(app, data)
 demographics_callbacks(app, data)
 
+# a snapshot picked up by the refresher gets its figures pre-rendered before it goes live
+data.before_swap.append(lambda snapshot: prerender(server, snapshot))
+
 # Run the app
 if __name__ == "__main__" and os.environ.get('ENVIRONMENT') == 'development':
     app.run_server(debug=True)
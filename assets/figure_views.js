@@ -0,0 +1,120 @@
+// assets/figure_views.js
+
+// Builds chart figures in the browser from the aggregated arrays the server stores once per selection
+// (see utils/figure_views.py) and the plotly template sent once with the page layout, so switching
+// between views of the same data needs no server round trip.
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    figure_views: {
+        // horizontal stacked bars per party, as counts or as percentages of each party's total
+        bar_view: function(data, view, template) {
+            if (!data) {
+                return window.dash_clientside.no_update;
+            }
+            var percentage = view === 'percentage';
+            var totals = new Array(data.categories.length).fill(0);
+
+            var traces = data.parties.map(function(party) {
+                var partyTotal = party.count.reduce(function(a, b) { return a + b; }, 0);
+                var x = party.count.map(function(count) {
+                    return percentage ? count * 100 / partyTotal : count;
+                });
+                party.category.forEach(function(category, i) {
+                    totals[category] += x[i];
+                });
+                return {
+                    type: 'bar',
+                    orientation: 'h',
+                    name: party.name,
+                    legendgroup: party.name,
+                    marker: {color: party.colour},
+                    x: x,
+                    y: party.category.map(function(category) { return data.categories[category]; }),
+                    hovertemplate: '<b>%{y}</b><br>Party: ' + party.name + '<br>' +
+                        data.hover_labels[view] + (percentage ? ': %{x:.1f}' : ': %{x}') + '<extra></extra>'
+                };
+            });
+
+            // categories in ascending order of their total, so the largest bar is at the top
+            var order = data.categories.map(function(_, i) { return i; });
+            order.sort(function(a, b) { return totals[a] - totals[b]; });
+
+            return {
+                data: traces,
+                layout: {
+                    template: template,
+                    barmode: 'relative',
+                    height: 600,
+                    title: {text: data.title},
+                    legend: {title: {text: 'Party'}, yanchor: 'bottom', y: 0, xanchor: 'right', x: 0.99},
+                    margin: {l: 0, r: 0, t: 80},
+                    xaxis: {title: {text: data.value_titles[view]}, showgrid: true, gridwidth: 1, gridcolor: 'LightGray'},
+                    yaxis: {
+                        title: {text: data.category_title},
+                        categoryorder: 'array',
+                        categoryarray: order.map(function(i) { return data.categories[i]; }),
+                        tickfont: {size: 10}
+                    }
+                }
+            };
+        },
+
+        // age distribution per party, as 5 year histograms in percent or as the precomputed density curves
+        age_view: function(data, view, template) {
+            if (!data) {
+                return window.dash_clientside.no_update;
+            }
+            var traces;
+            if (view === 'density') {
+                traces = data.densities.map(function(curve) {
+                    return {
+                        type: 'scatter',
+                        mode: 'lines',
+                        name: curve.name,
+                        line: {color: curve.colour, width: 2},
+                        fill: 'tozeroy',
+                        x: curve.y.map(function(_, i) { return curve.x0 + i * curve.dx; }),
+                        y: curve.y,
+                        hovertemplate: '<b>Age:</b> %{x:.0f}<br><b>Party:</b> ' + curve.name + '<extra></extra>'
+                    };
+                });
+            } else {
+                traces = data.parties.map(function(party) {
+                    return {
+                        type: 'histogram',
+                        name: party.name,
+                        marker: {color: party.colour},
+                        opacity: 0.75,
+                        histnorm: 'percent',
+                        xbins: {size: 5},
+                        x: party.ages,
+                        hovertemplate: '<b>Year Age Entered:</b> %{x}<br><b>Percentage:</b> %{y:.1f}<extra></extra>'
+                    };
+                });
+            }
+
+            var yaxis = view === 'density' ?
+                {title: {text: 'Density'}, ticks: '', showticklabels: false} :
+                {title: {text: 'Percentage'}};
+
+            return {
+                data: traces,
+                layout: {
+                    template: template,
+                    barmode: 'group',
+                    title: {text: 'Age Distribution by Party'},
+                    margin: {l: 0, r: 0},
+                    legend: {title: {text: 'Party'}, yanchor: 'top', y: 0.99, xanchor: 'left', x: 0.01},
+                    xaxis: {
+                        title: {text: 'Year-age at first sitting'},
+                        tick0: data.ticks.tick0,
+                        dtick: 5,
+                        tickvals: data.ticks.tickvals,
+                        range: data.ticks.range
+                    },
+                    yaxis: yaxis
+                }
+            };
+        }
+    }
+});
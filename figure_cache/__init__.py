@@ -0,0 +1,175 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g
+from flask_caching import Cache
+from flask_caching.backends.base import BaseCache
+from plotly.utils import PlotlyJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+# memory budget for the serialized figures of all pages, per worker
+figure_cache_max_bytes = int(os.environ.get('FIGURE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+
+class LRUMemoryCache(BaseCache):
+    # in-process LRU bounded by the total size in bytes of the stored (serialized) values rather than an entry
+    # count; values are bytes
+    def __init__(self, default_timeout=0, max_bytes=figure_cache_max_bytes):
+        super().__init__(default_timeout)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs['max_bytes'] = config.get('CACHE_MAX_BYTES', figure_cache_max_bytes)
+        return cls(*args, **kwargs)
+
+    def _expiry(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout else None
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        if len(value) > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._expiry(timeout), value)
+            self._bytes += len(value)
+            # evict least recently used entries until the budget fits again
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return True
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+
+    def has(self, key):
+        return self.get(key) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        return True
+
+
+cache = Cache()
+
+
+def init_figure_cache(server):
+    cache.init_app(server, config={
+        'CACHE_TYPE': 'figure_cache.LRUMemoryCache',
+        'CACHE_DEFAULT_TIMEOUT': 0,
+        'CACHE_MAX_BYTES': figure_cache_max_bytes
+    })
+
+
+# figure callbacks by name, with the input tuples to render ahead of time (see figure_cache.prerender)
+figure_builders = {}
+
+
+def prerendered_path(snapshot, name, args):
+    # pre-rendered figures live next to the data snapshot they were built from
+    digest = hashlib.sha1(json.dumps(list(args)).encode()).hexdigest()
+    return os.path.join(snapshot.path, 'figures', name, f"{digest}.json")
+
+
+def write_prerendered(snapshot, name, args, output):
+    path = prerendered_path(snapshot, name, args)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(output, f, cls=PlotlyJSONEncoder)
+    os.replace(tmp_path, path)
+
+
+def prerender(server, snapshot):
+    # renders every figure_builders input tuple for the snapshot, skipping figures already on disk. The first
+    # worker to get here renders, the others wait on the lock and then find the files written
+    directory = os.path.join(snapshot.path, 'figures')
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # a request context pinned to the snapshot, which need not be the live one yet
+        with server.test_request_context():
+            g.data_snapshot = snapshot
+            for name, (func, inputs) in figure_builders.items():
+                start = time.perf_counter()
+                missing = [args for args in inputs if not os.path.exists(prerendered_path(snapshot, name, args))]
+                for args in missing:
+                    write_prerendered(snapshot, name, args, func(*args))
+                logger.info("%s: pre-rendered %d figures in %.2fs", name, len(missing), time.perf_counter() - start)
+
+
+def _read_prerendered(snapshot, name, args):
+    try:
+        with open(prerendered_path(snapshot, name, args), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def cached_figure(name, data, prerender=()):
+    # caches a figure callback's serialized output per input tuple and data snapshot version; figures of a
+    # replaced snapshot are no longer looked up and age out of the LRU
+    def decorator(func):
+        figure_builders[name] = (func, list(prerender))
+
+        @wraps(func)
+        def wrapper(*args):
+            snapshot = data.snapshot()
+            key = json.dumps([name, snapshot.version, args])
+            payload = cache.get(key)
+            if payload is not None:
+                return json.loads(payload)
+
+            # served straight from disk when the figure was rendered at build time
+            payload = _read_prerendered(snapshot, name, args)
+            if payload is not None:
+                cache.set(key, payload)
+                return json.loads(payload)
+
+            output = func(*args)
+            cache.set(key, json.dumps(output, cls=PlotlyJSONEncoder).encode())
+            return output
+
+        return wrapper
+
+    return decorator
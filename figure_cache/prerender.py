@@ -0,0 +1,19 @@
+# Renders the default and most common chart figures of every page for the active data snapshot
+# and writes them next to it, so first paint after a deploy does not wait on a worker.
+#
+#   python -m figure_cache.prerender
+#
+# Run it as part of the build, with DATA_SNAPSHOT_DIR pointing at a directory that is kept for runtime.
+# Snapshots swapped in later by the refresher are pre-rendered by the worker before the swap (see app.py).
+
+import logging
+
+from app import server, data
+from figure_cache import prerender
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    snapshot = data.snapshot()
+    prerender(server, snapshot)
+    print(f"pre-rendered figures for snapshot {snapshot.version}")
@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from query_vectors.cache import SQLiteStore, query_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# threads running pipeline jobs in each worker
+job_workers = int(os.environ.get('JOB_WORKERS', 8))
+
+# concurrent jobs allowed inside a stage per worker, e.g. "embedding=8,search=8,summary=4"; unlisted stages are unbounded
+job_stage_concurrency = {
+    stage: int(limit)
+    for stage, limit in (i.split('=') for i in os.environ.get('JOB_STAGE_CONCURRENCY', 'embedding=8,search=8,summary=4').split(',') if i)
+}
+
+# a job that has not reported progress for this long is treated as lost (e.g. its worker was restarted)
+job_timeout_seconds = int(os.environ.get('JOB_TIMEOUT_SECONDS', 300))
+
+# partial results are written to the store at most this often
+job_publish_interval_seconds = 0.2
+
+job_ttl_seconds = 3600
+job_max_entries = 10000
+
+
+class JobStore(SQLiteStore):
+    # job state in a sqlite file, so whichever worker a poll lands on can report a job started by another
+    schema = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            stage TEXT,
+            stages TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_last_used ON jobs (last_used);
+    """
+    table = "jobs"
+
+    def __init__(self, path, max_entries=job_max_entries, ttl_seconds=job_ttl_seconds):
+        super().__init__(path, max_entries, ttl_seconds)
+
+    def create(self, job_id):
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO jobs (id, status, stages, created, last_used) VALUES (?, 'queued', '[]', ?, ?)",
+            (job_id, now, now)
+        )
+        self._inserted()
+
+    def update(self, job_id, **fields):
+        # last_used doubles as the heartbeat checked against job_timeout_seconds
+        fields = {k: json.dumps(v) if k in ('stages', 'result') else v for k, v in fields.items()}
+        assignments = ', '.join(f"{k} = ?" for k in fields)
+        self._connection().execute(
+            f"UPDATE jobs SET {assignments}, last_used = ? WHERE id = ?", (*fields.values(), time.time(), job_id)
+        )
+
+    def get(self, job_id):
+        row = self._connection().execute(
+            "SELECT status, stage, stages, result, error, last_used FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        status, stage, stages, result, error, last_used = row
+        if status in ('queued', 'running') and time.time() - last_used > job_timeout_seconds:
+            status, error = 'failed', 'The request timed out.'
+        return {
+            'status': status,
+            'stage': stage,
+            'stages': json.loads(stages),
+            'result': json.loads(result) if result is not None else None,
+            'error': error
+        }
+
+
+class Job:
+    # handed to the job function to report which stage it is in, and any partial result
+    def __init__(self, job_id, store, limits):
+        self.id = job_id
+        self._store = store
+        self._limits = limits
+        self.stages = []
+        self._published = 0
+
+    def publish(self, partial_result):
+        # shown by the page while the job is still running; throttled so a fast stream does not hammer sqlite
+        now = time.monotonic()
+        if now - self._published >= job_publish_interval_seconds:
+            self._store.update(self.id, result=partial_result)
+            self._published = now
+
+    @contextmanager
+    def stage(self, name):
+        limit = self._limits.get(name)
+        if limit is not None:
+            limit.acquire()
+        try:
+            self._store.update(self.id, status='running', stage=name, stages=self.stages)
+            yield
+            self.stages.append(name)
+        finally:
+            if limit is not None:
+                limit.release()
+
+
+class JobRunner:
+    # runs job functions on a thread pool in this worker, so callbacks can return as soon as a job is queued
+    def __init__(self, store, workers=job_workers, stage_concurrency=job_stage_concurrency):
+        self.store = store
+        self._workers = workers
+        self._limits = {stage: threading.BoundedSemaphore(limit) for stage, limit in stage_concurrency.items()}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # created on first use, i.e. after gunicorn has forked the worker
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='job')
+            return self._executor
+
+    def _run(self, job_id, func, args):
+        job = Job(job_id, self.store, self._limits)
+        try:
+            result = func(job, *args)
+        except Exception as e:
+            logger.exception("job %s failed", job_id)
+            self.store.update(job_id, status='failed', stage=None, error=str(e))
+        else:
+            self.store.update(job_id, status='done', stage=None, stages=job.stages, result=result)
+
+    def submit(self, func, *args):
+        # func(job, *args) must return something JSON serializable
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id)
+        self._pool().submit(self._run, job_id, func, args)
+        return job_id
+
+    def status(self, job_id):
+        return self.store.get(job_id)
+
+
+job_runner = JobRunner(JobStore(os.path.join(query_cache_dir, 'jobs.sqlite')))
@@ -1,37 +1,60 @@
-from google.cloud import storage
-import pickle
 import os
 
+import pandas as pd
 from dotenv import load_dotenv
 
+from .snapshot_store import GCSSource, LocalSource
+from .snapshot import LiveSnapshot
+from .refresher import load_snapshot, start_refresher
+
 load_dotenv()
 
-if os.environ.get('ENVIRONMENT') == 'development':
+# copy-on-write: frames derived from the shared snapshot tables (filters, column selections, assign...) are
+# zero-copy views until written to, and a write to one never reaches the table it came from
+pd.set_option('mode.copy_on_write', True)
+
+# local directory where the columnar snapshot is kept and memory-mapped by all workers
+snapshot_root = os.environ.get('DATA_SNAPSHOT_DIR', '/tmp/dash-snapshot')
+
+# blob holding the pickled datasets; DATA_SOURCE_DIR points at a local directory standing in for the bucket
+data_bucket = "dash-app-cache"
+data_blob = "dash-datasets"
 
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "tokens/gcp_token.json"
+if os.environ.get('DATA_SOURCE_DIR'):
+
+    source = LocalSource(os.environ['DATA_SOURCE_DIR'], data_blob)
 
 else:
 
-    credentials_json = os.environ.get('GCP_JSON')
+    if os.environ.get('ENVIRONMENT') == 'development':
+
+        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "tokens/gcp_token.json"
+
+    else:
+
+        credentials_json = os.environ.get('GCP_JSON')
+
+        if not credentials_json:
+            raise EnvironmentError("The GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.")
+
+        credentials_path = '/tmp/gcp_token.json'
+
+        with open(credentials_path, 'w') as f:
+            f.write(credentials_json)
 
-    if not credentials_json:
-        raise EnvironmentError("The GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.")
+        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
 
-    credentials_path = '/tmp/gcp_token.json'
-    
-    with open(credentials_path, 'w') as f:
-        f.write(credentials_json)
+    source = GCSSource(data_bucket, data_blob)
 
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
-    
+# tables loaded before the worker accepts traffic, e.g. DATA_WARM_TABLES=member_metrics,demographics;
+# every other table is mapped on first access
+warm_tables = [i.strip() for i in os.environ.get('DATA_WARM_TABLES', '').split(',') if i.strip()]
 
-# Initialize the GCS client
-storage_client = storage.Client()
-bucket = storage_client.bucket("dash-app-cache")
-blob = bucket.blob("dash-datasets")
+# seconds between checks of the blob for a new snapshot; 0 disables hot reloading
+refresh_seconds = int(os.environ.get('DATA_REFRESH_SECONDS', 600))
 
-# Download the serialized data
-serialized_data = blob.download_as_bytes()
+# download only if the local snapshot is missing or stale
+data = LiveSnapshot(*load_snapshot(source, snapshot_root, warm_tables))
 
-# Deserialize the data back into a dictionary
-data = pickle.loads(serialized_data)
\ No newline at end of file
+if refresh_seconds > 0:
+    start_refresher(data, source, snapshot_root, warm_tables, refresh_seconds)
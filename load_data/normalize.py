@@ -0,0 +1,91 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from utils import parliament_code, missing_parliament_code
+
+logger = logging.getLogger(__name__)
+
+# columns stored as categoricals with one dictionary per column name, shared by every table that has the
+# column, so the same member or party has the same code everywhere and each worker holds the strings once
+shared_categorical_columns = ['member_name', 'member_party', 'member_constituency', 'topic_assigned', 'ministry_addressed']
+
+# integer columns whose values fit are stored as int16
+small_int_dtype = np.int16
+
+
+def shared_dictionaries(tables):
+    # column -> sorted distinct values across all tables; sorted so codes do not depend on row order
+    values = {}
+    for table in tables.values():
+        if not isinstance(table, pd.DataFrame):
+            continue
+        for column in shared_categorical_columns:
+            if column in table.columns:
+                values.setdefault(column, set()).update(table[column].dropna().unique())
+    return {column: pd.CategoricalDtype(sorted(v)) for column, v in values.items()}
+
+
+def _downcast(series):
+    dtype = series.dtype
+    if not isinstance(dtype, np.dtype):
+        return series
+    if dtype.kind == 'f' and dtype.itemsize > 4:
+        return series.astype(np.float32)
+    if dtype.kind in 'iu' and dtype.itemsize > 2 and len(series):
+        info = np.iinfo(small_int_dtype)
+        if info.min <= series.min() and series.max() <= info.max:
+            return series.astype(small_int_dtype)
+    return series
+
+
+def _parliament_codes(series, table):
+    # '12' / 12 / 'All' / missing -> 12 / 12 / 0 / -1; anything else fails the publish with the offending values
+    missing = series.isna()
+    if missing.any():
+        logger.warning("table %s: %d rows without a parliament, coded %d", table, missing.sum(), missing_parliament_code)
+
+    codes, invalid = {}, []
+    for value in series[~missing].unique():
+        try:
+            codes[value] = parliament_code(value)
+        except (TypeError, ValueError):
+            invalid.append(value)
+    if invalid:
+        raise ValueError(f"table {table}: unrecognised parliament values {invalid[:10]}")
+
+    return series.map(codes).fillna(missing_parliament_code).astype(small_int_dtype)
+
+
+def normalize_table(df, dictionaries, table=None):
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        if name == 'parliament':
+            series = _parliament_codes(series, table)
+        elif name in dictionaries:
+            series = series.astype(dictionaries[name])
+        else:
+            series = _downcast(series)
+        columns[name] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def memory_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def normalize_tables(tables):
+    # (normalized tables, shared dictionaries, {table: {'before': bytes, 'after': bytes}})
+    dictionaries = shared_dictionaries(tables)
+    normalized = {}
+    memory = {}
+    for name, table in tables.items():
+        if not isinstance(table, pd.DataFrame):
+            normalized[name] = table
+            continue
+        normalized[name] = normalize_table(table, dictionaries, name)
+        memory[name] = {'before': memory_bytes(table), 'after': memory_bytes(normalized[name])}
+        logger.info("normalized table %s: %d -> %d bytes", name, memory[name]['before'], memory[name]['after'])
+    return normalized, dictionaries, memory
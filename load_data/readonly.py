@@ -0,0 +1,68 @@
+import os
+
+import pandas as pd
+
+# with DATA_READONLY_DEBUG=1 snapshot tables raise on any in-place write, to find callbacks that mutate
+# shared data; otherwise copy-on-write alone keeps writes to derived frames from reaching the snapshot
+readonly_debug = os.environ.get('DATA_READONLY_DEBUG', '') not in ('', '0')
+
+
+class SnapshotWriteError(RuntimeError):
+    pass
+
+
+def _refuse(*args, **kwargs):
+    raise SnapshotWriteError("data snapshot tables are read-only; derive a new frame instead, e.g. with .assign()")
+
+
+class _ReadOnlyIndexer:
+    # .loc / .iloc / .at / .iat of a read-only table: reads pass through, assignments raise
+    def __init__(self, indexer):
+        self._indexer = indexer
+
+    def __getitem__(self, key):
+        return self._indexer[key]
+
+    __setitem__ = _refuse
+
+    def __call__(self, *args, **kwargs):
+        return _ReadOnlyIndexer(self._indexer(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._indexer, name)
+
+
+class ReadOnlyFrame(pd.DataFrame):
+    # a snapshot table in debug mode. Frames derived from it (filters, assign, groupby...) are plain
+    # DataFrames owned by the caller, so only writes to the shared table itself raise.
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+    __setitem__ = __delitem__ = _refuse
+    insert = pop = update = _refuse
+    # path of every inplace=True method, and of assigning .index / .columns
+    _update_inplace = _set_axis = _refuse
+
+    @property
+    def loc(self):
+        return _ReadOnlyIndexer(super().loc)
+
+    @property
+    def iloc(self):
+        return _ReadOnlyIndexer(super().iloc)
+
+    @property
+    def at(self):
+        return _ReadOnlyIndexer(super().at)
+
+    @property
+    def iat(self):
+        return _ReadOnlyIndexer(super().iat)
+
+
+def freeze(table):
+    # the table as handed to callbacks; its column buffers are already non-writeable (see snapshot_store)
+    if readonly_debug and isinstance(table, pd.DataFrame):
+        return ReadOnlyFrame(table)
+    return table
@@ -0,0 +1,52 @@
+import logging
+import threading
+import time
+
+from .snapshot import Snapshot
+from .snapshot_store import sync_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def load_snapshot(source, root, warm_tables):
+    # sync (download + write only when the blob changed) and warm, timed end to end
+    start = time.perf_counter()
+    snapshot = Snapshot(root, *sync_snapshot(source, root))
+    snapshot.warm(warm_tables)
+    return snapshot, time.perf_counter() - start
+
+
+def refresh(live, source, root, warm_tables):
+    start = time.perf_counter()
+    manifest, readers = sync_snapshot(source, root)
+    if manifest['version'] == live.snapshot().version:
+        readers.close()
+        return False
+
+    # load everything the current snapshot has resident before swapping, so no request pays for it
+    snapshot = Snapshot(root, manifest, readers)
+    snapshot.warm(set(warm_tables) | set(live.snapshot().loaded()))
+    for hook in live.before_swap:
+        try:
+            hook(snapshot)
+        except Exception:
+            # the artifacts are an optimization, a failure should not hold back the new data
+            logger.exception("pre-swap step %r failed for %s", hook, snapshot.version)
+    live.swap(snapshot, time.perf_counter() - start)
+    logger.info("swapped data snapshot to %s in %.2fs", snapshot.version, live.load_seconds)
+    return True
+
+
+def start_refresher(live, source, root, warm_tables, interval):
+    # polls the blob's content hash (a metadata request) every `interval` seconds off the request path
+    def poll():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh(live, source, root, warm_tables)
+            except Exception:
+                logger.exception("data snapshot refresh failed, keeping %s", live.snapshot().version)
+
+    thread = threading.Thread(target=poll, name='data-snapshot-refresher', daemon=True)
+    thread.start()
+    return thread
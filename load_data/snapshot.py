@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+import weakref
+from collections.abc import Mapping
+
+from flask import g, has_request_context
+
+from .readonly import freeze
+from .snapshot_store import read_table, read_dictionaries
+
+
+class Snapshot(Mapping):
+    # tables of one snapshot version; each one is read from the store on first access and then kept resident.
+    # Tables are shared by every callback and must not be modified (see readonly.py).
+    def __init__(self, root, manifest, readers=None):
+        self.root = root
+        self.manifest = manifest
+        self.version = manifest['version']
+        # directory of this version in the store, also holds artifacts built from it
+        self.path = os.path.join(root, manifest['version'])
+        self._tables = {}
+        self._dictionaries = None
+        self._derived = {}
+        self._lock = threading.RLock()
+        # shared lock on the version (see snapshot_store), released once no request holds this snapshot
+        if readers is not None:
+            weakref.finalize(self, readers.close)
+
+    def __getitem__(self, name):
+        try:
+            return self._tables[name]
+        except KeyError:
+            if name not in self.manifest['tables']:
+                raise
+
+        with self._lock:
+            if name not in self._tables:
+                if self._dictionaries is None:
+                    # shared by all tables, so a member or party compares equal across them
+                    self._dictionaries = read_dictionaries(self.root, self.manifest)
+                self._tables[name] = freeze(read_table(self.root, self.manifest, name, self._dictionaries))
+        return self._tables[name]
+
+    # membership and iteration only need the manifest, nothing is loaded
+    def __contains__(self, name):
+        return name in self.manifest['tables']
+
+    def __iter__(self):
+        return iter(self.manifest['tables'])
+
+    def __len__(self):
+        return len(self.manifest['tables'])
+
+    def loaded(self):
+        return list(self._tables)
+
+    def warm(self, names):
+        for name in names:
+            if name in self:
+                self[name]
+
+    def derived(self, key, builder):
+        # structures computed from this snapshot's tables (indexes, caches...): built once, dropped with the snapshot
+        try:
+            return self._derived[key]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = builder(self)
+        return self._derived[key]
+
+
+class LiveSnapshot(Mapping):
+    # the `data` object the page callbacks close over; the snapshot behind it can be swapped at any time
+    def __init__(self, snapshot, load_seconds):
+        self._snapshot = snapshot
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        # callables run with each new snapshot before it is swapped in (see refresher.refresh), to build
+        # artifacts stored with it, e.g. the pre-rendered figures
+        self.before_swap = []
+
+    def snapshot(self):
+        # a request pins the snapshot it first read from, so a swap mid-request cannot mix versions
+        if has_request_context():
+            if 'data_snapshot' not in g:
+                g.data_snapshot = self._snapshot
+            return g.data_snapshot
+        return self._snapshot
+
+    def swap(self, snapshot, load_seconds):
+        # a single reference assignment, requests already running keep their pinned snapshot
+        self._snapshot = snapshot
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+
+    @property
+    def version(self):
+        return self.snapshot().version
+
+    def __getitem__(self, name):
+        return self.snapshot()[name]
+
+    def derived(self, key, builder):
+        return self.snapshot().derived(key, builder)
+
+    def __contains__(self, name):
+        return name in self.snapshot()
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __len__(self):
+        return len(self.snapshot())
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version,
+            'content_hash': snapshot.manifest['content_hash'],
+            'load_seconds': round(self.load_seconds, 3),
+            'loaded_at': self.loaded_at,
+            'tables_loaded': snapshot.loaded(),
+            'memory': snapshot.manifest.get('memory')
+        }
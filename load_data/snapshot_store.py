@@ -0,0 +1,305 @@
+import base64
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .normalize import normalize_tables
+
+# on-disk layout of the local snapshot store:
+#
+#   <root>/manifest.json          points at the active version and describes its tables
+#   <root>/<version>/dictionaries.json   categories shared by the categorical columns of all tables
+#   <root>/<version>/<table>/cN.npy   one file per column, memory-mapped by every worker
+#
+# tables are normalized before writing (see normalize.py). numeric and datetime columns are saved as
+# plain .npy arrays so they can be mapped read-only and shared through the OS page cache; categorical
+# columns as their codes, read back as categoricals over the mapped codes; other string columns as arrow
+# files (cN.arrow), mapped as pyarrow-backed string columns so the text is shared as well; anything else
+# falls back to pickle
+#
+# each worker holds a shared lock on <root>/<version>/.readers while a Snapshot of that version is alive,
+# so pruning never deletes a version a worker still reads from
+
+store_format = 3
+dictionaries_name = 'dictionaries.json'
+manifest_name = 'manifest.json'
+lock_name = '.lock'
+readers_lock_name = '.readers'
+versions_to_keep = 2
+
+# string columns read back with numpy semantics: missing values are nan and comparisons give numpy bools,
+# as with the object columns they replace
+string_dtype = pd.StringDtype('pyarrow_numpy')
+
+
+# sources the snapshot is synced from; content_hash must be cheap (metadata only)
+
+class GCSSource:
+    def __init__(self, bucket_name, blob_name):
+        from google.cloud import storage
+
+        self.blob = storage.Client().bucket(bucket_name).blob(blob_name)
+
+    def content_hash(self):
+        # metadata request only, the blob itself is not downloaded
+        self.blob.reload()
+        if self.blob.md5_hash:
+            return base64.b64decode(self.blob.md5_hash).hex()
+        # composite objects have no md5, the generation still changes on every upload
+        return f"generation-{self.blob.generation}"
+
+    def read_bytes(self):
+        return self.blob.download_as_bytes()
+
+
+class LocalSource:
+    # a local directory standing in for the bucket, e.g. for development and tests
+    def __init__(self, directory, blob_name):
+        self.path = os.path.join(directory, blob_name)
+
+    def content_hash(self):
+        md5 = hashlib.md5()
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                md5.update(chunk)
+        return md5.hexdigest()
+
+    def read_bytes(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+
+# manifest helpers
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, manifest_name)) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if manifest.get('format') != store_format:
+        return None
+    if not os.path.isdir(os.path.join(root, manifest['version'])):
+        return None
+    return manifest
+
+
+def _write_json_atomic(path, obj):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+# writing
+
+def _save_array(base, values):
+    # drop any dtype metadata, npy files cannot carry it
+    np.save(base + '.npy', np.ascontiguousarray(values).view(np.dtype(values.dtype.str)))
+
+
+def _write_column(directory, i, series, dictionaries):
+    base = os.path.join(directory, f"c{i}")
+    dtype = series.dtype
+
+    if isinstance(dtype, pd.CategoricalDtype) and dtype == dictionaries.get(series.name):
+        # codes as pandas holds them (int8/int16...), so reading them back needs no cast
+        _save_array(base, series.cat.codes.to_numpy())
+        return {'kind': 'categorical', 'dictionary': series.name}
+
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biuf':
+        _save_array(base, series.to_numpy())
+        return {'kind': 'numeric'}
+
+    if isinstance(dtype, np.dtype) and dtype.kind == 'M':
+        _save_array(base, series.to_numpy())
+        return {'kind': 'datetime'}
+
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        _save_array(base, series.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy())
+        return {'kind': 'datetime', 'tz': str(dtype.tz)}
+
+    if dtype == object or isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)):
+        values = series.dropna()
+        if all(isinstance(v, str) for v in values):
+            values = pa.array(series.astype(object), type=pa.large_string(), from_pandas=True)
+            with pa.OSFile(base + '.arrow', 'wb') as f:
+                with pa.ipc.new_file(f, pa.schema([('values', values.type)])) as writer:
+                    writer.write(pa.record_batch([values], names=['values']))
+            return {'kind': 'string'}
+
+    # mixed objects, extension dtypes etc.: not mappable, keep them as they are
+    with open(base + '.pkl', 'wb') as f:
+        pickle.dump(series, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {'kind': 'pickle'}
+
+
+def _write_table(directory, df, dictionaries):
+    os.makedirs(directory)
+    columns = []
+    for i, name in enumerate(df.columns):
+        column = _write_column(directory, i, df.iloc[:, i], dictionaries)
+        column['name'] = name
+        columns.append(column)
+
+    index = None
+    if not df.index.equals(pd.RangeIndex(len(df))):
+        with open(os.path.join(directory, 'index.pkl'), 'wb') as f:
+            pickle.dump(df.index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        index = 'index.pkl'
+
+    return {'type': 'frame', 'rows': len(df), 'columns': columns, 'index': index}
+
+
+def write_snapshot(root, tables, content_hash):
+    os.makedirs(root, exist_ok=True)
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{content_hash[:12]}"
+    tmp_dir = tempfile.mkdtemp(dir=root, prefix='.tmp-')
+
+    tables, dictionaries, memory = normalize_tables(tables)
+    with open(os.path.join(tmp_dir, dictionaries_name), 'w') as f:
+        json.dump({name: list(dtype.categories) for name, dtype in dictionaries.items()}, f)
+
+    entries = {}
+    for i, (name, table) in enumerate(tables.items()):
+        directory = os.path.join(tmp_dir, f"t{i}")
+        if isinstance(table, pd.DataFrame):
+            entries[name] = _write_table(directory, table, dictionaries)
+        else:
+            os.makedirs(directory)
+            with open(os.path.join(directory, 'object.pkl'), 'wb') as f:
+                pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+            entries[name] = {'type': 'object'}
+        entries[name]['path'] = f"t{i}"
+
+    # publish the version directory before pointing the manifest at it
+    os.rename(tmp_dir, os.path.join(root, version))
+
+    manifest = {
+        'format': store_format,
+        'version': version,
+        'content_hash': content_hash,
+        'created': time.time(),
+        'tables': entries,
+        # in-memory size of each table as downloaded and once normalized, in bytes
+        'memory': memory
+    }
+    _write_json_atomic(os.path.join(root, manifest_name), manifest)
+    _prune(root, keep=version)
+    return manifest
+
+
+def _prune(root, keep):
+    # called with the store lock held. A version some worker still has a Snapshot of (and may not have read
+    # every table of yet) holds a shared readers lock and is kept until a later prune
+    versions = sorted(i for i in os.listdir(root) if not i.startswith('.') and os.path.isdir(os.path.join(root, i)))
+    older = [i for i in versions if i != keep]
+    for version in older[:max(len(older) - (versions_to_keep - 1), 0)]:
+        with open(os.path.join(root, version, readers_lock_name), 'a') as readers:
+            try:
+                fcntl.flock(readers, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+
+def open_readers_lock(root, version):
+    # shared lock on a version, held for as long as the returned file is open
+    readers = open(os.path.join(root, version, readers_lock_name), 'a')
+    fcntl.flock(readers, fcntl.LOCK_SH)
+    return readers
+
+
+# syncing
+
+def sync_snapshot(source, root):
+    # (manifest, readers lock on its version); the lock is taken before the store lock is released, so the
+    # version cannot be pruned by another worker before the caller has opened it
+    os.makedirs(root, exist_ok=True)
+
+    # one worker downloads, the others wait on the lock and then find the manifest current
+    with open(os.path.join(root, lock_name), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            content_hash = source.content_hash()
+            manifest = load_manifest(root)
+            if not (manifest and manifest['content_hash'] == content_hash):
+                tables = pickle.loads(source.read_bytes())
+                manifest = write_snapshot(root, tables, content_hash)
+            return manifest, open_readers_lock(root, manifest['version'])
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# reading
+
+def _map_array(base):
+    # plain ndarray view over the read-only mapping, pandas does not expect np.memmap
+    return np.asarray(np.load(base + '.npy', mmap_mode='r'))
+
+
+def read_dictionaries(root, manifest):
+    # one CategoricalDtype per shared column, for all the tables of the version
+    with open(os.path.join(root, manifest['version'], dictionaries_name)) as f:
+        return {name: pd.CategoricalDtype(categories) for name, categories in json.load(f).items()}
+
+
+def _read_column(directory, i, column, dictionaries):
+    base = os.path.join(directory, f"c{i}")
+    kind = column['kind']
+
+    if kind == 'numeric':
+        return _map_array(base)
+
+    if kind == 'categorical':
+        # the categorical keeps the mapped codes, only the categories live in this worker
+        return pd.Categorical.from_codes(_map_array(base), dtype=dictionaries[column['dictionary']], validate=False)
+
+    if kind == 'datetime':
+        values = _map_array(base)
+        if column.get('tz'):
+            return pd.DatetimeIndex(values).tz_localize('UTC').tz_convert(column['tz']).array
+        return values
+
+    if kind == 'string':
+        # arrow buffers over the mapped file, nothing is copied; arrow arrays are immutable
+        values = pa.ipc.open_file(pa.memory_map(base + '.arrow', 'r')).read_all().column('values')
+        return pd.array(values, dtype=string_dtype)
+
+    with open(base + '.pkl', 'rb') as f:
+        return pickle.load(f).array
+
+
+def read_table(root, manifest, name, dictionaries=None):
+    entry = manifest['tables'][name]
+    directory = os.path.join(root, manifest['version'], entry['path'])
+
+    if entry['type'] == 'object':
+        with open(os.path.join(directory, 'object.pkl'), 'rb') as f:
+            return pickle.load(f)
+
+    if dictionaries is None and any(column['kind'] == 'categorical' for column in entry['columns']):
+        dictionaries = read_dictionaries(root, manifest)
+    arrays = {column['name']: _read_column(directory, i, column, dictionaries) for i, column in enumerate(entry['columns'])}
+
+    index = None
+    if entry['index']:
+        with open(os.path.join(directory, entry['index']), 'rb') as f:
+            index = pickle.load(f)
+
+    # copy=False keeps one block per column so the mapped (read-only) arrays are not consolidated into copies
+    return pd.DataFrame(arrays, index=index, copy=False)
+
+
+def read_snapshot(root, manifest):
+    dictionaries = read_dictionaries(root, manifest)
+    return {name: read_table(root, manifest, name, dictionaries) for name in manifest['tables']}
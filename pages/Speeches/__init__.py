@@ -2,7 +2,9 @@ from dash import html, dcc, Input, Output
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 
-from utils import PARTY_COLOURS, parliaments, parliament_sessions
+from utils import PARTY_COLOURS, parliaments, parliament_code, parliament_sessions
+from utils.selection_index import get_selection_index
+from utils.marker_sizes import get_marker_sizes
 
 # speeches layout with dropdowns, graph, and table
 def speeches_layout():
@@ -150,13 +152,8 @@ def speeches_callbacks(app, data):
         if selected_parliament == 'All':
             # If 'All' is selected, reset options to include only 'All'
             return [{'label': 'All', 'value': 'All'}], 'All'
-        speech_agg_df = data['speech_agg']
-        # Filter the dataframe based on the selected parliament session
-        speech_agg_df = speech_agg_df[speech_agg_df['parliament'] == parliaments[selected_parliament]]
-        # Get unique constituencies
-        constituencies = sorted(speech_agg_df['member_constituency'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': const, 'value': const} for const in constituencies]
+        # Get constituencies of the selected parliament session from the shared index
+        options = get_selection_index(data, 'speech_agg').constituency_options(parliament_code(parliaments[selected_parliament]))
         return options, 'All'
 
     # Callback to update Member Name options based on selected session and constituency
@@ -167,16 +164,8 @@ def speeches_callbacks(app, data):
         Input('constituency-dropdown', 'value')]
     )
     def update_member_options(selected_parliament, selected_constituency):
-        speech_agg_df = data['speech_agg']
-        # Start with filtering by parliament session
-        speech_agg_df = speech_agg_df[speech_agg_df['parliament'] == parliaments[selected_parliament]]
-        # Further filter by constituency if not 'All'
-        if selected_constituency and selected_constituency != 'All':
-            speech_agg_df = speech_agg_df[speech_agg_df['member_constituency'] == selected_constituency]
-        # Get unique member names
-        members = sorted(speech_agg_df['member_name'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': member, 'value': member} for member in members]
+        # Get member names of the selected parliament session and constituency from the shared index
+        options = get_selection_index(data, 'speech_agg').member_options(parliament_code(parliaments[selected_parliament]), constituency=selected_constituency)
         return options, 'All'
 
     # Callback to update the speeches graph and table on Page 1
@@ -189,29 +178,12 @@ def speeches_callbacks(app, data):
     def update_graph_and_table(selected_parliament, selected_constituency, selected_member):
         speech_agg_df = data['speech_agg']
 
-        # Define minimum and maximum marker sizes in pixels
-        SIZE_MIN = 5
-        SIZE_MAX = 40
-
-        # Calculate the global minimum and maximum of 'words_per_speech'
-        global_min = speech_agg_df['words_per_speech'].min()
-        global_max = speech_agg_df['words_per_speech'].max()
-
-        # Define a scaling function
-        def scale_marker_size(x, min_val, max_val, size_min, size_max):
-            if max_val == min_val:
-                return (size_min + size_max) / 2
-            else:
-                return size_min + (x - min_val) / (max_val - min_val) * (size_max - size_min)
-
-        speech_agg_df['marker_size'] = speech_agg_df['words_per_speech'].apply(
-            lambda x: scale_marker_size(x, global_min, global_max, SIZE_MIN, SIZE_MAX)
-        )
-
-        # Filter by parliament        
-        speech_agg_df_highlighted = speech_agg_df[speech_agg_df['parliament'] == parliaments[selected_parliament]]
+        # Filter by parliament, with marker sizes scaled once per data snapshot
+        in_parliament = (speech_agg_df['parliament'] == parliament_code(parliaments[selected_parliament])).to_numpy()
+        marker_sizes = get_marker_sizes(data, 'speech_agg')['words_per_speech']
+        speech_agg_df_highlighted = speech_agg_df[in_parliament].assign(marker_size=marker_sizes[in_parliament])
 
-        full_df = speech_agg_df_highlighted.copy()
+        full_df = speech_agg_df_highlighted
       
         # Further filter based on selected_constituency
         if selected_constituency != 'All' and selected_constituency:
@@ -239,8 +211,8 @@ def speeches_callbacks(app, data):
                     size=plot_df['marker_size'],
                     opacity=0.6
                 ),
-                hovertext="Member: " + plot_df['member_name'] + "<br>" +
-                            "Party: " + plot_df['member_party'] + "<br>" +
+                hovertext="Member: " + plot_df['member_name'].astype(str) + "<br>" +
+                            "Party: " + plot_df['member_party'].astype(str) + "<br>" +
                             "Speeches: " + plot_df['speeches_per_sitting'].astype(str) + "<br>" +
                             "Readability: " + plot_df['readability_score'].astype(str) + "<br>" +
                             "Words per Speech: " + plot_df['words_per_speech'].astype(str),
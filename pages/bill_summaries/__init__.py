@@ -1,11 +1,22 @@
 from dash import html, dcc, Input, Output, State, callback_context, ALL, MATCH
 import dash_bootstrap_components as dbc
+import hashlib
+import json
+import logging
 import os
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 from pymilvus import MilvusClient
+from plotly.utils import PlotlyJSONEncoder
 
 from query_vectors import query_vector_embeddings
-from utils import parliaments_bills, top_k_rag_bill_summaries, bill_summaries_rag_collection, bills_page_size
+from utils import parliaments_bills, parliament_code, top_k_rag_bill_summaries, bill_summaries_rag_collection, bills_page_size, bill_results_max_entries
+from utils.bill_catalogue import get_bill_catalogue
+from utils.bill_search import get_bill_search_index, bill_search_mode, bill_numbers_in, is_lexical, fuse_rankings
+
+logger = logging.getLogger(__name__)
 
 # zilliz client
 client = MilvusClient(
@@ -13,140 +24,206 @@ client = MilvusClient(
     token=os.environ.get("ZILLIZ_API_KEY"), 
 )
 
-def get_bill_cards(df):
-    bill_cards = []
-    for ind, row in df.iterrows():
-        # Unique identifiers for the buttons and collapse
-        read_more_id = {'type': 'read-more-button', 'index': ind}
-        read_less_id = {'type': 'read-less-button', 'index': ind}
-        collapse_id = {'type': 'collapse-content', 'index': ind}
-
-        # get date passed
-        
-        if pd.isna(row.date_passed):
-            if row.bill_number in ["16/2020", "25/2012"]:
-                date_passed = "Date not avail"
-            else:
-                date_passed = "Not yet passed"
+class BillResults:
+    # search results kept on the server per worker, so the page only holds a handle and the bill numbers;
+    # a worker that does not have a result set rebuilds it from the bill numbers
+    def __init__(self, max_entries=bill_results_max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def handle(version, bill_keys):
+        return hashlib.sha1(json.dumps([version, bill_keys]).encode()).hexdigest()
+
+    def put(self, handle, bills_df):
+        with self._lock:
+            self._entries[handle] = bills_df
+            self._entries.move_to_end(handle)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, data, result):
+        with self._lock:
+            bills_df = self._entries.get(result['handle'])
+            if bills_df is not None:
+                self._entries.move_to_end(result['handle'])
+                return bills_df
+        catalogue = get_bill_catalogue(data)
+        bills_df = catalogue.take(catalogue.positions_of_keys(result['bill_keys']))
+        self.put(result['handle'], bills_df)
+        return bills_df
+
+bill_results = BillResults()
+
+def vector_search_positions(catalogue, search_query, parliament):
+    responses = query_vector_embeddings(search_query, top_k_rag_bill_summaries, client, bill_summaries_rag_collection, parliament=parliament, output_field=["id"])
+    return catalogue.positions_of(list(dict.fromkeys(i['id'] for i in responses)))
+
+def search_bills(data, catalogue, search_query, parliament, positions):
+    # catalogue positions matching the query among `positions`, most relevant first
+    # bill numbers in the query are looked up directly, without an embedding call
+    bill_numbers = bill_numbers_in(search_query)
+    if bill_numbers:
+        ranked = catalogue.positions_of(bill_numbers)
+    elif bill_search_mode == 'lexical' or is_lexical(search_query):
+        ranked = get_bill_search_index(data).search(search_query.strip('"'), positions, top_k_rag_bill_summaries,
+                                                    match_all=is_lexical(search_query))
+    elif bill_search_mode == 'hybrid':
+        lexical = get_bill_search_index(data).search(search_query, positions, top_k_rag_bill_summaries)
+        try:
+            vector = vector_search_positions(catalogue, search_query, parliament)
+        except Exception:
+            logger.exception("vector search failed, using lexical results only")
+            vector = np.empty(0, dtype=np.intp)
+        ranked = fuse_rankings([vector[np.isin(vector, positions)], lexical], top_k_rag_bill_summaries)
+    else:
+        ranked = vector_search_positions(catalogue, search_query, parliament)
+    # Keep the order by relevance
+    return ranked[np.isin(ranked, positions)]
+
+def get_bill_card(ind, row):
+    # Unique identifiers for the buttons and collapse
+    read_more_id = {'type': 'read-more-button', 'index': ind}
+    read_less_id = {'type': 'read-less-button', 'index': ind}
+    collapse_id = {'type': 'collapse-content', 'index': ind}
+
+    # get date passed
+    
+    if pd.isna(row.date_passed):
+        if row.bill_number in ["16/2020", "25/2012"]:
+            date_passed = "Date not avail"
         else:
-            date_passed = row.date_passed.strftime('%Y-%m-%d')
-        
-        card = dbc.Card(
-            dbc.CardBody(
-                html.Div([
-                    # Top Section: Introduction and Dates
-                    dbc.Row([
-                        # Introduction Paragraph and Title
-                        dbc.Col([
-                            html.H4(row.title, className="card-title"),
-                            html.P(row.bill_introduction, className="card-text"),
-                        ],
-                            md=9,  # 9 out of 12 columns on medium to large screens
-                            xs=12  # Full width on extra small screens
-                        ),
-                        # Dates Section
-                        dbc.Col(
-                            html.Div([
-                                html.H5(f"Nr: {row.bill_number}"),
-                                html.H6("Date Introduced:", className="card-subtitle"),
-                                html.P(row.date_introduced.strftime('%Y-%m-%d') if pd.notna(row.date_introduced) else "N/A"),
-                                html.H6("Date Passed:", className="card-subtitle"),
-                                html.P(date_passed)
-                            ]),
-                            md=3,  # 3 out of 12 columns on medium to large screens
-                            xs=12  # Full width on extra small screens
-                        )
-                    ], className="align-items-top"),
-                    
-                    html.Br(),
-                    
-                    # Read More Button (Visible only when collapsed)
-                    dbc.Row(
-                        dbc.Col(
-                            dbc.Button(
-                                "Read More",
-                                id=read_more_id,
-                                color="link",
-                                className="p-2 w-100",  # Full width with padding
-                                n_clicks=0,
-                                style={
-                                    'textAlign': 'center',
-                                    'cursor': 'pointer',
-                                    'marginTop': '10px'
-                                }
-                            ),
-                            width=12
-                        ),
-                        style={
-                            'backgroundColor': '#ebedf0',
-                            'borderTop': '1px solid #dee2e6'  # Optional: add a top border for separation
-                        }
+            date_passed = "Not yet passed"
+    else:
+        date_passed = row.date_passed.strftime('%Y-%m-%d')
+    
+    card = dbc.Card(
+        dbc.CardBody(
+            html.Div([
+                # Top Section: Introduction and Dates
+                dbc.Row([
+                    # Introduction Paragraph and Title
+                    dbc.Col([
+                        html.H4(row.title, className="card-title"),
+                        html.P(row.bill_introduction, className="card-text"),
+                    ],
+                        md=9,  # 9 out of 12 columns on medium to large screens
+                        xs=12  # Full width on extra small screens
                     ),
-                    
-                    # Collapsible Content
-                    dbc.Collapse(
+                    # Dates Section
+                    dbc.Col(
                         html.Div([
-                            dbc.Row([
-                                dbc.Col(
-                                    [
-                                        # Key Points
-                                        html.H6("Key Points", className="card-subtitle"),
-                                        html.Ul(
-                                            [html.Li(i.strip()) for i in row.bill_key_points.split("- ") if len(i) != 0],
-                                            className="card-text"
-                                        ),
-                                        
-                                        # Impact
-                                        html.H6("Impact", className="card-subtitle"),
-                                        html.P(row.bill_impact, className="card-text"),
-                                    ],
-                                    md=8  # 8 out of 12 columns
-                                ),
-                                dbc.Col(
-                                    [
-                                        # Placeholder for alignment or additional content
-                                    ],
-                                    md=4  # 4 out of 12 columns
-                                )
-                            ]),
-                            
-                            html.Br(),
-                            
-                            # Read Less Button (Visible only when expanded)
-                            dbc.Row(
-                                dbc.Col(
-                                    dbc.Button(
-                                        "Read Less",
-                                        id=read_less_id,
-                                        color="link",
-                                        className="p-2 w-100",  # Full width with padding
-                                        n_clicks=0,
-                                        style={
-                                            'textAlign': 'center',
-                                            'cursor': 'pointer',
-                                            'marginTop': '10px'
-                                        }
+                            html.H5(f"Nr: {row.bill_number}"),
+                            html.H6("Date Introduced:", className="card-subtitle"),
+                            html.P(row.date_introduced.strftime('%Y-%m-%d') if pd.notna(row.date_introduced) else "N/A"),
+                            html.H6("Date Passed:", className="card-subtitle"),
+                            html.P(date_passed)
+                        ]),
+                        md=3,  # 3 out of 12 columns on medium to large screens
+                        xs=12  # Full width on extra small screens
+                    )
+                ], className="align-items-top"),
+                
+                html.Br(),
+                
+                # Read More Button (Visible only when collapsed)
+                dbc.Row(
+                    dbc.Col(
+                        dbc.Button(
+                            "Read More",
+                            id=read_more_id,
+                            color="link",
+                            className="p-2 w-100",  # Full width with padding
+                            n_clicks=0,
+                            style={
+                                'textAlign': 'center',
+                                'cursor': 'pointer',
+                                'marginTop': '10px'
+                            }
+                        ),
+                        width=12
+                    ),
+                    style={
+                        'backgroundColor': '#ebedf0',
+                        'borderTop': '1px solid #dee2e6'  # Optional: add a top border for separation
+                    }
+                ),
+                
+                # Collapsible Content
+                dbc.Collapse(
+                    html.Div([
+                        dbc.Row([
+                            dbc.Col(
+                                [
+                                    # Key Points
+                                    html.H6("Key Points", className="card-subtitle"),
+                                    html.Ul(
+                                        [html.Li(i.strip()) for i in row.bill_key_points.split("- ") if len(i) != 0],
+                                        className="card-text"
                                     ),
-                                    width=12
-                                ),
-                                style={
-                                    'backgroundColor': '#ebedf0',
-                                    'borderTop': '1px solid #dee2e6'  # Optional: add a top border for separation
-                                }
+                                    
+                                    # Impact
+                                    html.H6("Impact", className="card-subtitle"),
+                                    html.P(row.bill_impact, className="card-text"),
+                                ],
+                                md=8  # 8 out of 12 columns
+                            ),
+                            dbc.Col(
+                                [
+                                    # Placeholder for alignment or additional content
+                                ],
+                                md=4  # 4 out of 12 columns
                             )
                         ]),
-                        id=collapse_id,
-                        is_open=False
-                    )
-                ])
-            ),
-            className="mb-4"
-        )
-        # Wrap the card in a div with a unique id
-        wrapped_card = html.Div(card, id=f"bill-card-{ind}")
-        bill_cards.append(wrapped_card)
-    
-    return bill_cards
+                        
+                        html.Br(),
+                        
+                        # Read Less Button (Visible only when expanded)
+                        dbc.Row(
+                            dbc.Col(
+                                dbc.Button(
+                                    "Read Less",
+                                    id=read_less_id,
+                                    color="link",
+                                    className="p-2 w-100",  # Full width with padding
+                                    n_clicks=0,
+                                    style={
+                                        'textAlign': 'center',
+                                        'cursor': 'pointer',
+                                        'marginTop': '10px'
+                                    }
+                                ),
+                                width=12
+                            ),
+                            style={
+                                'backgroundColor': '#ebedf0',
+                                'borderTop': '1px solid #dee2e6'  # Optional: add a top border for separation
+                            }
+                        )
+                    ]),
+                    id=collapse_id,
+                    is_open=False
+                )
+            ])
+        ),
+        className="mb-4"
+    )
+    # Wrap the card in a div with a unique id
+    wrapped_card = html.Div(card, id=f"bill-card-{ind}")
+    return wrapped_card
+
+def get_bill_cards(df):
+    return [get_bill_card(ind, row) for ind, row in df.iterrows()]
+
+def get_cached_bill_cards(data, df):
+    # cards serialized once per bill and data snapshot (a bill's card never changes within one),
+    # so a page is the concatenation of cached fragments
+    cards = data.derived('bill_cards', lambda snapshot: {})
+    missing = [i for i in df.index if i not in cards]
+    for ind, row in df.loc[missing].iterrows():
+        cards[ind] = json.loads(json.dumps(get_bill_card(ind, row), cls=PlotlyJSONEncoder))
+    return [cards[i] for i in df.index]
 
 
 # Function to generate pagination controls with dynamic window
@@ -298,7 +375,7 @@ def bill_summaries_layout():
                         )
                     ),
                     dbc.Tooltip(
-                        "Leaving the search bar empty retrieves all bills (in the database) for the given parliament. Entering a search query returns the top 50 most relevant bills to the query, ordered from most to least relevant.",
+                        "Leaving the search bar empty retrieves all bills (in the database) for the given parliament. Entering a search query returns the top 50 most relevant bills to the query, ordered from most to least relevant. Searching for a bill number (e.g. 12/2020) shows that bill, and a query in double quotes only matches bills containing all of its words.",
                         target="bills-search-info-icon",  # Link tooltip to the icon's ID
                         placement="right",                # Position the tooltip to the right of the icon
                         style={
@@ -391,32 +468,27 @@ def bill_summaries_callbacks(app, data):
         State('text-input-bills', 'value')
     )
     def filter_bills(n_clicks, selected_parliament, search_query):
-        bills_df = data['bill_summaries']
-        bills_df[['number', 'year']] = bills_df['bill_number'].str.split(r'/', expand=True).astype(int)
-        bills_df = bills_df.sort_values(['year', 'number'], ascending = [False, False])        
+        catalogue = get_bill_catalogue(data)
 
-        if n_clicks is None:
+        if n_clicks is None or selected_parliament == "All":
             # Initial load or "All" selected: show all bills
-            filtered_df = bills_df.copy()
+            shown_parliament = None
         else:
-            if selected_parliament == "All":
-                filtered_df = bills_df.copy()
-            else:
-                filtered_df = bills_df[bills_df['parliament'] == int(parliaments_bills[selected_parliament])]
+            shown_parliament = parliament_code(parliaments_bills[selected_parliament])
+        positions = catalogue.positions(shown_parliament)
         
         # Now filter again if query was made
         if search_query:
-            parliament = None if selected_parliament == "All" else int(parliaments_bills[selected_parliament])
-            responses = query_vector_embeddings(search_query, top_k_rag_bill_summaries, client, bill_summaries_rag_collection, parliament=parliament, output_field=["id"])
-            bill_numbers = [i['id'] for i in responses]
-            filtered_df = filtered_df[filtered_df.bill_number.isin(bill_numbers)] 
+            parliament = None if selected_parliament == "All" else parliament_code(parliaments_bills[selected_parliament])
+            positions = search_bills(data, catalogue, search_query, parliament, positions)
 
-            # Now sort order by relevance
-            filtered_df['bill_number'] = pd.Categorical(filtered_df['bill_number'], categories=bill_numbers, ordered=True)
-            filtered_df = filtered_df.sort_values('bill_number').reset_index(drop=True)               
+        filtered_df = catalogue.take(positions)
+        bill_keys = filtered_df.index.tolist()
 
-        # Convert filtered_df to list of dicts
-        return filtered_df.to_dict('records')
+        # The result set stays on the server; the page only keeps its handle and row keys
+        handle = BillResults.handle(data.version, bill_keys)
+        bill_results.put(handle, filtered_df)
+        return {'handle': handle, 'bill_keys': bill_keys}
 
     # Callback to handle pagination and trigger scroll to top
     @app.callback(
@@ -456,7 +528,7 @@ def bill_summaries_callbacks(app, data):
                         if id_dict['index'] == 'prev':
                             current_page = max(1, current_page - 1)
                         elif id_dict['index'] == 'next':
-                            total_pages = (len(filtered_data) + bills_page_size - 1) // bills_page_size
+                            total_pages = (len(filtered_data['bill_keys']) + bills_page_size - 1) // bills_page_size
                             current_page = min(total_pages, current_page + 1)
                         else:
                             # Assume it's a page number
@@ -469,12 +541,9 @@ def bill_summaries_callbacks(app, data):
                 # Trigger scroll to top by setting 'scroll_trigger' to 'scroll'
                 scroll_trigger = 'scroll'
 
-        # Convert filtered_data back to DataFrame
+        # Look up the result set the handle refers to
         if filtered_data:
-            filtered_df = pd.DataFrame(filtered_data)
-            # Convert date columns to datetime
-            filtered_df['date_passed'] = pd.to_datetime(filtered_df['date_passed'], errors='coerce')
-            filtered_df['date_introduced'] = pd.to_datetime(filtered_df['date_introduced'], errors='coerce')
+            filtered_df = bill_results.get(data, filtered_data)
         else:
             # If no data is filtered, return an empty DataFrame
             filtered_df = pd.DataFrame()
@@ -496,7 +565,7 @@ def bill_summaries_callbacks(app, data):
             current_bills = filtered_df.iloc[start:end]
 
             # Generate bill cards
-            bill_cards = get_bill_cards(current_bills)
+            bill_cards = get_cached_bill_cards(data, current_bills)
 
             # Generate pagination controls with dynamic window
             pagination = generate_pagination(total_pages, current_page)
@@ -0,0 +1,46 @@
+# Time to render and serialize each page of bill cards, building the cards on every page change
+# versus concatenating cached card fragments, over the full bill catalogue.
+#
+#   python -m pages.bill_summaries.benchmark_cards
+
+import json
+import time
+
+import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+
+from app import server, data
+from pages.bill_summaries import get_bill_cards, get_cached_bill_cards
+from utils import bills_page_size
+from utils.bill_catalogue import get_bill_catalogue
+
+
+def time_pages(pages, render):
+    # includes the JSON encoding Dash does for the callback response
+    seconds = []
+    for page in pages:
+        start = time.perf_counter()
+        json.dumps(render(page), cls=PlotlyJSONEncoder)
+        seconds.append(time.perf_counter() - start)
+    return np.array(seconds) * 1000
+
+
+def benchmark():
+    with server.test_request_context():
+        catalogue = get_bill_catalogue(data)
+        bills = catalogue.take(catalogue.positions())
+        pages = [bills.iloc[i:i + bills_page_size] for i in range(0, len(bills), bills_page_size)]
+        print(f"{len(bills)} bills, {len(pages)} pages")
+
+        runs = [
+            ('uncached', get_bill_cards),
+            ('cached, cold', lambda page: get_cached_bill_cards(data, page)),
+            ('cached, warm', lambda page: get_cached_bill_cards(data, page))
+        ]
+        for name, render in runs:
+            ms = time_pages(pages, render)
+            print(f"{name:>13}  mean {ms.mean():6.2f} ms  p95 {np.percentile(ms, 95):6.2f} ms per page")
+
+
+if __name__ == "__main__":
+    benchmark()
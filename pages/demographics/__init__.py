@@ -1,18 +1,20 @@
-import plotly.express as px
 from dash import html, dcc, Input, Output
 import dash_bootstrap_components as dbc
 import plotly.express as px
-import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
-from scipy.stats import gaussian_kde, norm
 
-from utils import PARTY_COLOURS, ETHNIC_COLOURS, parliaments, parliament_sessions
+from utils import PARTY_COLOURS, ETHNIC_COLOURS, parliaments, parliament_code, parliament_sessions
+from utils.age_density import get_age_densities, age_grid_step
+from utils.figure_views import view_toggle, template_store, register_figure_view
+from figure_cache import cached_figure
 
 parliaments_demo = {i:v for i,v in parliaments.items() if i!='All'}
 
 parliament_sessions_demo = [i for i in parliament_sessions if i!="All"]
 
+age_views = {'density': "Density", 'percentage': "Percentage"}
+
 # demographics layout with dropdowns, graph, and table
 def demographics_layout():
     return html.Div(
@@ -63,6 +65,8 @@ def demographics_layout():
             # Graph Section with Fixed Height
             dbc.Row([
                 dbc.Col([
+                    view_toggle('demographics-age-view', age_views, 'density'),
+                    dcc.Store(id='demographics-age-store'),
                     dcc.Graph(
                         id='demographics-age-graph',
                         config={"responsive": True},
@@ -78,6 +82,7 @@ def demographics_layout():
                     )
                 ], xs=12, md=6, className="mb-4")
             ]),
+            template_store('figure-template-demographics'),
         ],
         className='content'
     )
@@ -85,118 +90,29 @@ def demographics_layout():
 def demographics_callbacks(app, data):
     # Callback to update the demographics graph and table on Page 1
     @app.callback(
-        [Output('demographics-age-graph', 'figure'),
+        [Output('demographics-age-store', 'data'),
         Output('demographics-ethnicity-graph', 'figure')],
         Input('parliament-dropdown-demographics', 'value')
     )
+    @cached_figure('demographics', data, prerender=[(session,) for session in parliaments_demo])
     def update_graph_and_table(selected_parliament):
         demographics_df = data['demographics']
 
         # Filter by parliament
-        demographics_df = demographics_df[demographics_df['parliament'] == int(parliaments_demo[selected_parliament])]
-
-        # add all parties
-        demographics_hist_df = pd.concat([demographics_df, demographics_df.assign(party='All')])
-        
-        # age histogram
-        # Create the histogram
-        age_histogram = px.histogram(
-            demographics_hist_df,
-            x='year_age_entered',
-            color='member_party', 
-            opacity=0.75,
-            histnorm='percent',
-            color_discrete_map=PARTY_COLOURS,
-            barmode='group'
-        )
-
-        # Set the size of each bin to 5
-        age_histogram.update_traces(xbins=dict(size=5))
-
-        # Adjust the x-axis to show ticks in increments of 5, but skip the first one
-        age_histogram.update_xaxes(title_text="Year-age at first sitting")
-        
-        age_histogram.update_layout(legend=dict(
-                                        title=dict(text='Party'),
-                                        yanchor="top",
-                                        y=0.99,
-                                        xanchor="left",
-                                        x=0.01
-                                        ))
-
-        age_histogram.update_traces(
-            hovertemplate="<b>Year Age Entered:</b> %{x}<br>" +
-            "<b>Percentage:</b> %{y:.1f}<extra></extra>"
-            )
-        
-        # now the density plot 
-
-        age_density = go.Figure()
-
-        # Loop through each party and calculate KDE
-        unique_parties = list(demographics_df['member_party'].unique())
-        unique_parties.append("All")
-        
-        for party in unique_parties:
-            # Filter the data for each party
-            if party=="All":
-                party_data = demographics_df['year_age_entered']
-            else:
-                party_data = demographics_df[demographics_df['member_party'] == party]['year_age_entered']
-                
-            buffer = 15
-
-            if len(party_data)!=1:
-            
-                # Calculate KDE with custom bandwidth
-                kde = gaussian_kde(party_data, bw_method=0.2)
-                
-                # Extend the x range slightly beyond the min and max to allow smooth tails
-                x_min = np.max([party_data.min() - buffer, 20])
-                x_max = np.min([party_data.max() + buffer, 100])
-                x_range = np.linspace(x_min, x_max, 1000)
-                
-                # Evaluate KDE
-                kde_values = kde(x_range)
-            else:                
-                # kde not possible with single value; use pdf and generate distribution
-                val = party_data.iloc[0]
-                std_dev = 2  # Adjust this value to control the spread of the peak
-
-                # Create x range for the "KDE-like" plot
-                x_range = np.linspace(np.max([val-buffer, 20]), np.min([val+buffer, 100]), 1000)  # A range around the single value
-
-                # Calculate the normal distribution (PDF) for the single value
-                kde_values = norm.pdf(x_range, loc=party_data, scale=std_dev)
-            
-            # Add filled density curve to plot
-            age_density.add_trace(go.Scatter(
-                x=x_range, 
-                y=kde_values,
-                mode='lines',
-                name=party,
-                line=dict(color=PARTY_COLOURS[party], width=2),
-                fill='tozeroy',  # Fill the area under the curve
-                hovertemplate="<b>Age:</b> %{x:.0f}<br>" +
-                              f"<b>Party:</b> {party}<extra></extra>"
-            ))
-
-        # now combine histogram and density plots
-
-        # Initialize a new figure
-        combined_fig = go.Figure()
-
-        # Add histogram traces
-        for trace in age_histogram.data:
-            combined_fig.add_trace(trace)
-
-        # Add KDE traces
-        for trace in age_density.data:
-            combined_fig.add_trace(trace)
-
-        # Determine the number of traces for each plot
-        num_hist_traces = len(age_histogram.data)
-        num_kde_traces = len(age_density.data)
+        demographics_df = demographics_df[demographics_df['parliament'] == parliament_code(parliaments_demo[selected_parliament])]
+
+        # histogram and density views are built in the browser from the ages and the precomputed curves
+        age_view = {
+            'parties': [
+                {'name': party, 'colour': PARTY_COLOURS[party], 'ages': party_df['year_age_entered'].tolist()}
+                for party, party_df in demographics_df.groupby('member_party', sort=False, observed=True)
+            ],
+            'densities': [
+                {'name': party, 'colour': PARTY_COLOURS[party], 'x0': float(x_range[0]), 'dx': age_grid_step,
+                 'y': kde_values.astype(float).round(6).tolist()}
+                for party, x_range, kde_values in get_age_densities(data).get(parliament_code(parliaments_demo[selected_parliament]), [])
+            ]
+        }
 
         # axes tick marks
 
@@ -205,114 +121,26 @@ def demographics_callbacks(app, data):
         max_tick = (np.ceil(demographics_df['year_age_entered'].max() / 5) * 5)+5
 
         # Create tick values, but exclude the first one (to avoid overlapping with 0)
-        tickvals = [i for i in np.arange(min_tick, max_tick + 1, 5) if i!=min_tick]
+        tickvals = [float(i) for i in np.arange(min_tick, max_tick + 1, 5) if i!=min_tick]
 
-
-        # Create buttons
-        buttons = [
-            dict(
-                label="Density",
-                method="update",
-                args=[
-                    {"visible": [False]*num_hist_traces + [True]*num_kde_traces},
-                    {
-                        "title": "Age Distribution by Party",
-                        "xaxis": {"title": "Year-age at first sitting",
-                                  "tick0": min_tick,
-                                  "dtick": 5,
-                                  "tickvals": tickvals,
-                                  "range": [min_tick, max_tick]
-                                  },
-                        "yaxis": {"title": "Density",
-                                  "ticks": "",
-                                  "showticklabels": False}
-                    }
-                ]
-            ),
-            dict(
-                label="Percentage",
-                method="update",
-                args=[
-                    {"visible": [True]*num_hist_traces + [False]*num_kde_traces},
-                    {
-                        "title": "Age Distribution by Party",
-                        "xaxis": {"title": "Year-age at first sitting",
-                                  "tick0": min_tick,
-                                  "dtick": 5,
-                                  "tickvals": tickvals,
-                                  "range": [min_tick, max_tick]
-                                  },
-                        "yaxis": {"title": "Percentage"}
-                    }
-                ]
-            )
-        ]
-
-        # Update the layout with buttons
-        combined_fig.update_layout(
-            updatemenus=[
-                dict(
-                    type="buttons",
-                    direction="left",
-                    buttons=buttons,
-                    pad={"r": 10, "t": 10},
-                    showactive=True,
-                    x=0.99,
-                    xanchor="right",
-                    y=1.2,
-                    yanchor="top"
-                )
-            ]
-        )
-
-        combined_fig.update_xaxes(
-            tick0=min_tick,
-            dtick=5,
-            tickvals=tickvals,
-            range=[min_tick, max_tick]
-            )
-
-        # Set initial visibility (e.g., show histogram by default)
-        for i in range(num_hist_traces):
-            combined_fig.data[i].visible = False
-        for i in range(num_kde_traces):
-            combined_fig.data[num_hist_traces + i].visible = True
-
-        # Optionally, update axes and layout as needed
-        combined_fig.update_layout(
-            xaxis_title="Year-age at first sitting",
-            yaxis_title="Density",
-            title="Age Distribution by Party",
-            margin=dict(l=0, r=0),
-            legend=dict(
-                title=dict(text='Party'),
-                yanchor="top",
-                y=0.99,
-                xanchor="left",
-                x=0.01
-            ),
-            template='plotly_white'
-        )
-
-        combined_fig.update_yaxes(ticks = "",
-                                  showticklabels= False)
+        age_view['ticks'] = {'tick0': float(min_tick), 'tickvals': tickvals, 'range': [float(min_tick), float(max_tick)]}
 
         # ethnicity and gender graph
 
-        ethnicity_parties = demographics_df.groupby(['member_party', 'member_ethnicity', 'gender'])['member_name'].count().reset_index().rename(columns = {"member_name": "count"})
+        ethnicity_parties = demographics_df.groupby(['member_party', 'member_ethnicity', 'gender'], observed=True)['member_name'].count().reset_index().rename(columns = {"member_name": "count"})
 
         all_parties = list(ethnicity_parties.member_party.unique())
         all_parties.sort(reverse=True)
         all_parties.append('All')
 
         # get for all parties
-        ethnicity_all = demographics_df.groupby(['member_ethnicity', 'gender'])['member_name'].count().reset_index().rename(columns = {"member_name": "count"})
+        ethnicity_all = demographics_df.groupby(['member_ethnicity', 'gender'], observed=True)['member_name'].count().reset_index().rename(columns = {"member_name": "count"})
 
         ethnicity_all['member_party'] = 'All'
 
         ethnicity_df = pd.concat([ethnicity_parties, ethnicity_all])
 
-        ethnicity_df['percentage'] = ethnicity_df['count']*100 / ethnicity_df.groupby('member_party')['count'].transform('sum')
+        ethnicity_df['percentage'] = ethnicity_df['count']*100 / ethnicity_df.groupby('member_party', observed=True)['count'].transform('sum')
 
         ethnicity_df['member_ethnicity'] = pd.Categorical(ethnicity_df['member_ethnicity'], categories=['chinese', 'malay', 'indian', 'others'], ordered=True)
 
@@ -354,4 +182,8 @@ def demographics_callbacks(app, data):
                 'Count:  %{customdata[2]}<extra></extra>'  # Removes the secondary box with trace name
         )
  
-        return combined_fig, ethnicity_fig
\ No newline at end of file
+        return age_view, ethnicity_fig
+
+    # Clientside callback drawing the selected view of the age graph
+    register_figure_view(app, 'demographics-age-graph', 'demographics-age-store', 'demographics-age-view',
+                         'figure-template-demographics', 'age_view')
\ No newline at end of file
@@ -3,7 +3,11 @@ import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 import numpy as np
 
-from utils import PARTY_COLOURS, parliaments, parliament_sessions, member_metrics_options, SIZE_MIN, SIZE_MAX
+from utils import PARTY_COLOURS, parliaments, parliament_code, parliament_sessions, member_metrics_options
+from utils.marker_sizes import get_marker_sizes
+from utils.scatter import scatter_trace, hovertemplate
+from figure_cache import cached_figure
+from utils.selection_index import get_selection_index
 
 # speeches layout with dropdowns, graph, and table
 def member_metrics_layout():
@@ -194,13 +198,8 @@ def member_metrics_callbacks(app, data):
         if selected_parliament == 'All':
             # If 'All' is selected, reset options to include only 'All'
             return [{'label': 'All', 'value': 'All'}], 'All'
-        member_metrics_df = data['member_metrics']
-        # Filter the dataframe based on the selected parliament session
-        member_metrics_df = member_metrics_df[member_metrics_df['parliament'] == parliaments[selected_parliament]]
-        # Get unique constituencies
-        constituencies = sorted(member_metrics_df['member_constituency'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': const, 'value': const} for const in constituencies]
+        # Get constituencies of the selected parliament session from the shared index
+        options = get_selection_index(data, 'member_metrics').constituency_options(parliament_code(parliaments[selected_parliament]))
         return options, 'All'
 
     # Callback to update Member Name options based on selected session and constituency
@@ -211,16 +210,8 @@ def member_metrics_callbacks(app, data):
         Input('member-metrics-constituency-dropdown', 'value')]
     )
     def update_member_options(selected_parliament, selected_constituency):
-        member_metrics_df = data['member_metrics']
-        # Start with filtering by parliament session
-        member_metrics_df = member_metrics_df[member_metrics_df['parliament'] == parliaments[selected_parliament]]
-        # Further filter by constituency if not 'All'
-        if selected_constituency!= 'All':
-            member_metrics_df = member_metrics_df[member_metrics_df['member_constituency'] == selected_constituency]
-        # Get unique member names
-        members = sorted(member_metrics_df['member_name'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': member, 'value': member} for member in members]
+        # Get member names of the selected parliament session and constituency from the shared index
+        options = get_selection_index(data, 'member_metrics').member_options(parliament_code(parliaments[selected_parliament]), constituency=selected_constituency)
         return options, 'All'
     # Callback to control visibility of the size dropdown
     @app.callback(
@@ -254,6 +245,10 @@ def member_metrics_callbacks(app, data):
             
             return options, options[1]['value']
 
+    # first-visit dropdown values of each parliament session, scatter and boxplot views, rendered at build time
+    prerender_inputs = [(session, 'All', 'All', 'speeches_per_sitting', 'questions_per_sitting', 'words_per_speech') for session in parliament_sessions] + \
+                       [(session, 'All', 'All', 'none', 'questions_per_sitting', 'speeches_per_sitting') for session in parliament_sessions]
+
     # Callback to update the member_metrics graph and table on Page 1
     @app.callback(
         Output('member-metrics-graph', 'figure'),
@@ -266,6 +261,7 @@ def member_metrics_callbacks(app, data):
             Input('member-metrics-size-dropdown', 'value')
             ]
     )
+    @cached_figure('member_metrics', data, prerender=prerender_inputs)
     def update_graph_and_table(selected_parliament, selected_constituency, selected_member, xaxis_var, yaxis_var, size_var):
 
         # set names of variables
@@ -287,30 +283,17 @@ def member_metrics_callbacks(app, data):
         # get data
         member_metrics_df = data['member_metrics'][list(set(['member_name', 'member_party', 'member_constituency', 'parliament'] + selected_vars))]
 
+        # get sizes of size variable, scaled once per data snapshot
+        if size_var:
+            member_metrics_df = member_metrics_df.assign(marker_size=get_marker_sizes(data, 'member_metrics')[size_var])
+
         # clean to get rid of NAs
         member_metrics_df = member_metrics_df.dropna(axis = 0, how = 'any')
 
-        # get sizes of size variable
-        if size_var:
-            # Calculate the global minimum and maximum of size parameter
-            global_min = member_metrics_df[size_var].min()
-            global_max = member_metrics_df[size_var].max()
-
-            # Define a scaling function
-            def scale_marker_size(x, min_val, max_val, size_min, size_max):
-                if max_val == min_val:
-                    return (size_min + size_max) / 2
-                else:
-                    return size_min + (x - min_val) / (max_val - min_val) * (size_max - size_min)
-
-            member_metrics_df['marker_size'] = member_metrics_df[size_var].apply(
-                lambda x: scale_marker_size(x, global_min, global_max, SIZE_MIN, SIZE_MAX)
-            )
-
         # Filter by parliament        
-        full_df = member_metrics_df[member_metrics_df['parliament'] == parliaments[selected_parliament]]
+        full_df = member_metrics_df[member_metrics_df['parliament'] == parliament_code(parliaments[selected_parliament])]
 
-        member_metrics_df_highlighted = full_df.copy()
+        member_metrics_df_highlighted = full_df
       
         # Further filter based on selected_constituency
         if selected_constituency != 'All' and selected_constituency:
@@ -322,6 +305,9 @@ def member_metrics_callbacks(app, data):
 
         member_metrics_df_non_highlighted = full_df.drop(member_metrics_df_highlighted.index)
 
+        # WebGL traces when the figure has many points
+        Scatter = scatter_trace(len(full_df))
+
         # now create boxplot if xaxis is none, else create scatterplot
         if not xaxis_var:
             # start with boxplot + scatterplot
@@ -357,10 +343,10 @@ def member_metrics_callbacks(app, data):
                 
                 # Add Scatter Trace for Individual Points of the Non-Highlighted Party (Grey Points) with Jitter
                 jitter = np.random.uniform(-0.1, 0.1, size=len(plot_df)) 
-                scatter_x = [party_num + j for j in jitter]
+                scatter_x = party_num + jitter
                 
                 fig.add_trace(
-                    go.Scatter(
+                    Scatter(
                         x=scatter_x,  # Apply jitter to numerical x positions
                         y=plot_df[yaxis_var],
                         mode='markers',
@@ -385,10 +371,10 @@ def member_metrics_callbacks(app, data):
                 
                 # Add Scatter Trace for Individual Points of the Highlighted Party with Jitter
                 jitter = np.random.uniform(-0.1, 0.1, size=len(plot_df))  # Adjust jitter range as needed
-                scatter_x = [party_num + j for j in jitter]
+                scatter_x = party_num + jitter
                 
                 fig.add_trace(
-                    go.Scatter(
+                    Scatter(
                         x=scatter_x,  # Apply jitter to numerical x positions
                         y=plot_df[yaxis_var],
                         mode='markers',
@@ -396,13 +382,12 @@ def member_metrics_callbacks(app, data):
                             color=plot_df['member_party'].map(PARTY_COLOURS),
                             opacity=0.6
                         ),
-                        hovertext=(
-                            "Member: " + plot_df['member_name'] + "<br>" +
-                            "Party: " + plot_df['member_party'] + "<br>" +
-                            f"{yaxis_var.title().replace('_', ' ')}: " + plot_df[yaxis_var].astype(str)
-                        ),
-                        hoverinfo='text',
-                        customdata=plot_df[['member_name']],  # Pass member names for hover
+                        customdata=plot_df[['member_name', 'member_party']].to_numpy(),  # Member names and parties for hover
+                        hovertemplate=hovertemplate([
+                            ("Member", "%{customdata[0]}"),
+                            ("Party", "%{customdata[1]}"),
+                            (yaxis_var.title().replace('_', ' '), "%{y}")
+                        ]),
                         name=party, 
                         showlegend=True 
                     )
@@ -441,7 +426,7 @@ def member_metrics_callbacks(app, data):
 
                 plot_df = member_metrics_df_highlighted.query(f"member_party=='{party}'")
 
-                fig.add_trace(go.Scatter(
+                fig.add_trace(Scatter(
                     x=plot_df[xaxis_var],
                     y=plot_df[yaxis_var],
                     mode='markers',
@@ -449,19 +434,20 @@ def member_metrics_callbacks(app, data):
                         'color': plot_df['member_party'].map(PARTY_COLOURS),
                         'opacity': 0.6,
                         **({'size': plot_df['marker_size']} if size_var else {})},
-                    hovertext=("Member: " + plot_df['member_name'] + "<br>" +
-                                "Party: " + plot_df['member_party'] + "<br>" +
-                                f"{xaxis_varname}: " + plot_df[xaxis_var].astype(str) + "<br>" +
-                                f"{yaxis_varname}: " + plot_df[yaxis_var].astype(str) + "<br>" +
-                                (f"{size_varname}: " + plot_df[size_var].astype(str) if size_var else '')
-                    ),
-                    hoverinfo='text',
+                    customdata=plot_df[['member_name', 'member_party'] + ([size_var] if size_var else [])].to_numpy(),
+                    hovertemplate=hovertemplate([
+                        ("Member", "%{customdata[0]}"),
+                        ("Party", "%{customdata[1]}"),
+                        (xaxis_varname, "%{x}"),
+                        (yaxis_varname, "%{y}"),
+                        *([(size_varname, "%{customdata[2]:.6~g}")] if size_var else [])
+                    ]),
                     name=party,
                     showlegend=True  # Only the highlighted trace shows in legend
                 ))
 
             # now add traces for non highlighted points    
-            fig.add_trace(go.Scatter(
+            fig.add_trace(Scatter(
                 x=member_metrics_df_non_highlighted[xaxis_var],
                 y=member_metrics_df_non_highlighted[yaxis_var],
                 mode='markers',
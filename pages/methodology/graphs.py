@@ -16,8 +16,9 @@ def create_speech_lengths_kde():
 
     # Define thresholds
 
-    x_min = speech_lengths.min()
-    x_max = speech_lengths.max()
+    # python ints: the column is stored as int16 and is multiplied past its range below
+    x_min = int(speech_lengths.min())
+    x_max = int(speech_lengths.max())
     x_range = np.linspace(x_min, x_max, 2000)
     x_range = np.append(x_range, [position_threshold_low, position_threshold_high])
     x_range.sort()
@@ -2,7 +2,9 @@ from dash import html, dcc, Input, Output
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 
-from utils import PARTY_COLOURS, parliaments, parliament_sessions
+from utils import PARTY_COLOURS, parliaments, parliament_code, parliament_sessions
+from utils.selection_index import get_selection_index
+from utils.scatter import scatter_trace, hovertemplate
 
 # participation layout with dropdowns, graph
 def participation_layout():
@@ -146,14 +148,8 @@ def participation_callbacks(app, data):
         if selected_parliament == 'All':
             # If 'All' is selected, reset options to include only 'All'
             return [{'label': 'All', 'value': 'All'}], 'All'
-        participation_df = data['participation']
-        
-        # Filter the dataframe based on the selected parliament session
-        participation_df = participation_df[participation_df['parliament'] == parliaments[selected_parliament]]
-        # Get unique constituencies
-        constituencies = sorted(participation_df['member_constituency'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': const, 'value': const} for const in constituencies]
+        # Get constituencies of the selected parliament session from the shared index
+        options = get_selection_index(data, 'participation').constituency_options(parliament_code(parliaments[selected_parliament]))
         return options, 'All'
 
     # Callback to update Member Name options based on selected session and constituency
@@ -164,17 +160,8 @@ def participation_callbacks(app, data):
         Input('constituency-dropdown-participation', 'value')]
     )
     def update_member_options(selected_parliament, selected_constituency):
-        participation_df = data['participation']
-        # Start with filtering by parliament session
-        participation_df = participation_df[participation_df['parliament'] == parliaments[selected_parliament]]
-
-        # Further filter by constituency if not 'All'
-        if selected_constituency and selected_constituency != 'All':
-            participation_df = participation_df[participation_df['member_constituency'] == selected_constituency]
-        # Get unique member names
-        members = sorted(participation_df['member_name'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': member, 'value': member} for member in members]
+        # Get member names of the selected parliament session and constituency from the shared index
+        options = get_selection_index(data, 'participation').member_options(parliament_code(parliaments[selected_parliament]), constituency=selected_constituency)
         return options, 'All'
 
     # Callback to update the participation graph
@@ -188,8 +175,8 @@ def participation_callbacks(app, data):
         participation_df = data['participation']
 
         # Filter by parliament
-        participation_df_highlighted = participation_df[participation_df['parliament'] == parliaments[selected_parliament]]
-        full_df = participation_df_highlighted.copy()
+        participation_df_highlighted = participation_df[participation_df['parliament'] == parliament_code(parliaments[selected_parliament])]
+        full_df = participation_df_highlighted
         
         # Further filter based on selected_constituency
         if selected_constituency != 'All' and selected_constituency:
@@ -201,29 +188,32 @@ def participation_callbacks(app, data):
 
         participation_df_non_highlighted = full_df.drop(participation_df_highlighted.index)      
 
-        # Create the scatter plot
+        # Create the scatter plot, with WebGL when there are many points
         fig = go.Figure()
+        Scatter = scatter_trace(len(full_df))
 
         for party in participation_df_highlighted.member_party.unique():
 
             plot_df = participation_df_highlighted.query(f"member_party=='{party}'")
-            fig.add_trace(go.Scatter(
+            fig.add_trace(Scatter(
                 x=plot_df['attendance'],
                 y=plot_df['participation'],
                 mode='markers',
                 marker=dict(
                     color=plot_df['member_party'].map(PARTY_COLOURS)
                 ),
-                hovertext="Member: " + plot_df['member_name'] + "<br>" +
-                            "Party: " + plot_df['member_party'] + "<br>" +
-                            "Attendance: " + plot_df['attendance'].astype(str) + "<br>" +
-                            "Participation: " + plot_df['participation'].astype(str),
-                hoverinfo='text',
+                customdata=plot_df[['member_name', 'member_party']].to_numpy(),
+                hovertemplate=hovertemplate([
+                    ("Member", "%{customdata[0]}"),
+                    ("Party", "%{customdata[1]}"),
+                    ("Attendance", "%{x}"),
+                    ("Participation", "%{y}")
+                ]),
                 name=party,
                 showlegend=True  # Only the highlighted trace shows in legend
             ))
 
-        fig.add_trace(go.Scatter(
+        fig.add_trace(Scatter(
             x=participation_df_non_highlighted['attendance'],
             y=participation_df_non_highlighted['participation'],
             mode='markers',
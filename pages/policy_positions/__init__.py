@@ -1,11 +1,13 @@
-from dash import html, dcc, Input, Output, State, callback_context
+from dash import html, dcc, Input, Output, State, callback_context, no_update
 import dash_bootstrap_components as dbc
 import os
 from dash.exceptions import PreventUpdate
 from pymilvus import MilvusClient
 
-from query_vectors import query_vector_embeddings, summarize_policy_positions
-from utils import parliaments, try_again_message, top_k_rag_policy_positions, policy_positions_rag_collection
+from query_vectors import get_vector_from_query, search_vector, summarize_policy_positions, get_index_version
+from jobs import job_runner
+from utils import parliaments, parliament_code, try_again_message, top_k_rag_policy_positions, policy_positions_rag_collection
+from utils.selection_index import get_selection_index
 
 # Filter out the 'All' parliament session
 parliaments = {i: v for i, v in parliaments.items() if i != 'All'}
@@ -16,6 +18,64 @@ client = MilvusClient(
     token=os.environ.get("ZILLIZ_API_KEY"), 
 )
 
+# progress messages shown while a query is in each stage of the pipeline
+stage_messages = {
+    'embedding': "Reading your query...",
+    'search': "Finding relevant speeches...",
+    'summary': "Summarising policy positions..."
+}
+
+# how often the page polls a running query
+poll_interval_ms = 250
+
+def policy_positions_job(job, query, parliament, party, constituency, member):
+    # runs on the job pipeline, off the request worker; each stage reports progress to the page
+    with job.stage('embedding'):
+        query_vector = get_vector_from_query(query)
+    with job.stage('search'):
+        responses = search_vector(query_vector, top_k_rag_policy_positions, client, policy_positions_rag_collection, parliament, party, constituency, member, output_field=["policy_positions"])
+        summaries = [i['entity']['policy_positions'] for i in responses]
+    # get unit of analysis
+    if member:
+        uoa = 'MP'
+    elif constituency:
+        uoa = 'Constituency'
+    else:
+        uoa = 'Party'
+    with job.stage('summary'):
+        # the answer is streamed to the page as it is generated
+        return list(summarize_policy_positions(query, uoa, summaries, get_index_version(client, policy_positions_rag_collection),
+                                               on_partial=lambda position, points: job.publish([position, points])))
+
+def render_output(output, partial=False):
+    # Ensure output has at least one element
+    if output and len(output) > 0:
+        # Construct the returned text with Policy Position and Justification
+        if 'Your query did not return any relevant entries' in output[0]:
+            return html.P(try_again_message)
+        children = [html.H3("Policy Position"), output[0]]
+        # while streaming, measures are shown once they start arriving
+        if output[1] or not partial:
+            points = [i for i in output[1].split('\n') if i or not partial]
+            children += [
+                html.Br(),
+                html.Br(),
+                html.H3('Proposed measures'),
+                html.Ul([html.Li(i.replace('- ', '', 1)) for i in points])
+            ]
+        return html.P(children)
+    return html.P("No summary available for the given input.")
+
+def render_progress(status):
+    # text streamed so far, once the summary has started
+    if status.get('result'):
+        return render_output(status['result'], partial=True)
+    stage = status['stage']
+    return html.Div([
+        dbc.Spinner(size='sm', color='primary', spinner_class_name='me-2'),
+        stage_messages.get(stage, "Waiting in queue...")
+    ], className='text-muted')
+
 # Layout for the Topic Summaries Page
 def policy_positions_layout():
     return html.Div(
@@ -124,13 +184,10 @@ def policy_positions_layout():
                 className="border border-primary"
             ),
             
-            # Output Paragraph with Loading Icon
-            dcc.Loading(
-                id="loading-output-rag",
-                type="circle",  # You can choose other types like 'circle', 'dot', etc.
-                children=html.Div(id='output-paragraph-rag', className='mt-4'),
-                style={'position': 'relative'}
-            )
+            # Output Paragraph, filled in stage by stage while the query runs in the background
+            html.Div(id='output-paragraph-rag', className='mt-4'),
+            dcc.Store(id='job-store-rag'),
+            dcc.Interval(id='job-interval-rag', interval=poll_interval_ms, disabled=True)
         ],
         className='content'
     )
@@ -144,11 +201,8 @@ def policy_positions_callbacks(app, data):
         Input('parliament-dropdown-rag', 'value')
     )
     def update_party_options(selected_parliament):
-        selection_options = data['demographics']
         if selected_parliament:
-            parties = selection_options['member_party'][selection_options['parliament']==int(parliaments[selected_parliament])]
-
-            parties = sorted(parties.unique())
+            parties = get_selection_index(data, 'demographics').parties(parliament_code(parliaments[selected_parliament]))
             return parties, parties[0]
         # If no parliament selected, return empty options and no value
         return [], None
@@ -178,52 +232,28 @@ def policy_positions_callbacks(app, data):
 
         trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
 
-        selection_options = data['demographics']
+        if not selected_parliament:
+            raise PreventUpdate
 
-        # Filter by parliament
-        if selected_parliament:
-            selection_options = selection_options[
-                selection_options['parliament'] == int(parliaments[selected_parliament])
-            ]
-        else:
-            selection_options = selection_options.copy()
+        selection_index = get_selection_index(data, 'demographics')
+        parliament = parliament_code(parliaments[selected_parliament])
 
-        # Filter by party
-        if selected_party:
-            selection_options = selection_options[
-                selection_options['member_party'] == selected_party
-            ]
+        # Constituency options always follow Parliament and Party
+        constituency_options = selection_index.constituency_options(parliament, selected_party, all_option=False)
 
         if trigger_id in ['parliament-dropdown-rag', 'party-dropdown-rag', 'reset-button-rag']:
             # When Parliament or Party is changed
-            # Update Constituency options based on Parliament and Party
-            constituencies = sorted(selection_options['member_constituency'].unique())
-            constituency_options = [{'label': c, 'value': c} for c in constituencies]
-
             # Update Member options based on Parliament and Party (no constituency filter)
-            members = sorted(selection_options['member_name'].unique())
-            member_options = [{'label': m, 'value': m} for m in members]
+            member_options = selection_index.member_options(parliament, selected_party, all_option=False)
 
             # Reset Constituency and Member selections to None
             new_selected_constituency = None
             new_selected_member = None
 
         elif trigger_id == 'constituency-dropdown-rag':
-            if selected_constituency:
-                # User changed constituency, update members accordingly
-                filtered_members = selection_options[
-                    selection_options['member_constituency'] == selected_constituency
-                ]
-                members = sorted(filtered_members['member_name'].unique())
-                member_options = [{'label': m, 'value': m} for m in members]
-            else:
-                # If no Constituency is selected, show all Members based on Parliament and Party
-                members = sorted(selection_options['member_name'].unique())
-                member_options = [{'label': m, 'value': m} for m in members]
-
-            # Constituency options remain unchanged
-            constituencies = sorted(selection_options['member_constituency'].unique())
-            constituency_options = [{'label': c, 'value': c} for c in constituencies]
+            # User changed constituency, update members accordingly
+            # If no Constituency is selected, this shows all Members based on Parliament and Party
+            member_options = selection_index.member_options(parliament, selected_party, selected_constituency, all_option=False)
 
             # Reset Member selection to None
             new_selected_constituency = selected_constituency
@@ -232,36 +262,19 @@ def policy_positions_callbacks(app, data):
         elif trigger_id == 'member-dropdown-rag':
             if selected_member:
                 # User changed member, automatically set constituency
-                filtered_member = selection_options[
-                    selection_options['member_name'] == selected_member
-                ]
-                if not filtered_member.empty:
-                    new_selected_constituency = filtered_member.iloc[0]['member_constituency']
-                    
-                    # Update Constituency options based on Parliament and Party
-                    constituencies = sorted(selection_options['member_constituency'].unique())
-                    constituency_options = [{'label': c, 'value': c} for c in constituencies]
-
-                    # Update Member options based on the new Constituency
-                    filtered_members = selection_options[
-                        selection_options['member_constituency'] == new_selected_constituency
-                    ]
-                    members = sorted(filtered_members['member_name'].unique())
-                    member_options = [{'label': m, 'value': m} for m in members]
-
-                    # Set Member selection to the selected member
-                    new_selected_member = selected_member
-                else:
+                new_selected_constituency = selection_index.constituency_of(parliament, selected_member, selected_party)
+                if new_selected_constituency is None:
                     # If selected member not found, prevent update
                     raise PreventUpdate
+
+                # Update Member options based on the new Constituency
+                member_options = selection_index.member_options(parliament, selected_party, new_selected_constituency, all_option=False)
+
+                # Set Member selection to the selected member
+                new_selected_member = selected_member
             else:
                 # If no Member is selected, show all Members based on Parliament and Party
-                members = sorted(selection_options['member_name'].unique())
-                member_options = [{'label': m, 'value': m} for m in members]
-
-                # Constituency options remain unchanged
-                constituencies = sorted(selection_options['member_constituency'].unique())
-                constituency_options = [{'label': c, 'value': c} for c in constituencies]
+                member_options = selection_index.member_options(parliament, selected_party, all_option=False)
 
                 # Reset Member selection to None
                 new_selected_constituency = None
@@ -286,52 +299,45 @@ def policy_positions_callbacks(app, data):
             return ''
         raise PreventUpdate            
 
-    # Callback to handle submit and display output paragraph
+    # Callback to start a query on submit and poll it until its output is ready
     @app.callback(
         Output('output-paragraph-rag', 'children'),
+        Output('job-store-rag', 'data'),
+        Output('job-interval-rag', 'disabled'),
         Input('submit-button-rag', 'n_clicks'),
+        Input('job-interval-rag', 'n_intervals'),
         State('parliament-dropdown-rag', 'value'),
         State('party-dropdown-rag', 'value'),
         State('constituency-dropdown-rag', 'value'),
         State('member-dropdown-rag', 'value'),
-        State('text-input-rag', 'value')
+        State('text-input-rag', 'value'),
+        State('job-store-rag', 'data')
     )
-    def update_output(n_clicks, selected_parliament, selected_party, selected_constituency, selected_member, query):
+    def update_output(n_clicks, n_intervals, selected_parliament, selected_party, selected_constituency, selected_member, query, job_id):
+        ctx = callback_context
+        trigger_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else None
+
+        if trigger_id == 'job-interval-rag':
+            if not job_id:
+                return no_update, None, True
+            status = job_runner.status(job_id)
+            if status is None:
+                return html.P("An error occurred: the request was lost, please submit it again."), None, True
+            if status['status'] == 'failed':
+                # Handle potential errors gracefully
+                return html.P(f"An error occurred: {status['error']}"), None, True
+            if status['status'] == 'done':
+                return render_output(status['result']), None, True
+            return render_progress(status), no_update, no_update
+
         if n_clicks:
             if not query:
-                return html.P("Please enter some text before submitting.")
+                return html.P("Please enter some text before submitting."), None, True
             try:
-                responses = query_vector_embeddings(query, top_k_rag_policy_positions, client, policy_positions_rag_collection, int(parliaments[selected_parliament]), selected_party, selected_constituency, selected_member, output_field=["policy_positions"])                
-                summaries = [i['entity']['policy_positions'] for i in responses]
-                # get unit of analysis
-                if selected_member:
-                    uoa = 'MP'
-                elif selected_constituency:
-                    uoa = 'Constituency'
-                else:
-                    uoa = 'Party'
-                output = summarize_policy_positions(query, uoa, summaries)
-                # Ensure output has at least one element
-                if output and len(output) > 0:
-                    # Construct the returned text with Policy Position and Justification
-                    if 'Your query did not return any relevant entries' in output[0]:
-                        returned_text = html.P(try_again_message)
-                    else:
-                        returned_text = html.P([
-                            html.H3("Policy Position"),
-                            output[0],
-                            html.Br(),
-                            html.Br(),
-                            html.H3('Proposed measures'),
-                            html.Ul([html.Li(i.replace('- ', '', 1)) for i in output[1].split('\n')])
-                            ]
-                            )
-                    return returned_text
-                else:
-                    return html.P("No summary available for the given input.")
+                # queue the query and return straight away; the interval picks up its progress
+                job_id = job_runner.submit(policy_positions_job, query, parliament_code(parliaments[selected_parliament]), selected_party, selected_constituency, selected_member)
             except Exception as e:
-                # Handle potential errors gracefully
-                return html.P(f"An error occurred: {str(e)}")
+                return html.P(f"An error occurred: {str(e)}"), None, True
+            return render_progress({'stage': None}), job_id, False
         # Return empty string if submit button hasn't been clicked
-        return ""
-
+        return "", None, True
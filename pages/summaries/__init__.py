@@ -1,7 +1,8 @@
 from dash import html, dcc, Input, Output, dash_table
 import dash_bootstrap_components as dbc
 
-from utils import parliaments, parliament_sessions
+from utils import parliaments, parliament_code, parliament_sessions
+from utils.selection_index import get_selection_index
 
 
 def summaries_layout():
@@ -235,13 +236,8 @@ def summaries_callbacks(app, data):
         if selected_parliament == 'All':
             # If 'All' is selected, reset options to include only 'All'
             return [{'label': 'All', 'value': 'All'}], 'All'
-        speech_summary_df = data['speech_summaries']
-        # Filter the dataframe based on the selected parliament session
-        speech_summary_df= speech_summary_df[speech_summary_df['parliament'] == parliaments[selected_parliament]]
-        # Get unique constituencies
-        constituencies = sorted(speech_summary_df['member_constituency'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': const, 'value': const} for const in constituencies]
+        # Get constituencies of the selected parliament session from the shared index
+        options = get_selection_index(data, 'speech_summaries').constituency_options(parliament_code(parliaments[selected_parliament]))
         return options, 'All'
 
     # Callback to update Member Name options based on selected session and constituency
@@ -252,16 +248,8 @@ def summaries_callbacks(app, data):
         Input('constituency-dropdown-summaries', 'value')]
     )
     def update_member_options(selected_parliament, selected_constituency):
-        speech_summary_df = data['speech_agg']
-        # Start with filtering by parliament session
-        speech_summary_df = speech_summary_df[speech_summary_df['parliament'] == parliaments[selected_parliament]]
-        # Further filter by constituency if not 'All'
-        if selected_constituency and selected_constituency != 'All':
-            speech_summary_df = speech_summary_df[speech_summary_df['member_constituency'] == selected_constituency]
-        # Get unique member names
-        members = sorted(speech_summary_df['member_name'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': member, 'value': member} for member in members]
+        # Get member names of the selected parliament session and constituency from the shared index
+        options = get_selection_index(data, 'speech_agg').member_options(parliament_code(parliaments[selected_parliament]), constituency=selected_constituency)
         return options, 'All'
 
     # Callback to update the summaries graph and table on Page 1
@@ -275,7 +263,7 @@ def summaries_callbacks(app, data):
         speech_summary_df = data['speech_summaries']
 
         if selected_parliament != 'All' and selected_parliament:
-            speech_summary_df = speech_summary_df[speech_summary_df['parliament'] == int(parliaments[selected_parliament])]
+            speech_summary_df = speech_summary_df[speech_summary_df['parliament'] == parliament_code(parliaments[selected_parliament])]
         
         # Further filter based on selected_constituency
         if selected_constituency != 'All' and selected_constituency:
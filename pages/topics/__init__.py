@@ -3,7 +3,8 @@ import dash_bootstrap_components as dbc
 import plotly_express as px
 import textwrap
 
-from utils import PARTY_COLOURS, parliaments, parliament_sessions
+from utils import PARTY_COLOURS, parliaments, parliament_code, parliament_sessions
+from utils.selection_index import get_selection_index
 
 def topics_layout():
     return html.Div(
@@ -136,14 +137,8 @@ def topics_callbacks(app, data):
         if selected_parliament == 'All':
             # If 'All' is selected, reset options to include only 'All'
             return [{'label': 'All', 'value': 'All'}], 'All'
-        topics_df = data['topics']
-        
-        # Filter the dataframe based on the selected parliament session
-        topics_df = topics_df[topics_df['parliament'] == parliaments[selected_parliament]]
-        # Get unique constituencies
-        constituencies = sorted(topics_df['member_constituency'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': const, 'value': const} for const in constituencies]
+        # Get constituencies of the selected parliament session from the shared index
+        options = get_selection_index(data, 'topics').constituency_options(parliament_code(parliaments[selected_parliament]))
         return options, 'All'
 
     # Callback to update Member Name options based on selected session and constituency
@@ -154,17 +149,8 @@ def topics_callbacks(app, data):
         Input('constituency-dropdown-topics', 'value')]
     )
     def update_member_options(selected_parliament, selected_constituency):
-        topics_df = data['topics']
-        # Start with filtering by parliament session
-        topics_df = topics_df[topics_df['parliament'] == parliaments[selected_parliament]]
-
-        # Further filter by constituency if not 'All'
-        if selected_constituency and selected_constituency != 'All':
-            topics_df = topics_df[topics_df['member_constituency'] == selected_constituency]
-        # Get unique member names
-        members = sorted(topics_df['member_name'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': member, 'value': member} for member in members]
+        # Get member names of the selected parliament session and constituency from the shared index
+        options = get_selection_index(data, 'topics').member_options(parliament_code(parliaments[selected_parliament]), constituency=selected_constituency)
         return options, 'All'
 
     # Callback to update the topics graph and table on Page 1
@@ -179,7 +165,7 @@ def topics_callbacks(app, data):
         topics_df = data['topics']
 
         # Filter by parliament
-        topics_df = topics_df[topics_df['parliament'] == parliaments[selected_parliament]]
+        topics_df = topics_df[topics_df['parliament'] == parliament_code(parliaments[selected_parliament])]
         
         # Further filter based on selected_constituency
         if selected_constituency != 'All' and selected_constituency:
@@ -193,9 +179,9 @@ def topics_callbacks(app, data):
 
         # grouping and aggregation here instead of SQL to retain member name information for filtering first
 
-        topics_df = topics_df.groupby(['member_party', 'topic_assigned']).agg({'count_speeches': 'sum'}).reset_index()
+        topics_df = topics_df.groupby(['member_party', 'topic_assigned'], observed=True).agg({'count_speeches': 'sum'}).reset_index()
 
-        topics_df['perc_speeches'] = topics_df['count_speeches']*100 / topics_df.groupby('member_party')['count_speeches'].transform('sum')
+        topics_df['perc_speeches'] = topics_df['count_speeches']*100 / topics_df.groupby('member_party', observed=True)['count_speeches'].transform('sum')
 
         # wrap text for later
         topics_df['topic_assigned'] = topics_df['topic_assigned'].apply(lambda x: '<br>'.join(textwrap.wrap(x, 30)))
@@ -1,10 +1,14 @@
 from dash import html, dcc, Input, Output
 import dash_bootstrap_components as dbc
-import plotly_express as px
 
 
-from utils import PARTY_COLOURS, parliaments, parliament_sessions
-from pages.topics_questions.utils import group_and_aggregate, filter_data_by_filters
+from utils import parliaments, parliament_code, parliament_sessions
+from utils.figure_views import view_toggle, template_store, register_figure_view, bar_view_data
+from figure_cache import cached_figure
+from utils.selection_index import get_selection_index
+from pages.topics_questions.utils import get_count_cube
+
+bar_views = {'percentage': "Percentage", 'count': "Count"}
 
 def topics_questions_layout():
     return html.Div(
@@ -104,6 +108,8 @@ def topics_questions_layout():
             # Graph Section with Fixed Height
             dbc.Row([
                 dbc.Col([
+                    view_toggle('topics-assigned-view', bar_views, 'percentage'),
+                    dcc.Store(id='topics-assigned-store'),
                     dcc.Graph(
                         id='topics-assigned-graph',
                         config={"responsive": True},
@@ -112,6 +118,8 @@ def topics_questions_layout():
                 ], xs=12, md=6, className="mb-4"),
 
                 dbc.Col([
+                    view_toggle('questions-ministry-view', bar_views, 'percentage'),
+                    dcc.Store(id='questions-ministry-store'),
                     dcc.Graph(
                         id='questions-ministry-graph',
                         config={"responsive": True},
@@ -119,6 +127,7 @@ def topics_questions_layout():
                     )
                 ], xs=12, md=6, className="mb-4")
             ]),
+            template_store('figure-template-topics-questions'),
         ],
         className='content'
     )
@@ -145,14 +154,8 @@ def topics_questions_callbacks(app, data):
         if selected_parliament == 'All':
             # If 'All' is selected, reset options to include only 'All'
             return [{'label': 'All', 'value': 'All'}], 'All'
-        options_df = data['member_metrics']
-        
-        # Filter the dataframe based on the selected parliament session
-        options_df = options_df[options_df['parliament'] == parliaments[selected_parliament]]
-        # Get unique constituencies
-        constituencies = sorted(options_df['member_constituency'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': const, 'value': const} for const in constituencies]
+        # Get constituencies of the selected parliament session from the shared index
+        options = get_selection_index(data, 'member_metrics').constituency_options(parliament_code(parliaments[selected_parliament]))
         return options, 'All'
 
     # Callback to update Member Name options based on selected session and constituency
@@ -163,306 +166,50 @@ def topics_questions_callbacks(app, data):
         Input('constituency-dropdown-topics-questions', 'value')]
     )
     def update_member_options(selected_parliament, selected_constituency):
-        options_df = data['member_metrics']
-        # Start with filtering by parliament session
-        options_df = options_df[options_df['parliament'] == parliaments[selected_parliament]]
-
-        # Further filter by constituency if not 'All'
-        if selected_constituency and selected_constituency != 'All':
-            options_df = options_df[options_df['member_constituency'] == selected_constituency]
-        # Get unique member names
-        members = sorted(options_df['member_name'].unique())
-        # Add 'All' option
-        options = [{'label': 'All', 'value': 'All'}] + [{'label': member, 'value': member} for member in members]
+        # Get member names of the selected parliament session and constituency from the shared index
+        options = get_selection_index(data, 'member_metrics').member_options(parliament_code(parliaments[selected_parliament]), constituency=selected_constituency)
         return options, 'All'
 
-    # Callback to update the questions graph and table on Page 1
+    # Callback to update the data of the topics and questions graphs
     @app.callback(
-        [Output('topics-assigned-graph', 'figure'),
-        Output('questions-ministry-graph', 'figure')],
+        [Output('topics-assigned-store', 'data'),
+        Output('questions-ministry-store', 'data')],
         [Input('parliament-dropdown-topics-questions', 'value'),
         Input('constituency-dropdown-topics-questions', 'value'),
         Input('member-dropdown-topics-questions', 'value')]
     )
+    @cached_figure('topics_questions', data, prerender=[(session, 'All', 'All') for session in parliament_sessions])
     def update_graph_and_table(selected_parliament, selected_constituency, selected_member):
 
-        # get data
-        selected_parliament = parliaments[selected_parliament]
-
-        questions_ministry_df = filter_data_by_filters(data, 'questions', selected_parliament, selected_constituency, selected_member)
-        topics_df = filter_data_by_filters(data, 'topics', selected_parliament, selected_constituency, selected_member)
-
-        # grouping and aggregation here instead of SQL to retain member name information for filtering first        
-        topics_df = group_and_aggregate(topics_df, 'topic_assigned', 'count_topic_speeches', 'perc_speeches')
-        questions_ministry_df = group_and_aggregate(questions_ministry_df, 'ministry_addressed', 'count_questions_ministry', 'perc_questions')
-
-        # speech topics graph
-        # create orders manually
-
-        orders = []
-        for i in ['perc_speeches', 'count_topic_speeches']:
-            orders.append(topics_df.groupby('topic_assigned').sum().sort_values(i).index)
-
-        prop_order, count_order = orders
-
-        fig_topics_prop = px.bar(
-            topics_df,
-            x='perc_speeches',
-            y='topic_assigned',
-            color='member_party',
-            barmode='relative',
-            color_discrete_map=PARTY_COLOURS,
-            custom_data='member_party'
-        )
-
-        fig_topics_prop.update_traces(
-            hovertemplate=
-                '<b>%{y}</b><br>' +
-                'Party: %{customdata[0]}<br>' +
-                'Percentage Speeches: %{x:.1f}<extra></extra>'  # Removes the secondary box with trace name
-        )
-
-        fig_topics_count = px.bar(
-            topics_df,
-            x='count_topic_speeches',
-            y='topic_assigned',
-            color='member_party',
-            barmode='relative',
-            color_discrete_map=PARTY_COLOURS,
-            custom_data="member_party"
-        )
-
-        fig_topics_count.update_traces(
-            hovertemplate=
-                '<b>%{y}</b><br>' +
-                'Party: %{customdata[0]}<br>' +
-                'Total Speeches: %{x}<extra></extra>'  # Removes the secondary box with trace name
-        )
-
-        # Combine the two figures by adding traces from fig_prop to fig_count
-        for trace in fig_topics_count.data:
-            fig_topics_prop.add_trace(trace)
-
-        # Total number of traces per view
-        num_traces = len(fig_topics_prop.data) // 2
-
-        # Initially, show only count traces and hide proportion traces
-        for i, trace in enumerate(fig_topics_prop.data):
-            if i >= num_traces:
-                trace.visible = False
-
-        # Define the buttons
-        buttons = [
-            dict(
-                label="Percentage",
-                method="update",
-                args=[
-                    {"visible": [True]*num_traces + [False]*num_traces},
-                    {"title": "Speeches assigned to Topics",
-                    "xaxis": {"title": "Percentage of Speeches",
-                            "showgrid": True,
-                            "gridwidth": 1,
-                            "gridcolor": 'LightGray'},
-                    "yaxis": {
-                            "title": "Topic Assigned",
-                            "categoryorder": "array",
-                            "categoryarray": prop_order,
-                            "tickfont": {"size": 10}
-                        }}
-                ]
-            ),
-            dict(
-                label="Count",
-                method="update",
-                args=[
-                    {"visible": [False]*num_traces + [True]*num_traces},
-                    {"title": "Speeches assigned to Topics",
-                    "xaxis": {"title": "Speeches",
-                            "showgrid": True,
-                            "gridwidth": 1,
-                            "gridcolor": 'LightGray'},
-                    "yaxis": {
-                            "title": "Topic Assigned",
-                            "categoryorder": "array",
-                            "categoryarray": count_order,
-                            "tickfont": {"size": 10}
-                        }}
-                ]
-            )
-        ]
-
-        # Update the layout to include the buttons
-        fig_topics_prop.update_layout(
-            height=600,
-            legend=dict(title=dict(text='Party'),
-                        yanchor="bottom",
-                        y=0,
-                        xanchor="right",
-                        x=0.99),
-            margin=dict(l=0, r=0, t=80),
-            updatemenus=[
-                dict(
-                    type="buttons",
-                    direction="left",
-                    buttons=buttons,
-                    pad={"r": 10, "t": 10},
-                    showactive=True,
-                    x=1,
-                    xanchor="right",
-                    y=1,
-                    yanchor="bottom"
-                )
-            ],
-            title=dict(
-                text="Speeches assigned to Topics",
-            ),
-            xaxis_title="Speeches",
-            yaxis_title="Topic Assigned",
-            template='plotly_white'
-        )
-
-        fig_topics_prop.update_yaxes(
-            categoryorder='array',
-            categoryarray=prop_order,
-            tickfont=dict(
-                size=10)
-        )
-
-        fig_topics_prop.update_xaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
-
-        # ministry addressed graph
-
-        # create orders manually
-
-        orders = []
-        for i in ['perc_questions', 'count_questions_ministry']:
-            orders.append(questions_ministry_df.groupby('ministry_addressed').sum().sort_values(i).index)
-
-        prop_order, count_order = orders
-
-        fig_questions_prop = px.bar(
-            questions_ministry_df,
-            x='perc_questions',
-            y='ministry_addressed',
-            color='member_party',
-            barmode='relative',
-            color_discrete_map=PARTY_COLOURS,
-            custom_data='member_party'
-        )
-
-        fig_questions_prop.update_traces(
-            hovertemplate=
-                '<b>%{y}</b><br>' +
-                'Party: %{customdata[0]}<br>' +
-                'Percentage Questions: %{x:.1f}<extra></extra>'  # Removes the secondary box with trace name
+        # counts per party and category from the per-snapshot cubes
+        selected_parliament = parliament_code(parliaments[selected_parliament])
+
+        topics_categories, topics_parties = get_count_cube(data, 'topics', 'topic_assigned', 'count_topic_speeches').bars(
+            selected_parliament, selected_constituency, selected_member)
+        questions_categories, questions_parties = get_count_cube(data, 'questions', 'ministry_addressed', 'count_questions_ministry').bars(
+            selected_parliament, selected_constituency, selected_member)
+
+        # percentage and count views are built in the browser from the counts
+        topics_view = bar_view_data(
+            topics_categories, topics_parties,
+            title="Speeches assigned to Topics",
+            category_title="Topic Assigned",
+            value_titles={'percentage': "Percentage of Speeches", 'count': "Speeches"},
+            hover_labels={'percentage': "Percentage Speeches", 'count': "Total Speeches"}
         )
 
-        fig_questions_count = px.bar(
-            questions_ministry_df,
-            x='count_questions_ministry',
-            y='ministry_addressed',
-            color='member_party',
-            barmode='relative',
-            color_discrete_map=PARTY_COLOURS,
-            custom_data="member_party"
+        questions_view = bar_view_data(
+            questions_categories, questions_parties,
+            title="Questions addressed to Ministries",
+            category_title="Ministry Addressed",
+            value_titles={'percentage': "Percentage of Questions", 'count': "Questions"},
+            hover_labels={'percentage': "Percentage Questions", 'count': "Total Questions"}
         )
 
-        fig_questions_count.update_traces(
-            hovertemplate=
-                '<b>%{y}</b><br>' +
-                'Party: %{customdata[0]}<br>' +
-                'Total Questions: %{x}<extra></extra>'  # Removes the secondary box with trace name
-        )
-
-        # Combine the two figures by adding traces from fig_prop to fig_count
-        for trace in fig_questions_count.data:
-            fig_questions_prop.add_trace(trace)
-
-        # Total number of traces per view
-        num_traces = len(fig_questions_prop.data) // 2
-
-        # Initially, show only count traces and hide proportion traces
-        for i, trace in enumerate(fig_questions_prop.data):
-            if i >= num_traces:
-                trace.visible = False
-
-        # Define the buttons
-        buttons = [
-            dict(
-                label="Percentage",
-                method="update",
-                args=[
-                    {"visible": [True]*num_traces + [False]*num_traces},
-                    {"title": "Questions addressed to Ministries",
-                    "xaxis": {"title": "Percentage of Questions",
-                            "showgrid": True,
-                            "gridwidth": 1,
-                            "gridcolor": 'LightGray'},
-                    "yaxis": {
-                            "title": "Ministry Addressed",
-                            "categoryorder": "array",
-                            "categoryarray": prop_order,
-                            "tickfont": {"size": 10}
-                        }}
-                ]
-            ),
-            dict(
-                label="Count",
-                method="update",
-                args=[
-                    {"visible": [False]*num_traces + [True]*num_traces},
-                    {"title": "Questions addressed to Ministries",
-                    "xaxis": {"title": "Questions",
-                            "showgrid": True,
-                            "gridwidth": 1,
-                            "gridcolor": 'LightGray'},
-                    "yaxis": {
-                            "title": "Ministry Addressed",
-                            "categoryorder": "array",
-                            "categoryarray": count_order,
-                            "tickfont": {"size": 10}
-                        }}
-                ]
-            )
-        ]
-
-        # Update the layout to include the buttons
-        fig_questions_prop.update_layout(
-            height=600,
-            legend=dict(title=dict(text='Party'),
-                        yanchor="bottom",
-                        y=0,
-                        xanchor="right",
-                        x=0.99),
-            margin=dict(l=0, r=0, t=80),
-            updatemenus=[
-                dict(
-                    type="buttons",
-                    direction="left",
-                    buttons=buttons,
-                    pad={"r": 10, "t": 10},
-                    showactive=True,
-                    x=1,
-                    xanchor="right",
-                    y=1,
-                    yanchor="bottom"
-                )
-            ],
-            title=dict(
-                text="Questions addressed to Ministries",
-            ),
-            xaxis_title="Questions",
-            yaxis_title="Ministry Addressed",
-            template='plotly_white'
-        )
-
-        fig_questions_prop.update_yaxes(
-            categoryorder='array',
-            categoryarray=prop_order,
-            tickfont=dict(
-                size=10)
-        )
+        return topics_view, questions_view
 
-        fig_questions_prop.update_xaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
-        
-        return fig_topics_prop, fig_questions_prop
\ No newline at end of file
+    # Clientside callbacks drawing the selected view of each graph
+    register_figure_view(app, 'topics-assigned-graph', 'topics-assigned-store', 'topics-assigned-view',
+                         'figure-template-topics-questions', 'bar_view')
+    register_figure_view(app, 'questions-ministry-graph', 'questions-ministry-store', 'questions-ministry-view',
+                         'figure-template-topics-questions', 'bar_view')
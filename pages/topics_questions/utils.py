@@ -1,26 +1,83 @@
 import textwrap
 
-def group_and_aggregate(df, group_var, count_var, out_varname):
-    df = df.groupby(['member_party', group_var]).agg({count_var: 'sum'}).reset_index()
-    df[out_varname] = df[count_var]*100 / df.groupby('member_party')[count_var].transform('sum')
-
-    # wrap text for later
-    df[group_var] = df[group_var].apply(lambda x: '<br>'.join(textwrap.wrap(x, 30)))
-    return df
-
-def filter_data_by_filters(data, table_name, selected_parliament, selected_constituency, selected_member):
-    df = data[table_name]
-
-    # Filter by parliament
-    df = df[df['parliament'] == selected_parliament]
-    
-    # Further filter based on selected_constituency
-    if selected_constituency != 'All':
-        df = df[df['member_constituency'] == selected_constituency]
-    
-    # Further filter based on selected_member
-    if selected_member != 'All':
-        df = df[df['member_name'] == selected_member]
-
-    return df
+import numpy as np
+import pandas as pd
 
+# the grouping levels a selection can ask for; 'All' constituency / member roll up over that column
+cube_levels = [
+    ('parliament',),
+    ('parliament', 'member_constituency'),
+    ('parliament', 'member_name'),
+    ('parliament', 'member_constituency', 'member_name')
+]
+
+
+def wrap_label(label):
+    # wrap text for the bar chart axis
+    return '<br>'.join(textwrap.wrap(label, 30))
+
+
+class CountCube:
+    # counts of a topics / questions table summed per (party, category) for every selection of the
+    # parliament, constituency and member dropdowns, computed once per data snapshot. Each level is one
+    # frame sorted by its key, party and category, so a selection is a dict lookup and a slice of arrays.
+    def __init__(self, df, category_var, count_var):
+        categories = pd.Categorical(df[category_var])
+        parties = pd.Categorical(df['member_party'])
+
+        self.categories = list(categories.categories)
+        self.labels = np.array([wrap_label(i) for i in self.categories], dtype=object)
+        self.parties = list(parties.categories)
+
+        # missing parties / categories are dropped, as by the groupby they replace
+        known = (categories.codes >= 0) & (parties.codes >= 0)
+        cells = pd.DataFrame({
+            'parliament': df['parliament'].to_numpy()[known],
+            'member_constituency': df['member_constituency'].to_numpy()[known],
+            'member_name': df['member_name'].to_numpy()[known],
+            'party': parties.codes[known],
+            'category': categories.codes[known],
+            'count': df[count_var].to_numpy()[known]
+        })
+
+        self._levels = {}
+        for level in cube_levels:
+            grouped = cells.groupby(list(level) + ['party', 'category'], sort=True)['count'].sum().reset_index()
+            keys = list(grouped[list(level)].itertuples(index=False, name=None))
+            starts = [0] + [i for i in range(1, len(keys)) if keys[i] != keys[i - 1]]
+            stops = starts[1:] + [len(keys)]
+            self._levels[level] = (
+                {keys[start]: slice(start, stop) for start, stop in zip(starts, stops)},
+                grouped['party'].to_numpy(),
+                grouped['category'].to_numpy(),
+                grouped['count'].to_numpy()
+            )
+
+    def bars(self, parliament, constituency='All', member='All'):
+        # (category labels, [{'name', 'category', 'count'} per party]) of one selection, categories
+        # limited to those present and referred to by position in the returned labels
+        level = ('parliament',) + (('member_constituency',) if constituency != 'All' else ()) + \
+            (('member_name',) if member != 'All' else ())
+        key = (parliament,) + ((constituency,) if constituency != 'All' else ()) + ((member,) if member != 'All' else ())
+
+        slices, party_codes, category_codes, counts = self._levels[level]
+        selection = slices.get(key)
+        if selection is None:
+            return [], []
+        party_codes, category_codes, counts = party_codes[selection], category_codes[selection], counts[selection]
+
+        present = np.unique(category_codes)
+        category_positions = np.searchsorted(present, category_codes)
+        bounds = np.flatnonzero(np.diff(party_codes)) + 1
+        parties = [
+            {'name': self.parties[party_codes[start]],
+             'category': category_positions[start:stop].tolist(),
+             'count': counts[start:stop].tolist()}
+            for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(party_codes)])
+        ]
+        return self.labels[present].tolist(), parties
+
+
+def get_count_cube(data, table_name, category_var, count_var):
+    return data.derived(('count_cube', table_name),
+                        lambda snapshot: CountCube(snapshot[table_name], category_var, count_var))
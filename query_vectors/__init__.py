@@ -1,25 +1,95 @@
+import hashlib
+import os
+
+import numpy as np
 from openai import OpenAI
 
 from utils import embedding_model, summarize_policy_model, get_response_format, system_prompt
+from .cache import embedding_cache, response_cache, normalize_query
+from .streaming import PartialJSONFields
+from .single_flight import single_flight
+from .batching import MicroBatcher, embedding_batches, embedding_batch_window_seconds
+from .index_version import get_index_version, set_index_version
+from .local_index import get_local_index
+from .ann_index import get_ann_index
+
+# 'remote' searches the Zilliz collection, 'local' an exact in-process copy of it (see query_vectors.local_index)
+# and 'ann' an approximate, partitioned in-process index (see query_vectors.ann_index)
+vector_search_backend = os.environ.get('VECTOR_SEARCH_BACKEND', 'remote')
 
 # gpt client
 gpt_client = OpenAI()
 
 def get_vector_from_query(query):
 
+    # repeated queries (from any worker) skip the embeddings round trip
+    cached_vector = embedding_cache.get(query, embedding_model)
+    if cached_vector is not None:
+        return cached_vector.tolist()
+
+    # identical queries in flight at the same time share one embeddings call
+    return single_flight.do(['embedding', embedding_model, normalize_query(query)], lambda: _embed_query(query))
+
+def _embed_query(query):
+    # another worker may have embedded it while this one waited
+    cached_vector = embedding_cache.get(query, embedding_model, count=False)
+    if cached_vector is not None:
+        return cached_vector.tolist()
+
+    # concurrent single queries are sent together by the micro-batcher
+    if embedding_micro_batcher is not None:
+        return embedding_micro_batcher.submit(query).result()
+    return _create_embeddings([query])[0]
+
+def _create_embeddings(queries):
+    # one embeddings call for all queries, vectors returned in the same order and cached
     query_embedding = gpt_client.embeddings.create(
-        input = query,
+        input = queries,
         model = embedding_model
         )
 
-    query_vector = query_embedding.data[0].embedding
+    data = sorted(query_embedding.data, key=lambda i: i.index)
+    if [i.index for i in data] != list(range(len(queries))):
+        # which query a vector belongs to is unknown, none can be trusted or cached
+        raise RuntimeError(f"embeddings call returned {len(data)} vectors for {len(queries)} inputs")
+    vectors = [i.embedding for i in data]
+
+    for query, query_vector in zip(queries, vectors):
+        embedding_cache.set(query, embedding_model, query_vector)
+
+    return vectors
+
+def get_vectors_from_queries(queries):
+    # batch counterpart of get_vector_from_query for warm-ups and evaluation runs: cached queries are
+    # skipped, duplicates embedded once and the rest sent in as few calls as the batch limits allow
+    vectors = {}
+    pending = []
+    for query in queries:
+        key = normalize_query(query)
+        if key in vectors:
+            continue
+        cached_vector = embedding_cache.get(query, embedding_model)
+        if cached_vector is not None:
+            vectors[key] = cached_vector.tolist()
+        else:
+            vectors[key] = None
+            pending.append(query)
+
+    for batch in embedding_batches(pending):
+        for query, query_vector in zip(batch, _create_embeddings(batch)):
+            vectors[normalize_query(query)] = query_vector
+
+    return [vectors[normalize_query(query)] for query in queries]
 
-    return query_vector
+embedding_micro_batcher = MicroBatcher(_create_embeddings) if embedding_batch_window_seconds > 0 else None
 
 def query_vector_embeddings(query, top_k_rag, client, query_collection, parliament, party = None, constituency = None, member = None, output_field = []):
     # convert query to vector
     query_vector = get_vector_from_query(query)
 
+    return search_vector(query_vector, top_k_rag, client, query_collection, parliament, party, constituency, member, output_field)
+
+def search_vector(query_vector, top_k_rag, client, query_collection, parliament, party = None, constituency = None, member = None, output_field = []):
     variables = {
         'parliament': parliament,
         'party': party,
@@ -27,6 +97,20 @@ def query_vector_embeddings(query, top_k_rag, client, query_collection, parliame
         'name': member
     }
 
+    # identical searches running at the same time in this worker share one call
+    vector_digest = hashlib.sha256(np.asarray(query_vector, dtype=np.float32).tobytes()).hexdigest()
+    key = ['search', query_collection, vector_digest, variables, top_k_rag, list(output_field)]
+    return single_flight.do(key, lambda: _search_vector(query_vector, top_k_rag, client, query_collection, variables, output_field),
+                            across_workers=False)
+
+def _search_vector(query_vector, top_k_rag, client, query_collection, variables, output_field):
+    if vector_search_backend in ('local', 'ann'):
+        # same result shape as client.search
+        index = get_ann_index(query_collection, client) if vector_search_backend == 'ann' else get_local_index(query_collection, client)
+        retrieved_metadata = index.search([query_vector], filters={key: value for key, value in variables.items() if value is not None},
+                                          limit = top_k_rag, output_fields = output_field)
+        return retrieved_metadata[0]
+
     filters = " AND ".join([f"{key}=='{value}'" if isinstance(value, str) else f"{key}=={value}" for key, value in variables.items() if value is not None])
 
     # Perform a similarity search with automatic query embedding
@@ -38,15 +122,46 @@ def query_vector_embeddings(query, top_k_rag, client, query_collection, parliame
 
 # gpt structured formats output
 
-def summarize_policy_positions(query, uoa, summaries):
-    completion = gpt_client.chat.completions.create(
+def summarize_policy_positions(query, uoa, summaries, index_version = None, on_partial = None):
+    # on_partial(policy_position, policy_points) is called with the text generated so far while the completion streams
+    # identical query + evidence was answered before: skip the completion
+    # the index version is part of the key so workers on different versions keep separate entries
+    cache_key = response_cache.key(normalize_query(query), uoa, summarize_policy_model, list(summaries), index_version)
+    cached_output = response_cache.get(cache_key, index_version)
+    if cached_output is not None:
+        return cached_output[0], cached_output[1]
+
+    # identical requests in flight share one completion; only the first caller sees it stream
+    return single_flight.do(['summary', cache_key, index_version],
+                            lambda: _summarize_policy_positions(query, uoa, summaries, index_version, on_partial, cache_key))
+
+def _summarize_policy_positions(query, uoa, summaries, index_version, on_partial, cache_key):
+    # another worker may have answered it while this one waited
+    cached_output = response_cache.get(cache_key, index_version)
+    if cached_output is not None:
+        return cached_output[0], cached_output[1]
+
+    stream = gpt_client.chat.completions.create(
         model=summarize_policy_model,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": ','.join([f"[Summary {i+1}: {summaries[i]}]" for i in range(len(summaries))])},
         ],
-        response_format=get_response_format(query, uoa)
+        response_format=get_response_format(query, uoa),
+        stream=True
         )
-    
-    output = eval(completion.choices[0].message.content)
-    return output['policy_position'], output['policy_points']
\ No newline at end of file
+
+    # the structured fields are read as they arrive rather than after the whole payload
+    parser = PartialJSONFields(['policy_position', 'policy_points'])
+    for chunk in stream:
+        if not chunk.choices or not chunk.choices[0].delta.content:
+            continue
+        partial = parser.feed(chunk.choices[0].delta.content)
+        if on_partial is not None and partial:
+            on_partial(partial.get('policy_position', ''), partial.get('policy_points', ''))
+
+    output = parser.result()
+
+    response_cache.set(cache_key, [output['policy_position'], output['policy_points']], index_version)
+
+    return output['policy_position'], output['policy_points']
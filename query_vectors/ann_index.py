@@ -0,0 +1,164 @@
+import os
+import threading
+import warnings
+
+import numpy as np
+from scipy.cluster.vq import kmeans2
+
+from utils import local_index_fields, ann_partition_fields
+from .local_index import LocalVectorIndex, as_column, cell, column_arrays, local_index_path, load_or_build, current_index_version
+
+# clusters searched per partition; more means better recall and slower queries (see query_vectors.benchmark_ann)
+ann_nprobe = int(os.environ.get('ANN_NPROBE', 16))
+
+# partitions smaller than this are a single list and searched exactly
+ann_min_partition_rows = 256
+
+
+def factorize(values):
+    # number of distinct values of a column and the code of every row
+    if isinstance(values, np.ndarray):
+        uniques, inverse = np.unique(values, return_inverse=True)
+        return len(uniques), inverse
+    codes = {}
+    inverse = np.array([codes.setdefault(value, len(codes)) for value in values.tolist()], dtype=np.int64)
+    return len(codes), inverse
+
+
+class IVFVectorIndex(LocalVectorIndex):
+    # inverted-file index: rows are split into partitions (one per combination of the partition fields),
+    # each partition is clustered with k-means and a query only scores the rows of the `nprobe` clusters
+    # closest to it in the partitions its filters select.
+    # Rows are stored ordered by partition and cluster, so every cluster is a contiguous slice.
+    def __init__(self, ids, vectors, metadata, partition_keys, partition_lists, centroids, list_offsets, nprobe=ann_nprobe):
+        super().__init__(ids, vectors, metadata)
+        # partition field -> value of that field for each partition
+        self.partition_keys = {field: as_column(values) for field, values in partition_keys.items()}
+        # clusters of partition p are partition_lists[p]:partition_lists[p + 1]
+        self.partition_lists = np.asarray(partition_lists)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        # rows of cluster l are list_offsets[l]:list_offsets[l + 1]
+        self.list_offsets = np.asarray(list_offsets)
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, index, partition_fields, seed=0):
+        # combined partition code of every row
+        codes = np.zeros(len(index), dtype=np.int64)
+        for field in partition_fields:
+            n_values, inverse = factorize(index.metadata[field])
+            codes = codes * n_values + inverse
+        _, partition_of = np.unique(codes, return_inverse=True)
+
+        order = []
+        partition_keys = {field: [] for field in partition_fields}
+        partition_lists = [0]
+        centroids = []
+        list_offsets = [0]
+
+        for rows in np.split(np.argsort(partition_of, kind='stable'), np.cumsum(np.bincount(partition_of))[:-1]):
+            for field in partition_fields:
+                partition_keys[field].append(cell(index.metadata[field], rows[0]))
+
+            vectors = index.vectors[rows]
+            nlist = int(np.sqrt(len(rows))) if len(rows) >= ann_min_partition_rows else 1
+            if nlist > 1:
+                with warnings.catch_warnings():
+                    # an empty cluster is harmless, it just becomes an empty list
+                    warnings.simplefilter('ignore')
+                    partition_centroids, labels = kmeans2(vectors, nlist, minit='++', seed=seed)
+            else:
+                partition_centroids, labels = vectors.mean(axis=0, keepdims=True), np.zeros(len(rows), dtype=np.int64)
+
+            norms = np.linalg.norm(partition_centroids, axis=1, keepdims=True)
+            centroids.append(partition_centroids / np.where(norms == 0, 1, norms))
+            order.append(rows[np.argsort(labels, kind='stable')])
+            list_offsets.extend(list_offsets[-1] + np.cumsum(np.bincount(labels, minlength=nlist)))
+            partition_lists.append(partition_lists[-1] + nlist)
+
+        order = np.concatenate(order)
+        return cls(
+            index.ids[order], index.vectors[order], {field: values[order] for field, values in index.metadata.items()},
+            partition_keys, partition_lists, np.concatenate(centroids), list_offsets
+        )
+
+    def partitions(self, filters):
+        # partitions whose keys agree with the filters on the partition fields
+        mask = np.ones(len(self.partition_lists) - 1, dtype=bool)
+        for field, values in self.partition_keys.items():
+            if field in filters:
+                mask &= values == filters[field]
+        return np.flatnonzero(mask)
+
+    def _probe(self, query, partitions, nprobe):
+        # row positions of the nprobe closest clusters of each partition
+        slices = []
+        for partition in partitions:
+            first, last = self.partition_lists[partition], self.partition_lists[partition + 1]
+            lists = np.arange(first, last)
+            if last - first > nprobe:
+                scores = self.centroids[first:last] @ query
+                lists = lists[np.argpartition(-scores, nprobe - 1)[:nprobe]]
+            slices.extend(np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in lists)
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def search(self, data, filters=None, limit=10, output_fields=(), nprobe=None):
+        filters = filters or {}
+        nprobe = nprobe or self.nprobe
+        queries = self._normalized_queries(data)
+
+        partitions = self.partitions(filters)
+        # filters on other fields are applied to the probed rows
+        residual = self.candidates({field: value for field, value in filters.items() if field not in self.partition_keys})
+
+        results = []
+        for query in queries:
+            positions = self._probe(query, partitions, nprobe)
+            if residual is not None:
+                positions = positions[np.isin(positions, residual, assume_unique=True)]
+            results.append(self._top(self.vectors[positions] @ query, positions, limit, output_fields))
+        return results
+
+    def arrays(self):
+        return {
+            **super().arrays(),
+            **column_arrays('partition_key_', self.partition_keys),
+            'partition_lists': self.partition_lists,
+            'centroids': self.centroids,
+            'list_offsets': self.list_offsets
+        }
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            return cls(
+                f['ids'], f['vectors'], cls.prefixed(f, 'meta_'), cls.prefixed(f, 'partition_key_'),
+                f['partition_lists'], f['centroids'], f['list_offsets']
+            )
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_ann_index(query_collection, client=None):
+    # loaded once per process and index version from <collection>/<version>.ivf.npz; built from the export of
+    # the same version (exported first if needed) otherwise
+    index_version = current_index_version(query_collection, client)
+    path = local_index_path(query_collection, index_version, 'ivf')
+    loaded = _indexes.get(query_collection)
+    if loaded is not None and loaded[0] == path:
+        return loaded[1]
+
+    def build():
+        flat = load_or_build(
+            local_index_path(query_collection, index_version),
+            lambda: LocalVectorIndex.from_milvus(client, query_collection, local_index_fields[query_collection]),
+            LocalVectorIndex.load
+        )
+        return IVFVectorIndex.build(flat, ann_partition_fields[query_collection])
+
+    with _indexes_lock:
+        if _indexes.get(query_collection, (None,))[0] != path:
+            _indexes[query_collection] = (path, load_or_build(path, build, IVFVectorIndex.load))
+    return _indexes[query_collection][1]
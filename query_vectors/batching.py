@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+# limits of a single embeddings call
+embedding_batch_max_inputs = int(os.environ.get('EMBEDDING_BATCH_MAX_INPUTS', 256))
+embedding_batch_max_tokens = int(os.environ.get('EMBEDDING_BATCH_MAX_TOKENS', 100000))
+
+# how long the micro-batcher waits for concurrent queries to join a call, 0 sends each query on its own
+embedding_batch_window_seconds = float(os.environ.get('EMBEDDING_BATCH_WINDOW_MS', 5)) / 1000
+
+
+def estimate_tokens(text):
+    # no tokenizer is installed; about four characters per token for English text, counted as three to err high
+    return len(text) // 3 + 1
+
+
+def embedding_batches(queries, max_inputs=embedding_batch_max_inputs, max_tokens=embedding_batch_max_tokens):
+    # split queries, in order, into batches within the input count and token budget of one call
+    batch = []
+    tokens = 0
+    for query in queries:
+        query_tokens = estimate_tokens(query)
+        if batch and (len(batch) >= max_inputs or tokens + query_tokens > max_tokens):
+            yield batch
+            batch = []
+            tokens = 0
+        batch.append(query)
+        tokens += query_tokens
+    if batch:
+        yield batch
+
+
+class MicroBatcher:
+    # collects single queries submitted by concurrent callers for a few milliseconds and sends them
+    # through embed_many(queries) -> vectors together, resolving each caller's future with its own vector
+    def __init__(self, embed_many, window_seconds=embedding_batch_window_seconds,
+                 max_inputs=embedding_batch_max_inputs, max_tokens=embedding_batch_max_tokens):
+        self._embed_many = embed_many
+        self.window_seconds = window_seconds
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = None
+        # per-process counters
+        self.calls = 0
+        self.queries = 0
+
+    def submit(self, query):
+        future = Future()
+        with self._condition:
+            self._start()
+            self._pending.append((query, future))
+            self._condition.notify()
+        return future
+
+    def _start(self):
+        # started on first use, i.e. after gunicorn has forked the worker
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='embedding-micro-batcher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                # a lone query is sent at once, queries arriving while it is in flight queue up for the next
+                # call; several waiting means a burst, the rest of which gets the window to join
+                burst = len(self._pending) > 1
+            if burst:
+                time.sleep(self.window_seconds)
+            with self._condition:
+                pending, self._pending = self._pending, []
+
+            queries = [query for query, _ in pending]
+            start = 0
+            for batch in embedding_batches(queries, self.max_inputs, self.max_tokens):
+                futures = [future for _, future in pending[start:start + len(batch)]]
+                start += len(batch)
+                self._send(batch, futures)
+
+    def _send(self, batch, futures):
+        self.calls += 1
+        self.queries += len(batch)
+        try:
+            vectors = self._embed_many(batch)
+            if len(vectors) != len(batch):
+                # which input a vector belongs to is unknown, none can be trusted
+                raise RuntimeError(f"embeddings call returned {len(vectors)} vectors for {len(batch)} inputs")
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+        else:
+            for future, vector in zip(futures, vectors):
+                future.set_result(vector)
+
+    def stats(self):
+        return {'calls': self.calls, 'queries': self.queries}
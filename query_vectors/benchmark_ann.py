@@ -0,0 +1,65 @@
+# Recall and latency of the IVF index against exact search, on the exported collection.
+#
+#   python -m query_vectors.benchmark_ann [collection]
+#
+# Queries are stored vectors with some noise added, filtered on the partition fields of the row they
+# came from, as the policy positions page filters on parliament and party. Runs on the latest export in
+# LOCAL_INDEX_DIR, or exports the current version from Zilliz first when ZILLIZ_URI is set.
+
+import os
+import sys
+import time
+
+import numpy as np
+from pymilvus import MilvusClient
+
+from utils import policy_positions_rag_collection, top_k_rag_policy_positions, ann_partition_fields
+from .ann_index import get_ann_index
+from .local_index import cell, get_local_index
+
+n_queries = 200
+noise = 0.5
+nprobes = [1, 2, 4, 8, 16, 32]
+
+
+def timed_search(index, queries, filters, **kwargs):
+    results = []
+    seconds = []
+    for query, query_filters in zip(queries, filters):
+        start = time.perf_counter()
+        results.append(index.search([query], query_filters, top_k_rag_policy_positions, **kwargs)[0])
+        seconds.append(time.perf_counter() - start)
+    return results, np.array(seconds) * 1000
+
+
+def benchmark(query_collection):
+    # without Zilliz credentials the most recent export in LOCAL_INDEX_DIR is used
+    client = None
+    if os.environ.get("ZILLIZ_URI"):
+        client = MilvusClient(uri=os.environ.get("ZILLIZ_URI"), token=os.environ.get("ZILLIZ_API_KEY"))
+    exact_index = get_local_index(query_collection, client)
+    ann_index = get_ann_index(query_collection, client)
+    print(f"{query_collection}: {len(exact_index)} rows, {len(ann_index.partition_lists) - 1} partitions, "
+          f"{len(ann_index.centroids)} clusters")
+
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(exact_index), size=min(n_queries, len(exact_index)), replace=False)
+    dimension = exact_index.vectors.shape[1]
+    queries = exact_index.vectors[rows] + rng.normal(scale=noise / np.sqrt(dimension), size=(len(rows), dimension))
+    filters = [{field: cell(exact_index.metadata[field], row) for field in ann_partition_fields[query_collection]}
+               for row in rows]
+
+    exact, exact_ms = timed_search(exact_index, queries, filters)
+    print(f"{'exact':>8}  recall 1.000  mean {exact_ms.mean():6.2f} ms  p95 {np.percentile(exact_ms, 95):6.2f} ms")
+
+    for nprobe in nprobes:
+        approximate, ann_ms = timed_search(ann_index, queries, filters, nprobe=nprobe)
+        recall = np.mean([
+            len({i['id'] for i in a} & {i['id'] for i in e}) / len(e)
+            for a, e in zip(approximate, exact) if e
+        ])
+        print(f"nprobe {nprobe:>2}  recall {recall:.3f}  mean {ann_ms.mean():6.2f} ms  p95 {np.percentile(ann_ms, 95):6.2f} ms")
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else policy_positions_rag_collection)
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# on-disk stores shared by all gunicorn workers on the instance
+query_cache_dir = os.environ.get('QUERY_CACHE_DIR', '/tmp/dash-query-cache')
+
+embedding_cache_max_entries = int(os.environ.get('EMBEDDING_CACHE_MAX_ENTRIES', 50000))
+embedding_cache_ttl_seconds = int(os.environ.get('EMBEDDING_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+
+response_cache_max_entries = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 5000))
+response_cache_ttl_seconds = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+
+
+def normalize_query(query):
+    # case and whitespace differences should not cost another embedding call
+    return ' '.join(query.split()).casefold()
+
+
+class SQLiteStore:
+    # one sqlite file per store, one connection per thread; WAL lets workers read while another writes.
+    # Entries expire after ttl_seconds and the least recently used beyond max_entries are evicted.
+    schema = ""
+    table = ""
+
+    def __init__(self, path, max_entries, ttl_seconds):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # per-process counters
+        self.hits = 0
+        self.misses = 0
+        self._sets = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(self.schema)
+            self._local.connection = connection
+        return connection
+
+    def _inserted(self):
+        # trim every so often rather than on every insert
+        self._sets += 1
+        if self._sets % 100 == 1:
+            self.evict()
+
+    def evict(self):
+        connection = self._connection()
+        connection.execute(f"DELETE FROM {self.table} WHERE created < ?", (time.time() - self.ttl_seconds,))
+        connection.execute(
+            f"DELETE FROM {self.table} WHERE rowid IN (SELECT rowid FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        entries = self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'entries': entries
+        }
+
+
+class EmbeddingCache(SQLiteStore):
+    # query embeddings keyed by (normalized query, model), stored as float32 blobs with LRU + TTL eviction
+    schema = """
+        CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            query TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (model, query)
+        );
+        CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+    """
+    table = "embeddings"
+
+    def __init__(self, path, max_entries=embedding_cache_max_entries, ttl_seconds=embedding_cache_ttl_seconds):
+        super().__init__(path, max_entries, ttl_seconds)
+
+    def get(self, query, model, count=True):
+        # count=False for a re-check of a lookup already counted, so the hit rate is per query
+        connection = self._connection()
+        key = normalize_query(query)
+        row = connection.execute(
+            "SELECT vector, created FROM embeddings WHERE model = ? AND query = ?", (model, key)
+        ).fetchone()
+
+        now = time.time()
+        if row is None or now - row[1] > self.ttl_seconds:
+            self.misses += count
+            return None
+
+        connection.execute("UPDATE embeddings SET last_used = ? WHERE model = ? AND query = ?", (now, model, key))
+        self.hits += count
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def set(self, query, model, vector):
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO embeddings (model, query, vector, created, last_used) VALUES (?, ?, ?, ?, ?)",
+            (model, normalize_query(query), np.asarray(vector, dtype=np.float32).tobytes(), now, now)
+        )
+        self._inserted()
+
+
+class ResponseCache(SQLiteStore):
+    # generated answers keyed by a hash of everything that went into the prompt, tagged with the
+    # version of the vector index the evidence was retrieved from
+    schema = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            index_version TEXT,
+            response TEXT NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+    """
+    table = "responses"
+
+    def __init__(self, path, max_entries=response_cache_max_entries, ttl_seconds=response_cache_ttl_seconds):
+        super().__init__(path, max_entries, ttl_seconds)
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+    def get(self, key, index_version=None):
+        # only answers from the same index version match; those of a previous version are no longer read and
+        # leave with the TTL / LRU eviction, so workers still on the old version do not wipe each other's entries
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT response, created FROM responses WHERE key = ? AND index_version IS ?", (key, index_version)
+        ).fetchone()
+
+        now = time.time()
+        if row is None or now - row[1] > self.ttl_seconds:
+            self.misses += 1
+            return None
+
+        connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, response, index_version=None):
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO responses (key, index_version, response, created, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, index_version, json.dumps(response), now, now)
+        )
+        self._inserted()
+
+
+embedding_cache = EmbeddingCache(os.path.join(query_cache_dir, 'embeddings.sqlite'))
+response_cache = ResponseCache(os.path.join(query_cache_dir, 'responses.sqlite'))
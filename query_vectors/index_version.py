@@ -0,0 +1,38 @@
+import time
+
+from utils import index_version_property
+
+# version of a collection's index: the version stamped in its properties when it was last (re-)embedded.
+# Tags cached answers (see cache.ResponseCache) and names the exported index files (see local_index)
+
+index_version_ttl_seconds = 300
+_index_versions = {}
+
+
+def get_index_version(client, query_collection):
+    now = time.time()
+    cached = _index_versions.get(query_collection)
+    if cached and now - cached[1] < index_version_ttl_seconds:
+        return cached[0]
+    try:
+        description = client.describe_collection(query_collection)
+        index_version = (description.get('properties') or {}).get(index_version_property)
+        if not index_version:
+            # unstamped collection: a re-created or resized collection still gets a new version, rows
+            # re-embedded in place do not
+            stats = client.get_collection_stats(query_collection)
+            index_version = f"{description.get('collection_id')}-{stats.get('row_count')}"
+    except Exception:
+        # Milvus unreachable: answers are still keyed by the retrieved summaries themselves and the local
+        # indexes fall back to the latest export
+        index_version = None
+    _index_versions[query_collection] = (index_version, now)
+    return index_version
+
+
+def set_index_version(client, query_collection, index_version=None):
+    # to be called by whatever (re-)embeds a collection, after its rows are written; workers pick the new
+    # version up within index_version_ttl_seconds. MilvusClient 2.3 has no alter_collection of its own
+    index_version = index_version or time.strftime('%Y%m%d%H%M%S')
+    client._get_connection().alter_collection(query_collection, {index_version_property: index_version})
+    return index_version
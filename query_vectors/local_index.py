@@ -0,0 +1,295 @@
+import fcntl
+import glob
+import os
+import re
+import threading
+
+import numpy as np
+
+from utils import local_index_fields, vector_field
+from .index_version import get_index_version
+
+# where collections exported from Milvus are kept for the in-process search backend, one file per
+# collection and index version: <collection>/<version>.flat.npz
+local_index_dir = os.environ.get('LOCAL_INDEX_DIR', '/tmp/dash-vector-index')
+
+# rows per page of the export
+milvus_query_batch = 1000
+
+# index files kept per collection, older versions are deleted when a new one is written
+index_files_to_keep = 2
+
+# infix of the arrays a text column is saved as: meta_<field>.text_data, .text_offsets and .text_valid
+text_array_infix = '.text_'
+
+
+class TextColumn:
+    # the strings of one metadata field as a single UTF-8 buffer plus row offsets, rather than a fixed-width
+    # numpy array padded to its longest value; missing values are flagged in `valid`
+    def __init__(self, data, offsets, valid):
+        self.data = np.asarray(data, dtype=np.uint8)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.valid = np.asarray(valid, dtype=bool)
+
+    @classmethod
+    def from_values(cls, values):
+        values = list(values)
+        encoded = [b'' if value is None else str(value).encode() for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets, [value is not None for value in values])
+
+    def __len__(self):
+        return len(self.valid)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if not self.valid[key]:
+                return None
+            return self.data[self.offsets[key]:self.offsets[key + 1]].tobytes().decode()
+        return TextColumn.from_values([self[int(i)] for i in np.arange(len(self))[key]])
+
+    def __eq__(self, value):
+        # boolean mask of the rows equal to `value`, like comparing a numpy array
+        mask = np.zeros(len(self), dtype=bool)
+        if not isinstance(value, str):
+            return mask
+        encoded = np.frombuffer(value.encode(), dtype=np.uint8)
+        candidates = np.flatnonzero(self.valid & (np.diff(self.offsets) == len(encoded)))
+        if len(encoded):
+            characters = self.data[self.offsets[candidates, None] + np.arange(len(encoded))]
+            candidates = candidates[(characters == encoded).all(axis=1)]
+        mask[candidates] = True
+        return mask
+
+    __hash__ = None
+
+    def tolist(self):
+        return [self[i] for i in range(len(self))]
+
+    def arrays(self):
+        return {'data': self.data, 'offsets': self.offsets, 'valid': self.valid}
+
+
+def as_column(values):
+    # metadata values as held by the index: text as a TextColumn, anything else as a numpy array with
+    # missing numbers as nan, so nothing becomes an object array that np.load(allow_pickle=False) refuses
+    if isinstance(values, TextColumn) or (isinstance(values, np.ndarray) and values.dtype.kind not in 'OUS'):
+        return values
+    values = list(values)
+    if any(isinstance(value, (str, bytes)) for value in values):
+        return TextColumn.from_values(value.decode() if isinstance(value, bytes) else value for value in values)
+    if any(value is None for value in values):
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    return np.asarray(values)
+
+
+def cell(values, position):
+    # one value of a column as a plain Python object
+    value = values[position]
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def column_arrays(prefix, columns):
+    arrays = {}
+    for field, values in columns.items():
+        if isinstance(values, TextColumn):
+            arrays.update({f"{prefix}{field}{text_array_infix}{part}": array for part, array in values.arrays().items()})
+        else:
+            arrays[prefix + field] = values
+    return arrays
+
+
+class LocalVectorIndex:
+    # one collection held in RAM: a contiguous float32 matrix of unit vectors plus per-field filter bitmaps,
+    # searched with NumPy dot products and returning results shaped like MilvusClient.search
+    def __init__(self, ids, vectors, metadata):
+        self.ids = np.asarray(ids)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        # cosine similarity becomes a plain dot product
+        self.vectors = vectors / np.where(norms == 0, 1, norms)
+        self.metadata = {field: as_column(values) for field, values in metadata.items()}
+        self._bitmaps = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _bitmap(self, field, value):
+        key = (field, value)
+        bitmap = self._bitmaps.get(key)
+        if bitmap is None:
+            with self._lock:
+                bitmap = self.metadata[field] == value
+                self._bitmaps[key] = bitmap
+        return bitmap
+
+    def candidates(self, filters):
+        # row positions matching every field == value filter, None meaning all rows
+        mask = None
+        for field, value in filters.items():
+            bitmap = self._bitmap(field, value)
+            mask = bitmap if mask is None else mask & bitmap
+        return None if mask is None else np.flatnonzero(mask)
+
+    def _entity(self, position, output_fields):
+        entity = {field: cell(self.metadata[field], position) for field in output_fields if field in self.metadata}
+        if 'id' in output_fields:
+            entity['id'] = self.ids[position].item()
+        return entity
+
+    def _normalized_queries(self, data):
+        queries = np.asarray(data, dtype=np.float32).reshape(len(data), -1)
+        return queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    def _top(self, scores, positions, limit, output_fields):
+        # best `limit` hits of one query among the scored row positions, highest similarity first
+        k = min(limit, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [
+            {
+                'id': self.ids[positions[i]].item(),
+                'distance': float(scores[i]),
+                'entity': self._entity(positions[i], output_fields)
+            }
+            for i in top
+        ]
+
+    def search(self, data, filters=None, limit=10, output_fields=()):
+        queries = self._normalized_queries(data)
+
+        positions = self.candidates(filters or {})
+        vectors = self.vectors if positions is None else self.vectors[positions]
+        if positions is None:
+            positions = np.arange(len(self.ids))
+
+        # one matrix product for all queries in the batch
+        scores = queries @ vectors.T
+        return [self._top(row, positions, limit, output_fields) for row in scores]
+
+    def arrays(self):
+        # everything written to the index file, by array name
+        return {'ids': self.ids, 'vectors': self.vectors, **column_arrays('meta_', self.metadata)}
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **self.arrays())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def prefixed(f, prefix):
+        # columns saved by column_arrays under `prefix`
+        columns, text = {}, {}
+        for name in f.files:
+            if not name.startswith(prefix):
+                continue
+            field = name[len(prefix):]
+            if text_array_infix in field:
+                field, part = field.split(text_array_infix)
+                text.setdefault(field, {})[part] = f[name]
+            else:
+                columns[field] = f[name]
+        columns.update({field: TextColumn(**parts) for field, parts in text.items()})
+        return columns
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            return cls(f['ids'], f['vectors'], cls.prefixed(f, 'meta_'))
+
+    @classmethod
+    def from_milvus(cls, client, query_collection, fields):
+        rows = query_all(client, query_collection, ['id', vector_field] + fields)
+        ids = [row['id'] for row in rows]
+        vectors = np.array([row[vector_field] for row in rows], dtype=np.float32)
+        metadata = {field: as_column(row.get(field) for row in rows) for field in fields}
+        return cls(ids, vectors, metadata)
+
+
+def query_all(client, query_collection, output_fields):
+    # every row of the collection. Milvus caps offset + limit of a plain query, the query iterator pages by
+    # primary key instead; MilvusClient 2.3 has no query_iterator of its own, so it goes through the ORM
+    if hasattr(client, 'query_iterator'):
+        iterator = client.query_iterator(query_collection, batch_size=milvus_query_batch, output_fields=output_fields)
+    else:
+        from pymilvus import Collection
+
+        iterator = Collection(query_collection, using=client._using).query_iterator(
+            batch_size=milvus_query_batch, output_fields=output_fields)
+
+    rows = []
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            rows.extend(batch)
+    finally:
+        iterator.close()
+    return rows
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def local_index_path(query_collection, index_version, kind='flat'):
+    return os.path.join(local_index_dir, query_collection, f"{index_version}.{kind}.npz")
+
+
+def current_index_version(query_collection, client):
+    # version of the collection to serve, as a file name: the one Milvus reports, or when there is no client
+    # or Milvus is unreachable the most recently exported one, so a populated LOCAL_INDEX_DIR works offline
+    index_version = get_index_version(client, query_collection) if client is not None else None
+    if index_version is not None:
+        return re.sub(r'[^\w.-]', '_', index_version)
+
+    exported = glob.glob(local_index_path(query_collection, '*'))
+    if not exported:
+        raise FileNotFoundError(f"{query_collection} has not been exported to {local_index_dir} and Milvus is not reachable")
+    return os.path.basename(max(exported, key=os.path.getmtime)).removesuffix('.flat.npz')
+
+
+def _prune_index_files(path):
+    # older files of the same kind; workers that loaded them hold the arrays in memory, not the file
+    kind = re.search(r'\.\w+\.npz$', path).group()
+    files = sorted(glob.glob(os.path.join(os.path.dirname(path), '*' + kind)), key=os.path.getmtime, reverse=True)
+    for old in files[index_files_to_keep:]:
+        for name in (old, old + '.lock'):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+
+def load_or_build(path, build, load):
+    # only one worker builds a missing index file, the others wait for it and load the result
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.exists(path):
+            build().save(path)
+            _prune_index_files(path)
+    return load(path)
+
+
+def get_local_index(query_collection, client=None):
+    # loaded once per process and index version from the exported file, exported from Milvus first if
+    # there is none for the current version
+    path = local_index_path(query_collection, current_index_version(query_collection, client))
+    loaded = _indexes.get(query_collection)
+    if loaded is not None and loaded[0] == path:
+        return loaded[1]
+
+    with _indexes_lock:
+        if _indexes.get(query_collection, (None,))[0] != path:
+            _indexes[query_collection] = (path, load_or_build(
+                path,
+                lambda: LocalVectorIndex.from_milvus(client, query_collection, local_index_fields[query_collection]),
+                LocalVectorIndex.load
+            ))
+    return _indexes[query_collection][1]
@@ -0,0 +1,127 @@
+import fcntl
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from .cache import query_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# lock files of the computations in flight on this instance, one per key
+single_flight_dir = os.path.join(query_cache_dir, 'flight')
+
+# a worker waits at most this long on another worker's computation before running its own, so a hung
+# leader cannot block every worker
+single_flight_timeout_seconds = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT_SECONDS', 60))
+single_flight_poll_seconds = 0.02
+
+# lock files not used for this long are removed, every cleanup_every computations
+single_flight_stale_seconds = 3600
+cleanup_every = 1000
+
+
+class SingleFlight:
+    # concurrent calls with the same key share one computation: within a worker the first caller runs it and
+    # the others wait on its future; across workers callers queue on a lock file per key, so a worker that
+    # gets the lock after another finished finds the result in the shared caches instead of recomputing it
+    def __init__(self, directory=single_flight_dir, timeout_seconds=single_flight_timeout_seconds):
+        self.directory = directory
+        self.timeout_seconds = timeout_seconds
+        self._calls = {}
+        self._lock = threading.Lock()
+        # per-process counters
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def _acquire(self, lock):
+        # flock has no timeout of its own: poll a non-blocking lock until the deadline
+        deadline = time.monotonic() + self.timeout_seconds
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(single_flight_poll_seconds)
+
+    @contextmanager
+    def _file_lock(self, digest):
+        # the file is never unlinked while in use: a waiter blocked on a removed file and a newcomer locking
+        # its replacement would both run. Unused files are removed by cleanup()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{digest}.lock")
+        with open(path, 'a') as lock:
+            acquired = self._acquire(lock)
+            if acquired:
+                # marks the file as recently used for cleanup()
+                os.utime(path)
+            else:
+                self.timeouts += 1
+                logger.warning("waited %ss on single flight %s, running it without the lock", self.timeout_seconds, digest)
+            try:
+                yield
+            finally:
+                if acquired:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def cleanup(self, stale_seconds=single_flight_stale_seconds):
+        # removes lock files neither held nor used for stale_seconds; a key idle that long racing the removal
+        # costs at most one duplicate computation
+        cutoff = time.time() - stale_seconds
+        for path in glob.glob(os.path.join(self.directory, '*.lock')):
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                with open(path, 'a') as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os.unlink(path)
+            except (BlockingIOError, FileNotFoundError):
+                pass
+
+    def do(self, key, func, across_workers=True):
+        # key must be JSON serializable; func() is expected to check the shared caches first when across_workers
+        digest = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+        with self._lock:
+            future = self._calls.get(digest)
+            leader = future is None
+            if leader:
+                future = self._calls[digest] = Future()
+                self.leaders += 1
+                cleanup = across_workers and self.leaders % cleanup_every == 0
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            if cleanup:
+                self.cleanup()
+            if across_workers:
+                with self._file_lock(digest):
+                    result = func()
+            else:
+                result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[digest]
+
+    def stats(self):
+        return {'leaders': self.leaders, 'coalesced': self.coalesced, 'timeouts': self.timeouts, 'in_flight': len(self._calls)}
+
+
+single_flight = SingleFlight()
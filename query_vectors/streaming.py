@@ -0,0 +1,48 @@
+import json
+import re
+
+
+class PartialJSONFields:
+    # reads the string fields of a JSON object while it is still arriving, e.g. from a streamed completion.
+    # Each feed returns the text decoded so far for every field that has started.
+    def __init__(self, fields):
+        self.buffer = ''
+        self._patterns = {field: re.compile(r'"%s"\s*:\s*"' % re.escape(field)) for field in fields}
+        self._starts = {}
+
+    @staticmethod
+    def _decode(raw):
+        # raw is the escaped body of a string, possibly cut off inside an escape sequence
+        end = 0
+        i = 0
+        while i < len(raw):
+            if raw[i] == '"':
+                break
+            if raw[i] == '\\':
+                length = 6 if raw[i + 1:i + 2] == 'u' else 2
+                # the high half of a surrogate pair waits for the low half, a lone one is not text
+                if length == 6 and raw[i + 2:i + 4].lower() in ('d8', 'd9', 'da', 'db'):
+                    length = 12
+                if i + length > len(raw):
+                    break
+                i += length
+            else:
+                i += 1
+            end = i
+        return json.loads('"' + raw[:end] + '"')
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        values = {}
+        for field, pattern in self._patterns.items():
+            if field not in self._starts:
+                match = pattern.search(self.buffer)
+                if match is None:
+                    continue
+                self._starts[field] = match.end()
+            values[field] = self._decode(self.buffer[self._starts[field]:])
+        return values
+
+    def result(self):
+        # the complete object, once the stream has ended
+        return json.loads(self.buffer)
@@ -0,0 +1,25 @@
+# Embeds a list of queries ahead of time (e.g. popular searches) so users get them from the embedding cache.
+#
+#   python -m query_vectors.warm_embeddings queries.txt
+#
+# One query per line; reads stdin without a file argument.
+
+import sys
+import time
+
+from . import get_vectors_from_queries
+from .cache import embedding_cache
+
+
+def warm(queries):
+    start = time.perf_counter()
+    get_vectors_from_queries(queries)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    lines = open(sys.argv[1]) if len(sys.argv) > 1 else sys.stdin
+    queries = [line.strip() for line in lines if line.strip()]
+    misses = embedding_cache.misses
+    seconds = warm(queries)
+    print(f"{len(queries)} queries, {embedding_cache.misses - misses} embedded in {seconds:.2f}s")
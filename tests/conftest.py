@@ -0,0 +1,44 @@
+import os
+import pickle
+import sys
+import tempfile
+
+import pytest
+
+# the query modules create their clients and cache paths at import time
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+os.environ['QUERY_CACHE_DIR'] = tempfile.mkdtemp(prefix='query-cache-')
+os.environ['LOCAL_INDEX_DIR'] = tempfile.mkdtemp(prefix='vector-index-')
+
+# importing load_data syncs the data snapshot, here from an empty local blob and without the refresher
+os.environ['DATA_SOURCE_DIR'] = tempfile.mkdtemp(prefix='data-source-')
+with open(os.path.join(os.environ['DATA_SOURCE_DIR'], 'dash-datasets'), 'wb') as f:
+    pickle.dump({}, f)
+os.environ['DATA_SNAPSHOT_DIR'] = tempfile.mkdtemp(prefix='data-snapshot-')
+os.environ['DATA_REFRESH_SECONDS'] = '0'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+@pytest.fixture
+def new_worker(monkeypatch):
+    # starts over as a fresh process: no index loaded, the files on disk are kept
+    from query_vectors import local_index, ann_index
+
+    def reset():
+        for module in (local_index, ann_index):
+            monkeypatch.setattr(module, '_indexes', {})
+    return reset
+
+
+@pytest.fixture
+def index_dir(monkeypatch, tmp_path, new_worker):
+    # an empty LOCAL_INDEX_DIR, asking Milvus for the index version on every lookup
+    from query_vectors import index_version, local_index
+
+    monkeypatch.setattr(local_index, 'local_index_dir', str(tmp_path))
+    monkeypatch.setattr(index_version, '_index_versions', {})
+    monkeypatch.setattr(index_version, 'index_version_ttl_seconds', 0)
+    new_worker()
+    return tmp_path
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class StubIterator:
+    def __init__(self, rows, batch_size):
+        self._rows = rows
+        self._batch_size = batch_size
+
+    def next(self):
+        batch, self._rows = self._rows[:self._batch_size], self._rows[self._batch_size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class StubMilvus:
+    # a collection of bill summaries: row i has a one-hot vector on dimension i % dimension
+    def __init__(self, n_rows, version, dimension=8):
+        self.version = version
+        self.exports = 0
+        self.rows = [
+            {'id': f"{i}/2020", 'vector': np.eye(dimension)[i % dimension].tolist(), 'parliament': 12 + i % 3,
+             'policy_positions': f"position {i}"}
+            for i in range(n_rows)
+        ]
+
+    def describe_collection(self, collection_name):
+        return {'collection_id': 1, 'properties': {'data_version': self.version}}
+
+    def query_iterator(self, collection_name, batch_size, output_fields):
+        self.exports += 1
+        return StubIterator([{field: row[field] for field in output_fields} for row in self.rows], batch_size)
+
+    def search(self, collection_name, data, filter, limit, output_fields):
+        # best rows by dot product, filters ignored
+        results = []
+        for query in data:
+            scores = np.array([row['vector'] for row in self.rows]) @ np.resize(np.asarray(query, dtype=float), len(self.rows[0]['vector']))
+            results.append([
+                {'id': self.rows[i]['id'], 'distance': float(scores[i]),
+                 'entity': {field: self.rows[i][field] for field in output_fields}}
+                for i in np.argsort(-scores, kind='stable')[:limit]
+            ])
+        return results
+
+
+def policy_positions_client():
+    # a collection of policy positions, text fields of uneven length, some missing
+    client = StubMilvus(30, 'v1')
+    for i, row in enumerate(client.rows):
+        row.update({'party': None if i % 5 == 0 else ['PAP', 'WP', 'PSP'][i % 3], 'constituency': 'Aljunied' * (i % 4),
+                    'name': f"member {i}", 'policy_positions': 'x' * (i * 50)})
+    return client
+
+
+class UnreachableMilvus:
+    def __getattr__(self, name):
+        raise ConnectionError("Milvus is unreachable")
+
+
+class StubEmbeddings:
+    # stands in for gpt_client.embeddings: a deterministic vector per input, every call recorded.
+    # drop leaves out the last vectors of a response, indexes overrides the returned indexes
+    def __init__(self, drop=0, indexes=None):
+        self.calls = []
+        self.drop = drop
+        self.indexes = indexes
+
+    def create(self, input, model):
+        self.calls.append((list(input), model))
+        # returned out of order, as the API does not promise any
+        data = [SimpleNamespace(index=i, embedding=[float(len(query)), float(i), 1.0]) for i, query in enumerate(input)]
+        if self.indexes is not None:
+            for item, index in zip(data, self.indexes):
+                item.index = index
+        return SimpleNamespace(data=data[:len(data) - self.drop][::-1])
+
+
+class StubChat:
+    # stands in for gpt_client.chat: streams `content` in chunks of `chunk_size` characters. With a gate,
+    # the stream stops after the first `pause_after` chunks until the gate is set
+    def __init__(self, content, chunk_size=8, gate=None, pause_after=2):
+        self.content = content
+        self.chunk_size = chunk_size
+        self.gate = gate
+        self.pause_after = pause_after
+        self.calls = 0
+        self.completions = self
+
+    def create(self, model, messages, response_format, stream):
+        self.calls += 1
+        return self._stream()
+
+    def _stream(self):
+        chunks = [self.content[i:i + self.chunk_size] for i in range(0, len(self.content), self.chunk_size)]
+        for i, chunk in enumerate(chunks):
+            if self.gate is not None and i == self.pause_after:
+                self.gate.wait(5)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))])
+
+
+def stub_openai(embeddings=None, chat=None):
+    return SimpleNamespace(embeddings=embeddings or StubEmbeddings(), chat=chat)
@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pytest
+
+from query_vectors import ann_index
+from query_vectors.ann_index import get_ann_index
+from query_vectors.local_index import local_index_path
+from utils import bill_summaries_rag_collection as collection, policy_positions_rag_collection
+from stubs import StubMilvus, policy_positions_client
+
+pytestmark = pytest.mark.usefixtures('index_dir')
+
+
+def test_built_from_the_whole_collection(monkeypatch):
+    monkeypatch.setattr(ann_index, 'ann_min_partition_rows', 16)
+    client = StubMilvus(300, 'v1')
+    index = get_ann_index(collection, client)
+    assert len(index) == 300
+    assert os.path.exists(local_index_path(collection, 'v1', 'ivf'))
+    # every row of a partition is reachable when all its clusters are probed
+    hits = index.search([np.eye(8)[2]], {'parliament': 13}, limit=300, nprobe=len(index.centroids))[0]
+    assert len(hits) == 100
+
+
+def test_rebuilt_when_the_version_changes(new_worker):
+    client = StubMilvus(40, 'v1')
+    get_ann_index(collection, client)
+    new_worker()
+    get_ann_index(collection, client)
+    assert client.exports == 1
+
+    client.version = 'v2'
+    client.rows[0]['vector'] = np.eye(8)[7].tolist()
+    index = get_ann_index(collection, client)
+    assert client.exports == 2
+    assert os.path.exists(local_index_path(collection, 'v2', 'ivf'))
+    assert index.search([np.eye(8)[7]], {'parliament': 12}, limit=1)[0][0]['id'] == '0/2020'
+
+
+def test_offline_builds_from_the_latest_export(new_worker, index_dir):
+    client = StubMilvus(40, 'v1')
+    get_ann_index(collection, client)
+    os.remove(local_index_path(collection, 'v1', 'ivf'))
+    new_worker()
+    assert len(get_ann_index(collection, None)) == 40
+    assert client.exports == 1
+
+
+def test_text_partition_field_with_missing_values(monkeypatch, new_worker):
+    monkeypatch.setattr(ann_index, 'ann_min_partition_rows', 4)
+    client = policy_positions_client()
+    get_ann_index(policy_positions_rag_collection, client)
+    new_worker()
+    index = get_ann_index(policy_positions_rag_collection, client)
+    assert os.path.exists(local_index_path(policy_positions_rag_collection, 'v1', 'ivf'))
+
+    for party in ('PAP', 'WP', 'PSP'):
+        hits = index.search([np.eye(8)[1]], {'party': party}, limit=30, nprobe=len(index.centroids),
+                            output_fields=['party', 'policy_positions'])[0]
+        rows = {row['id']: row for row in client.rows if row['party'] == party}
+        assert {hit['id'] for hit in hits} == set(rows)
+        assert all(hit['entity']['policy_positions'] == rows[hit['id']]['policy_positions'] for hit in hits)
@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from query_vectors.batching import MicroBatcher
+
+
+class StubEmbedMany:
+    def __init__(self, drop=0, delay=0):
+        self.calls = []
+        self.drop = drop
+        self.delay = delay
+
+    def __call__(self, queries):
+        self.calls.append(list(queries))
+        time.sleep(self.delay)
+        vectors = [[float(len(query))] for query in queries]
+        return vectors[:len(vectors) - self.drop]
+
+
+def test_single_query_is_sent_without_waiting_for_the_window():
+    batcher = MicroBatcher(StubEmbedMany(), window_seconds=5)
+    start = time.monotonic()
+    assert batcher.submit("housing").result(timeout=2) == [7.0]
+    assert time.monotonic() - start < 1
+
+
+def test_queries_arriving_during_a_call_share_the_next_one():
+    embed_many = StubEmbedMany(delay=0.2)
+    batcher = MicroBatcher(embed_many, window_seconds=0.01)
+    first = batcher.submit("a")
+    time.sleep(0.05)
+    # the first call is in flight, these queue up behind it
+    rest = [batcher.submit(query) for query in ["bb", "ccc", "dddd"]]
+    assert [future.result(timeout=2) for future in [first] + rest] == [[1.0], [2.0], [3.0], [4.0]]
+    assert embed_many.calls == [["a"], ["bb", "ccc", "dddd"]]
+
+
+def test_short_response_fails_every_future():
+    batcher = MicroBatcher(StubEmbedMany(drop=1), window_seconds=0.05)
+    futures = [batcher.submit(query) for query in ["a", "b", "c"]]
+    # however the queries were grouped, every caller gets the error and none waits forever
+    for future in futures:
+        with pytest.raises(RuntimeError, match="vectors for"):
+            future.result(timeout=2)
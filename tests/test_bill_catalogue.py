@@ -0,0 +1,38 @@
+import pandas as pd
+
+from utils.bill_catalogue import BillCatalogue, bill_key
+
+
+def bills(rows):
+    return pd.DataFrame(rows, columns=['bill_number', 'parliament', 'title', 'date_introduced', 'date_passed'])
+
+
+def test_newest_first():
+    catalogue = BillCatalogue(bills([
+        ('3/2020', 14, 'c', '2020-03-01', None),
+        ('12/2019', 13, 'b', '2019-12-01', '2020-01-01'),
+        ('10/2020', 14, 'd', '2020-05-01', None),
+    ]))
+    assert catalogue.bill_numbers.tolist() == ['10/2020', '3/2020', '12/2019']
+    assert catalogue.positions(14).tolist() == [0, 1]
+
+
+def test_retabled_bill_is_listed_under_both_parliaments():
+    catalogue = BillCatalogue(bills([
+        ('5/2020', 13, 'first reading', '2020-02-01', None),
+        ('5/2020', 14, 're-tabled', '2020-09-01', '2020-10-01'),
+        ('6/2020', 14, 'other', '2020-09-02', None),
+        ('6/2020', 14, 'repeated row', '2020-09-02', None),
+    ]))
+    assert len(catalogue) == 3
+    assert catalogue.take(catalogue.positions(13))['title'].tolist() == ['first reading']
+    assert catalogue.take(catalogue.positions(14))['title'].tolist() == ['other', 're-tabled']
+
+    # looked up by number, one row per parliament, newest first
+    frame = catalogue.take(catalogue.positions_of(['5/2020', 'missing', '6/2020']))
+    assert frame['title'].tolist() == ['re-tabled', 'first reading', 'other']
+
+    # and by row key, as result sets are kept
+    keys = catalogue.take(catalogue.positions(13)).index.tolist()
+    assert keys == [bill_key('5/2020', 13)]
+    assert catalogue.take(catalogue.positions_of_keys(keys + ['5/2020@12']))['title'].tolist() == ['first reading']
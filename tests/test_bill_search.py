@@ -0,0 +1,41 @@
+import pandas as pd
+
+from utils.bill_catalogue import BillCatalogue
+from utils.bill_search import BillSearchIndex, is_lexical
+
+
+def index():
+    catalogue = BillCatalogue(pd.DataFrame({
+        'bill_number': ['1/2020', '2/2020', '3/2020'],
+        'parliament': [14, 14, 14],
+        'title': ['Housing Development Bill', 'Public Housing Grants Bill', 'Carbon Pricing Bill'],
+        'bill_introduction': ['Amends the housing act', 'Grants for flats', 'Development of carbon credits'],
+        'bill_key_points': ['', '', ''],
+        'bill_impact': ['', '', ''],
+        'date_introduced': ['2020-01-01'] * 3,
+        'date_passed': [None] * 3
+    }))
+    return catalogue, BillSearchIndex(catalogue)
+
+
+def numbers(catalogue, positions):
+    return catalogue.bill_numbers[positions].tolist()
+
+
+def test_unquoted_query_matches_any_term():
+    catalogue, search_index = index()
+    ranked = search_index.search('housing development', catalogue.positions(), 10)
+    assert set(numbers(catalogue, ranked)) == {'1/2020', '2/2020', '3/2020'}
+    assert numbers(catalogue, ranked)[0] == '1/2020'
+
+
+def test_quoted_query_requires_every_term():
+    catalogue, search_index = index()
+    query = '"housing development"'
+    assert is_lexical(query)
+    ranked = search_index.search(query.strip('"'), catalogue.positions(), 10, match_all=True)
+    assert numbers(catalogue, ranked) == ['1/2020']
+
+    # stopwords are ignored, a term found in no bill matches nothing
+    assert numbers(catalogue, search_index.search('the housing', catalogue.positions(), 10, match_all=True)) == ['1/2020', '2/2020']
+    assert len(search_index.search('housing zoning', catalogue.positions(), 10, match_all=True)) == 0
@@ -0,0 +1,131 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import query_vectors
+from utils import embedding_model
+from query_vectors import cache as cache_module
+from query_vectors.cache import EmbeddingCache
+from query_vectors.single_flight import SingleFlight
+from stubs import StubEmbeddings
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def embedding_cache(tmp_path, clock):
+    return EmbeddingCache(str(tmp_path / 'embeddings.sqlite'), max_entries=100, ttl_seconds=60)
+
+
+@pytest.fixture
+def embeddings(monkeypatch, tmp_path, embedding_cache):
+    stub = StubEmbeddings()
+    monkeypatch.setattr(query_vectors, 'gpt_client', SimpleNamespace(embeddings=stub))
+    monkeypatch.setattr(query_vectors, 'embedding_cache', embedding_cache)
+    monkeypatch.setattr(query_vectors, 'embedding_micro_batcher', None)
+    monkeypatch.setattr(query_vectors, 'single_flight', SingleFlight(str(tmp_path / 'flight')))
+    return stub
+
+
+def test_miss_then_hit(embeddings, embedding_cache):
+    first = query_vectors.get_vector_from_query("Housing  policy")
+    assert len(embeddings.calls) == 1
+    assert (embedding_cache.hits, embedding_cache.misses) == (0, 1)
+
+    # same query up to case and whitespace: served from the cache
+    second = query_vectors.get_vector_from_query("housing policy ")
+    assert len(embeddings.calls) == 1
+    assert (embedding_cache.hits, embedding_cache.misses) == (1, 1)
+    assert second == pytest.approx(first)
+    assert embedding_cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'entries': 1}
+
+
+def test_vectors_round_trip_as_float32(embedding_cache):
+    embedding_cache.set("q", "model", [0.1, 0.2, 0.3])
+    vector = embedding_cache.get("q", "model")
+    assert vector.dtype == np.float32
+    assert vector == pytest.approx([0.1, 0.2, 0.3])
+
+
+def test_entries_expire_after_ttl(embeddings, embedding_cache, clock):
+    query_vectors.get_vector_from_query("housing")
+    clock.now += 59
+    query_vectors.get_vector_from_query("housing")
+    assert len(embeddings.calls) == 1
+
+    clock.now += 2
+    assert embedding_cache.get("housing", query_vectors.embedding_model) is None
+    query_vectors.get_vector_from_query("housing")
+    assert len(embeddings.calls) == 2
+
+
+def test_eviction_drops_expired_and_least_recently_used(tmp_path, clock):
+    store = EmbeddingCache(str(tmp_path / 'embeddings.sqlite'), max_entries=2, ttl_seconds=60)
+    store.set("old", "model", [1.0])
+    clock.now += 61
+    store.set("a", "model", [1.0])
+    clock.now += 1
+    store.set("b", "model", [1.0])
+    clock.now += 1
+    store.get("a", "model")
+    clock.now += 1
+    store.set("c", "model", [1.0])
+    store.evict()
+    assert store.stats()['entries'] == 2
+    assert store.get("a", "model") is not None
+    assert store.get("c", "model") is not None
+    assert store.get("b", "model") is None
+
+
+def test_entries_are_keyed_by_model(embeddings, embedding_cache, monkeypatch):
+    query_vectors.get_vector_from_query("housing")
+    monkeypatch.setattr(query_vectors, 'embedding_model', 'other-model')
+    query_vectors.get_vector_from_query("housing")
+    assert [model for _, model in embeddings.calls] == [embedding_model, 'other-model']
+
+    embedding_cache.set("transport", "model-a", [1.0, 2.0])
+    assert embedding_cache.get("transport", "model-b") is None
+    assert embedding_cache.get("transport", "model-a") == pytest.approx([1.0, 2.0])
+
+
+def test_batch_embeds_uncached_queries_once(embeddings, embedding_cache):
+    embedding_cache.set("cached", query_vectors.embedding_model, [9.0, 9.0, 9.0])
+    vectors = query_vectors.get_vectors_from_queries(["cached", "new", "New ", "other"])
+    assert embeddings.calls == [(["new", "other"], query_vectors.embedding_model)]
+    assert vectors[0] == pytest.approx([9.0, 9.0, 9.0])
+    # each vector matches its query although the stub returns them in reverse order
+    assert vectors[1] == vectors[2] == [3.0, 0.0, 1.0]
+    assert vectors[3] == [5.0, 1.0, 1.0]
+
+
+@pytest.mark.parametrize('stub', [StubEmbeddings(drop=1), StubEmbeddings(indexes=[0, 1, 1])], ids=['short', 'bad-index'])
+def test_batch_rejects_a_mismatched_response(monkeypatch, embeddings, embedding_cache, stub):
+    monkeypatch.setattr(query_vectors, 'gpt_client', SimpleNamespace(embeddings=stub))
+    with pytest.raises(RuntimeError, match="vectors for 3 inputs"):
+        query_vectors.get_vectors_from_queries(["a", "b", "c"])
+    # nothing of the rejected response is cached
+    assert embedding_cache.stats()['entries'] == 0
+
+
+def test_micro_batch_rejects_a_short_response(monkeypatch, embeddings, embedding_cache):
+    monkeypatch.setattr(query_vectors, 'gpt_client', SimpleNamespace(embeddings=StubEmbeddings(drop=1)))
+    batcher = query_vectors.MicroBatcher(query_vectors._create_embeddings, window_seconds=0.05)
+    futures = [batcher.submit(query) for query in ["a", "b", "c"]]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="vectors for"):
+            future.result(timeout=2)
+    assert embedding_cache.stats()['entries'] == 0
@@ -0,0 +1,53 @@
+import pytest
+
+import query_vectors
+from query_vectors import index_version
+from query_vectors.cache import ResponseCache
+
+
+class StubMilvus:
+    def __init__(self, properties=None, collection_id=7, row_count=100):
+        self.properties = properties or {}
+        self.collection_id = collection_id
+        self.row_count = row_count
+
+    def describe_collection(self, collection_name):
+        return {'collection_id': self.collection_id, 'properties': dict(self.properties)}
+
+    def get_collection_stats(self, collection_name):
+        return {'row_count': self.row_count}
+
+
+@pytest.fixture(autouse=True)
+def fresh_versions(monkeypatch):
+    monkeypatch.setattr(index_version, '_index_versions', {})
+
+
+def test_stamped_version_is_used():
+    client = StubMilvus({'data_version': '20250101'})
+    assert query_vectors.get_index_version(client, 'collection') == '20250101'
+
+
+def test_unstamped_collection_falls_back_to_id_and_row_count():
+    assert query_vectors.get_index_version(StubMilvus(), 'collection') == '7-100'
+
+
+def test_restamping_changes_the_version_with_the_same_row_count(monkeypatch):
+    client = StubMilvus({'data_version': 'a'})
+    assert query_vectors.get_index_version(client, 'collection') == 'a'
+    client.properties['data_version'] = 'b'
+    # cached until the ttl runs out
+    assert query_vectors.get_index_version(client, 'collection') == 'a'
+    monkeypatch.setattr(index_version, 'index_version_ttl_seconds', 0)
+    assert query_vectors.get_index_version(client, 'collection') == 'b'
+
+
+def test_versions_do_not_evict_each_other(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite'))
+    old_key, new_key = cache.key('q', 'v1'), cache.key('q', 'v2')
+    cache.set(old_key, ['old', ''], 'v1')
+    cache.set(new_key, ['new', ''], 'v2')
+    # a worker still on v1 and one already on v2 both keep their answers
+    assert cache.get(new_key, 'v2') == ['new', '']
+    assert cache.get(old_key, 'v1') == ['old', '']
+    assert cache.get(old_key, 'v2') is None
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+
+import pymilvus
+import pytest
+
+import jobs
+import query_vectors
+from jobs import Job, JobRunner, JobStore
+from query_vectors.cache import EmbeddingCache, ResponseCache
+from query_vectors.single_flight import SingleFlight
+from stubs import StubChat, StubMilvus, stub_openai
+
+answer = {'policy_position': 'The Party\'s position on "housing" is\nsupportive.', 'policy_points': '- build more flats\n- cap prices'}
+
+
+@pytest.fixture(scope='module')
+def policy_positions():
+    # the page creates its Zilliz client at import time
+    original = pymilvus.MilvusClient
+    pymilvus.MilvusClient = lambda **kwargs: StubMilvus(20, 'v1')
+    try:
+        import pages.policy_positions as module
+    finally:
+        pymilvus.MilvusClient = original
+    return module
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.sqlite'))
+
+
+@pytest.fixture
+def runner(store):
+    return JobRunner(store, workers=2, stage_concurrency={'embedding': 1, 'search': 1, 'summary': 1})
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path, policy_positions):
+    # query caches of their own, no micro-batching, and the remote (stub) vector search
+    monkeypatch.setattr(query_vectors, 'embedding_cache', EmbeddingCache(str(tmp_path / 'embeddings.sqlite')))
+    monkeypatch.setattr(query_vectors, 'response_cache', ResponseCache(str(tmp_path / 'responses.sqlite')))
+    monkeypatch.setattr(query_vectors, 'single_flight', SingleFlight(str(tmp_path / 'flight')))
+    monkeypatch.setattr(query_vectors, 'embedding_micro_batcher', None)
+    monkeypatch.setattr(query_vectors, 'vector_search_backend', 'remote')
+
+    def use_chat(chat):
+        monkeypatch.setattr(query_vectors, 'gpt_client', stub_openai(chat=chat))
+        return chat
+    return use_chat
+
+
+def wait_for(runner, job_id, condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = runner.status(job_id)
+        if condition(status):
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"job never reached the expected state: {runner.status(job_id)}")
+
+
+def finished(status):
+    return status['status'] in ('done', 'failed')
+
+
+def test_policy_positions_job_runs_through_every_stage(runner, pipeline, policy_positions):
+    pipeline(StubChat(json.dumps(answer)))
+    job_id = runner.submit(policy_positions.policy_positions_job, 'housing', 14, 'PAP', None, None)
+    status = wait_for(runner, job_id, finished)
+    assert status == {
+        'status': 'done',
+        'stage': None,
+        'stages': ['embedding', 'search', 'summary'],
+        'result': [answer['policy_position'], answer['policy_points']],
+        'error': None
+    }
+
+
+def test_status_reports_the_stage_and_partial_result(runner, pipeline, policy_positions):
+    gate = threading.Event()
+    pipeline(StubChat(json.dumps(answer), chunk_size=24, gate=gate, pause_after=2))
+    job_id = runner.submit(policy_positions.policy_positions_job, 'housing', 14, 'PAP', None, None)
+
+    # the summary is streaming and held after two chunks
+    status = wait_for(runner, job_id, lambda status: status['result'] is not None)
+    assert status['status'] == 'running'
+    assert status['stage'] == 'summary'
+    assert status['stages'] == ['embedding', 'search']
+    position, points = status['result']
+    assert answer['policy_position'].startswith(position) and len(position) < len(answer['policy_position'])
+    assert points == ''
+
+    gate.set()
+    assert wait_for(runner, job_id, finished)['result'] == [answer['policy_position'], answer['policy_points']]
+
+
+def test_failing_job_reports_its_error(runner):
+    def job(job):
+        with job.stage('search'):
+            raise ValueError("search backend down")
+
+    status = wait_for(runner, runner.submit(job), finished)
+    assert status['status'] == 'failed'
+    assert status['error'] == 'search backend down'
+    assert status['stage'] is None
+
+
+def test_stale_running_job_times_out(store, monkeypatch):
+    monkeypatch.setattr(jobs, 'job_timeout_seconds', 0.05)
+    store.create('lost')
+    store.update('lost', status='running', stage='summary')
+    assert store.get('lost')['status'] == 'running'
+    # no heartbeat, e.g. its worker was restarted
+    time.sleep(0.1)
+    assert store.get('lost')['status'] == 'failed'
+    assert store.get('lost')['error'] == 'The request timed out.'
+
+
+def test_stage_releases_its_slot_when_the_body_raises(store):
+    limit = threading.BoundedSemaphore(1)
+    store.create('job')
+    job = Job('job', store, {'search': limit})
+    with pytest.raises(RuntimeError):
+        with job.stage('search'):
+            raise RuntimeError("failed inside the stage")
+    assert job.stages == []
+    assert limit.acquire(blocking=False)
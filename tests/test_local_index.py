@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pytest
+
+import query_vectors
+from query_vectors import local_index
+from query_vectors.local_index import get_local_index, local_index_path
+from utils import bill_summaries_rag_collection as collection, policy_positions_rag_collection
+from stubs import StubMilvus, UnreachableMilvus, policy_positions_client
+
+pytestmark = pytest.mark.usefixtures('index_dir')
+
+
+def test_export_pages_through_the_whole_collection(monkeypatch):
+    monkeypatch.setattr(local_index, 'milvus_query_batch', 7)
+    client = StubMilvus(50, 'v1')
+    index = get_local_index(collection, client)
+    assert len(index) == 50
+    assert sorted(index.ids.tolist()) == sorted(row['id'] for row in client.rows)
+    assert os.path.exists(local_index_path(collection, 'v1'))
+
+
+def test_file_is_reused_until_the_version_changes(new_worker):
+    client = StubMilvus(10, 'v1')
+    get_local_index(collection, client)
+    new_worker()
+    get_local_index(collection, client)
+    assert client.exports == 1
+
+    # re-embedded with the same row count
+    client.version = 'v2'
+    client.rows[0]['vector'] = np.eye(8)[7].tolist()
+    index = get_local_index(collection, client)
+    assert client.exports == 2
+    assert index.search([np.eye(8)[7]], limit=3)[0][0]['id'] == '0/2020'
+
+
+def test_offline_search_uses_the_latest_export(monkeypatch, new_worker):
+    get_local_index(collection, StubMilvus(10, 'v1'))
+    get_local_index(collection, StubMilvus(20, 'v2'))
+
+    for client in (None, UnreachableMilvus()):
+        new_worker()
+        index = get_local_index(collection, client)
+        assert len(index) == 20
+
+    # the search path of the pages, with the local backend and no Milvus at all
+    new_worker()
+    monkeypatch.setattr(query_vectors, 'vector_search_backend', 'local')
+    hits = query_vectors.search_vector(np.eye(8)[3].tolist(), 2, None, collection, 13, output_field=['parliament'])
+    # 19/2020 is the only row of parliament 13 with that vector
+    assert hits[0]['id'] == '19/2020' and hits[0]['distance'] == pytest.approx(1)
+    assert all(hit['entity']['parliament'] == 13 for hit in hits)
+
+
+def test_offline_without_an_export_fails_clearly():
+    with pytest.raises(FileNotFoundError, match="not been exported"):
+        get_local_index(collection, None)
+
+
+def test_old_versions_are_pruned(index_dir):
+    client = StubMilvus(5, 'v1')
+    for version in ['v1', 'v2', 'v3']:
+        client.version = version
+        get_local_index(collection, client)
+        # distinct mtimes, the newest export wins
+        path = local_index_path(collection, version)
+        os.utime(path, (1000 + int(version[1]), 1000 + int(version[1])))
+    assert sorted(os.listdir(index_dir / collection)) == ['v2.flat.npz', 'v2.flat.npz.lock', 'v3.flat.npz', 'v3.flat.npz.lock']
+
+
+def test_text_metadata_with_missing_values_round_trips(new_worker):
+    client = policy_positions_client()
+    get_local_index(policy_positions_rag_collection, client)
+    new_worker()
+    index = get_local_index(policy_positions_rag_collection, client)
+    assert client.exports == 1
+
+    path = local_index_path(policy_positions_rag_collection, 'v1')
+    with np.load(path, allow_pickle=False) as f:
+        # no array padded to the longest text
+        assert not [name for name in f.files if f[name].dtype.kind in 'OU' and name != 'ids']
+
+    fields = ['parliament', 'party', 'constituency', 'name', 'policy_positions']
+    hits = index.search([np.eye(8)[0]], limit=30, output_fields=fields)[0]
+    assert {hit['id']: hit['entity'] for hit in hits} == {row['id']: {field: row[field] for field in fields} for row in client.rows}
+
+    assert sorted(hit['id'] for hit in index.search([np.eye(8)[0]], {'party': 'WP'}, limit=30)[0]) == \
+        sorted(row['id'] for row in client.rows if row['party'] == 'WP')
+    assert {hit['id'] for hit in index.search([np.eye(8)[0]], {'constituency': ''}, limit=30)[0]} == \
+        {row['id'] for row in client.rows if row['constituency'] == ''}
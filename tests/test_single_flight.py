@@ -0,0 +1,67 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+
+from query_vectors.single_flight import SingleFlight
+
+
+def lock_path(flight, key):
+    # the lock file do() uses for key
+    return os.path.join(flight.directory, hashlib.sha256(json.dumps(key).encode()).hexdigest() + '.lock')
+
+
+def test_lock_file_is_kept_after_the_call(tmp_path):
+    flight = SingleFlight(str(tmp_path))
+    assert flight.do(['k'], lambda: 1) == 1
+    assert os.path.exists(lock_path(flight, ['k']))
+
+
+def test_waiter_runs_after_the_leader_releases(tmp_path):
+    # a second worker (its own SingleFlight) queues on the same file instead of running concurrently
+    leader, follower = SingleFlight(str(tmp_path)), SingleFlight(str(tmp_path))
+    running = []
+    started = threading.Event()
+
+    def slow():
+        running.append('leader')
+        started.set()
+        time.sleep(0.2)
+        running.append('leader done')
+
+    thread = threading.Thread(target=leader.do, args=(['k'], slow))
+    thread.start()
+    started.wait()
+    follower.do(['k'], lambda: running.append('follower'))
+    thread.join()
+    assert running == ['leader', 'leader done', 'follower']
+
+
+def test_hung_leader_times_out(tmp_path):
+    flight = SingleFlight(str(tmp_path), timeout_seconds=0.1)
+    os.makedirs(flight.directory, exist_ok=True)
+    with open(lock_path(flight, ['k']), 'a') as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        start = time.monotonic()
+        assert flight.do(['k'], lambda: 'ran anyway') == 'ran anyway'
+        assert time.monotonic() - start < 1
+    assert flight.stats()['timeouts'] == 1
+
+
+def test_cleanup_removes_only_idle_unheld_files(tmp_path):
+    flight = SingleFlight(str(tmp_path))
+    for key in (['idle'], ['held'], ['recent']):
+        flight.do(key, lambda: None)
+    old = time.time() - 7200
+    os.utime(lock_path(flight, ['idle']), (old, old))
+    os.utime(lock_path(flight, ['held']), (old, old))
+
+    with open(lock_path(flight, ['held']), 'a') as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        flight.cleanup()
+
+    assert not os.path.exists(lock_path(flight, ['idle']))
+    assert os.path.exists(lock_path(flight, ['held']))
+    assert os.path.exists(lock_path(flight, ['recent']))
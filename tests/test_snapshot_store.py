@@ -0,0 +1,111 @@
+import itertools
+import os
+import pickle
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from load_data import snapshot_store
+from load_data.snapshot import Snapshot
+from load_data.snapshot_store import LocalSource, read_snapshot, sync_snapshot
+
+
+class CountingSource(LocalSource):
+    def __init__(self, directory, blob_name):
+        super().__init__(directory, blob_name)
+        self.downloads = 0
+
+    def read_bytes(self):
+        self.downloads += 1
+        return super().read_bytes()
+
+
+@pytest.fixture
+def source(tmp_path):
+    (tmp_path / 'source').mkdir()
+    return CountingSource(str(tmp_path / 'source'), 'dash-datasets')
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    # one version name per write, in order, however fast the writes follow each other
+    counter = itertools.count()
+    monkeypatch.setattr(snapshot_store, 'time', SimpleNamespace(strftime=lambda format: f"{next(counter):014d}", time=time.time))
+    return str(tmp_path / 'snapshot')
+
+
+def publish(source, tables):
+    with open(source.path, 'wb') as f:
+        pickle.dump(tables, f)
+
+
+def plain(series):
+    return [None if pd.isna(value) else value for value in series.astype(object)]
+
+
+def tables(n=1):
+    return {
+        'members': pd.DataFrame({
+            'name': [f"member {i}" for i in range(4)],
+            'party': ['PAP', 'WP', None, 'PAP'],
+            'speeches': np.arange(4) * n,
+            'date': pd.to_datetime(['2020-01-01', '2020-06-01', '2021-01-01', '2021-06-01'])
+        }),
+        'parties': ['PAP', 'WP']
+    }
+
+
+def test_round_trip(source, root):
+    publish(source, tables())
+    manifest, readers = sync_snapshot(source, root)
+    snapshot = read_snapshot(root, manifest)
+    readers.close()
+
+    expected = tables()
+    assert snapshot['parties'] == expected['parties']
+    members = snapshot['members']
+    assert list(members.columns) == list(expected['members'].columns)
+    # dtypes change with normalization (categoricals, arrow strings), values do not
+    for column in members.columns:
+        assert plain(members[column]) == plain(expected['members'][column])
+
+
+def test_unchanged_blob_is_not_downloaded_again(source, root):
+    publish(source, tables())
+    manifest, readers = sync_snapshot(source, root)
+    readers.close()
+    again, readers = sync_snapshot(source, root)
+    readers.close()
+    assert source.downloads == 1
+    assert again['version'] == manifest['version']
+
+    publish(source, tables(2))
+    changed, readers = sync_snapshot(source, root)
+    readers.close()
+    assert source.downloads == 2
+    assert changed['version'] != manifest['version']
+
+
+def test_version_with_readers_is_not_pruned(source, root):
+    publish(source, tables(1))
+    held = Snapshot(root, *sync_snapshot(source, root))
+    for n in (2, 3, 4):
+        publish(source, tables(n))
+        manifest, readers = sync_snapshot(source, root)
+        readers.close()
+
+    versions = sorted(i for i in os.listdir(root) if not i.startswith('.') and os.path.isdir(os.path.join(root, i)))
+    # the held version, and the newest versions_to_keep
+    assert versions == sorted([held.version, *versions[-snapshot_store.versions_to_keep:]])
+    assert held.version not in versions[-snapshot_store.versions_to_keep:]
+    assert held['members']['speeches'].tolist() == [0, 1, 2, 3]
+
+    # released, it goes with the next prune
+    del held
+    publish(source, tables(5))
+    sync_snapshot(source, root)[1].close()
+    assert len([i for i in os.listdir(root) if not i.startswith('.') and os.path.isdir(os.path.join(root, i))]) == \
+        snapshot_store.versions_to_keep
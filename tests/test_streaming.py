@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from query_vectors.streaming import PartialJSONFields
+
+fields = ['policy_position', 'policy_points']
+
+
+def feed_split(payload, split):
+    # feeds the payload in two chunks cut at `split`, returning the values after each
+    parser = PartialJSONFields(fields)
+    return parser, parser.feed(payload[:split]), parser.feed(payload[split:])
+
+
+def assert_prefixes(partial, final):
+    for field, value in partial.items():
+        # always valid text, never a cut escape or half a surrogate pair
+        value.encode('utf-8')
+        assert final[field].startswith(value)
+
+
+@pytest.mark.parametrize('text', ['say "no"', 'back\\slash', 'two\nlines', 'café 中'])
+def test_escape_split_across_feeds(text):
+    answer = {'policy_position': text, 'policy_points': '- ' + text}
+    payload = json.dumps(answer, ensure_ascii=True)
+    for split in range(len(payload) + 1):
+        parser, partial, final = feed_split(payload, split)
+        assert_prefixes(partial, answer)
+        assert final == answer
+        assert parser.result() == json.loads(payload)
+
+
+def test_surrogate_pair_split_across_feeds():
+    answer = {'policy_position': 'smile \U0001F600 done', 'policy_points': ''}
+    payload = json.dumps(answer, ensure_ascii=True)
+    assert '\\ud83d\\ude00' in payload
+    for split in range(len(payload) + 1):
+        _, partial, final = feed_split(payload, split)
+        assert_prefixes(partial, answer)
+        assert final == answer
+
+
+def test_key_arriving_in_pieces():
+    parser = PartialJSONFields(fields)
+    assert parser.feed('{"policy_') == {}
+    assert parser.feed('position"') == {}
+    assert parser.feed(' : "ab') == {'policy_position': 'ab'}
+    assert parser.feed('c", "policy_points": ""}') == {'policy_position': 'abc', 'policy_points': ''}
+
+
+def test_result_matches_json_loads_of_the_whole_payload():
+    payload = json.dumps({'policy_position': 'The Party’s "view"\n\tend', 'policy_points': '- a\n- b \\ c'})
+    parser = PartialJSONFields(fields)
+    for i in range(0, len(payload), 3):
+        parser.feed(payload[i:i + 3])
+    assert parser.result() == json.loads(payload)
+    assert parser.feed('') == json.loads(payload)
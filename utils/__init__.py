@@ -24,6 +24,9 @@ ETHNIC_COLOURS = {
 SIZE_MIN = 5
 SIZE_MAX = 40
 
+# scatterplots with more points than this are drawn with WebGL (Scattergl)
+WEBGL_POINT_THRESHOLD = 1000
+
 # Define parliaments
 parliaments = {
     "12th (2011-2015)": '12',
@@ -43,6 +46,13 @@ parliaments_bills = {
     "All": 'All'
 }
 
+# integer parliament code used in every data table (see load_data/normalize.py); 'All' rows are coded 0
+def parliament_code(parliament):
+    return 0 if parliament == 'All' else int(parliament)
+
+# code of rows without a parliament: matched by no parliament dropdown, still counted in unfiltered views
+missing_parliament_code = -1
+
 parliament_parties = {
     '12': ['NMP', 'PAP', 'PSP', 'WP'],
     '13': ['NMP', 'PAP', 'WP'],
@@ -105,9 +115,34 @@ top_k_rag_bill_summaries = 50
 policy_positions_rag_collection = "singapore_speeches_positions"
 bill_summaries_rag_collection = "singapore_bill_summaries"
 
+# collection fields kept by the local (in-process) vector search backend, besides id and vector
+
+vector_field = "vector"
+
+local_index_fields = {
+    policy_positions_rag_collection: ['parliament', 'party', 'constituency', 'name', 'policy_positions'],
+    bill_summaries_rag_collection: ['parliament']
+}
+
+# collection property holding the version of its embeddings; whatever (re-)embeds a collection stamps a new
+# one once the rows are written (see query_vectors.set_index_version)
+
+index_version_property = "data_version"
+
+# the approximate (IVF) index keeps one set of clusters per combination of these fields,
+# so filtered searches only look at the matching partitions
+
+ann_partition_fields = {
+    policy_positions_rag_collection: ['parliament', 'party'],
+    bill_summaries_rag_collection: ['parliament']
+}
+
 # bills page size
 bills_page_size = 10
 
+# bill search result sets kept per worker
+bill_results_max_entries = 128
+
 # policy position thresholds
 position_threshold_low = 70
 position_threshold_high = 2000
@@ -0,0 +1,90 @@
+import numpy as np
+from scipy.signal import fftconvolve
+from scipy.stats import norm
+
+# age density curves of the demographics page, one per (parliament, party) plus 'All', computed once per data
+# snapshot by binning ages onto a shared grid and convolving with the gaussian kernel in a single FFT,
+# instead of fitting and evaluating a gaussian_kde per party on every callback
+
+# shared age grid; integer ages fall exactly on grid points
+age_grid_min = 20
+age_grid_max = 100
+age_grid_step = 0.1
+
+# bandwidth as a fraction of the sample standard deviation, as gaussian_kde(bw_method=0.2)
+age_kde_bw_factor = 0.2
+
+# a party with a single member (or a single distinct age) is drawn as a normal with this standard deviation
+age_single_value_std = 2
+
+# curves extend this far beyond the youngest and oldest member, within the grid
+age_curve_buffer = 15
+
+# the gaussian kernel is truncated at this many bandwidths
+age_kernel_bandwidths = 5
+
+
+class AgeDensity:
+    def __init__(self, ages):
+        # ages: year_age_entered, indexed like the rows of the demographics table
+        ages = np.asarray(ages, dtype=np.float64)
+        lo = min(age_grid_min, np.floor(np.nanmin(ages))) if len(ages) else age_grid_min
+        hi = max(age_grid_max, np.ceil(np.nanmax(ages))) if len(ages) else age_grid_max
+        self.grid = (lo + age_grid_step * np.arange(int(round((hi - lo) / age_grid_step)) + 1)).astype(np.float32)
+        self.grid.flags.writeable = False
+        self._lo = lo
+
+    def _bin(self, ages):
+        # linear binning: each age is split between its two neighbouring grid points
+        position = (ages - self._lo) / age_grid_step
+        left = np.clip(np.floor(position).astype(np.intp), 0, len(self.grid) - 2)
+        weight = np.clip(position - left, 0, 1)
+        counts = np.bincount(left, weights=1 - weight, minlength=len(self.grid))
+        counts += np.bincount(left + 1, weights=weight, minlength=len(self.grid))
+        return counts
+
+    def curve(self, ages):
+        # (x, y) float32 arrays of the density of ages, over [min - buffer, max + buffer] clipped to [20, 100]
+        ages = np.asarray(ages, dtype=np.float64)
+        ages = ages[~np.isnan(ages)]
+        if not len(ages):
+            return None
+
+        start = np.searchsorted(self.grid, max(ages.min() - age_curve_buffer, age_grid_min) - age_grid_step / 2)
+        stop = np.searchsorted(self.grid, min(ages.max() + age_curve_buffer, age_grid_max) + age_grid_step / 2)
+        x = self.grid[start:stop]
+
+        std = ages.std(ddof=1) if len(ages) > 1 else 0
+        if std == 0:
+            # kde not possible with a single value
+            y = norm.pdf(x, loc=ages[0], scale=age_single_value_std)
+        else:
+            bandwidth = age_kde_bw_factor * std
+            half_width = int(np.ceil(age_kernel_bandwidths * bandwidth / age_grid_step))
+            kernel = norm.pdf(age_grid_step * np.arange(-half_width, half_width + 1), scale=bandwidth)
+            density = fftconvolve(self._bin(ages), kernel, mode='same') / len(ages)
+            y = np.clip(density[start:stop], 0, None)
+
+        y = y.astype(np.float32)
+        y.flags.writeable = False
+        return x, y
+
+
+def build_age_densities(df):
+    # {parliament: [(party, x, y), ...]} with parties in order of appearance and 'All' last
+    engine = AgeDensity(df['year_age_entered'])
+    densities = {}
+    for parliament, parliament_df in df.groupby('parliament', sort=False, observed=True):
+        curves = []
+        for party in list(parliament_df['member_party'].unique()) + ['All']:
+            ages = parliament_df['year_age_entered'] if party == 'All' else \
+                parliament_df.loc[parliament_df['member_party'] == party, 'year_age_entered']
+            curve = engine.curve(ages)
+            if curve is not None:
+                curves.append((party, *curve))
+        densities[int(parliament)] = curves
+    return densities
+
+
+def get_age_densities(data):
+    return data.derived('age_densities', lambda snapshot: build_age_densities(snapshot['demographics']))
@@ -0,0 +1,84 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# the bills table typed, sorted (newest first) and indexed once per data snapshot, so searches
+# select rows by position instead of re-parsing and re-sorting the shared table
+
+def bill_key(bill_number, parliament):
+    # identifies a row of the catalogue, e.g. '5/2020@14'
+    return f"{bill_number}@{parliament}"
+
+
+class BillCatalogue:
+    def __init__(self, df):
+        number_year = df['bill_number'].str.split(r'/', expand=True).astype(int)
+        bills = pd.DataFrame({
+            **{column: df[column] for column in df.columns},
+            'parliament': pd.Categorical(df['parliament']),
+            'number': number_year[0].astype(np.int32),
+            'year': number_year[1].astype(np.int16),
+            'date_introduced': pd.to_datetime(df['date_introduced'], errors='coerce'),
+            'date_passed': pd.to_datetime(df['date_passed'], errors='coerce')
+        })
+        # ties on the bill number broken by parliament, newest first
+        order = np.lexsort((-df['parliament'].to_numpy(), -bills['number'].to_numpy(), -bills['year'].to_numpy()))
+        bills = bills.take(order)
+
+        # a bill re-tabled in a later parliament can keep its number, so a bill is listed once per
+        # (bill number, parliament) and rows are keyed by both; only exact repeats of that pair are dropped
+        duplicated = bills.duplicated(['bill_number', 'parliament'], keep='first').to_numpy()
+        if duplicated.any():
+            logger.warning("dropping %d repeated rows of bills: %s", duplicated.sum(),
+                           ', '.join(bills['bill_number'][duplicated].unique()[:10]))
+            bills = bills[~duplicated]
+        bills = bills.set_index(pd.Index(
+            [bill_key(number, parliament) for number, parliament in zip(bills['bill_number'], bills['parliament'])],
+            name='bill_key'
+        ))
+
+        self._bills = bills
+        self._parliament_codes = bills['parliament'].cat.codes.to_numpy()
+        self._parliaments = bills['parliament'].cat.categories
+        self.bill_numbers = pd.Index(bills['bill_number'])
+        self.keys = bills.index
+
+        # positions grouped by bill number, each group newest parliament first
+        codes, numbers = pd.factorize(self.bill_numbers)
+        self._numbers = pd.Index(numbers)
+        self._by_number = np.argsort(codes, kind='stable')
+        self._number_offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(numbers)))))
+
+    def __len__(self):
+        return len(self._bills)
+
+    def positions(self, parliament=None):
+        # positions of the bills of one parliament (all bills for None), newest first
+        if parliament is None:
+            return np.arange(len(self._bills))
+        if parliament not in self._parliaments:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(self._parliament_codes == self._parliaments.get_loc(parliament))
+
+    def positions_of(self, bill_numbers):
+        # positions of the given bills in the given order, skipping unknown ones; a re-tabled bill gives a
+        # row per parliament, callers narrow them down to the positions they list
+        codes = self._numbers.get_indexer(bill_numbers)
+        slices = [self._by_number[self._number_offsets[i]:self._number_offsets[i + 1]] for i in codes if i >= 0]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.intp)
+
+    def positions_of_keys(self, keys):
+        # positions of the given rows (see bill_key) in the given order, skipping unknown ones
+        positions = self.keys.get_indexer(keys)
+        return positions[positions >= 0]
+
+    def take(self, positions):
+        # always a new frame: the catalogue's own frame is never handed out, so callbacks cannot race on it
+        return self._bills.take(positions)
+
+
+def get_bill_catalogue(data):
+    return data.derived('bill_catalogue', lambda snapshot: BillCatalogue(snapshot['bill_summaries']))
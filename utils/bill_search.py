@@ -0,0 +1,115 @@
+import os
+import re
+
+import numpy as np
+from scipy import sparse
+
+from utils.bill_catalogue import get_bill_catalogue
+
+# 'vector' searches the bill summaries collection only, 'lexical' the local BM25 index only,
+# 'hybrid' fuses both rankings (falling back to lexical if the vector search fails)
+bill_search_mode = os.environ.get('BILL_SEARCH_MODE', 'hybrid')
+
+# fields indexed for lexical search, with the weight of a term occurrence in each
+bill_search_fields = {'title': 3.0, 'bill_introduction': 1.0, 'bill_key_points': 1.0, 'bill_impact': 1.0}
+
+# BM25 parameters
+bm25_k1 = 1.2
+bm25_b = 0.75
+
+# reciprocal rank fusion constant
+rrf_k = 60
+
+stopwords = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into', 'is', 'it', 'its', 'of', 'on',
+    'or', 'that', 'the', 'this', 'to', 'was', 'which', 'will', 'with'
+}
+
+bill_number_pattern = re.compile(r'\b(\d{1,3})\s*/\s*(\d{4})\b')
+token_pattern = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return [i for i in token_pattern.findall(str(text).lower()) if i not in stopwords]
+
+
+def bill_numbers_in(query):
+    # bill numbers written as e.g. "12/2020"
+    return [f"{number}/{year}" for number, year in bill_number_pattern.findall(query)]
+
+
+def is_lexical(query):
+    # a quoted query asks for the words themselves, e.g. a statute name
+    query = query.strip()
+    return len(query) > 1 and query[0] == query[-1] == '"'
+
+
+class BillSearchIndex:
+    # BM25 over the text fields of the bill catalogue. Document term weights are precomputed into a sparse
+    # term x bill matrix, so a query is the sum of a few of its rows. Rows are aligned with catalogue positions.
+    def __init__(self, catalogue):
+        bills = catalogue.take(catalogue.positions())
+        vocabulary = {}
+        rows, columns, counts = [], [], []
+        lengths = np.zeros(len(bills))
+
+        for field, weight in bill_search_fields.items():
+            for position, text in enumerate(bills[field].fillna('')):
+                tokens = tokenize(text)
+                lengths[position] += weight * len(tokens)
+                for token in tokens:
+                    rows.append(vocabulary.setdefault(token, len(vocabulary)))
+                    columns.append(position)
+                    counts.append(weight)
+
+        # duplicate (term, bill) entries are summed into field-weighted term frequencies
+        tf = sparse.csr_matrix((counts, (rows, columns)), shape=(len(vocabulary), len(bills)), dtype=np.float32)
+        tf.sum_duplicates()
+
+        document_frequency = np.diff(tf.indptr)
+        idf = np.log(1 + (len(bills) - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        norms = (bm25_k1 * (1 - bm25_b + bm25_b * lengths / max(lengths.mean(), 1))).astype(np.float32)
+
+        term_rows = np.repeat(np.arange(len(vocabulary)), document_frequency)
+        tf.data = idf[term_rows] * tf.data * (bm25_k1 + 1) / (tf.data + norms[tf.indices])
+
+        self._weights = tf
+        self._vocabulary = vocabulary
+
+    def _terms(self, query):
+        # vocabulary rows of the distinct query terms, None if a term appears in no bill
+        terms = [self._vocabulary.get(i) for i in set(tokenize(query))]
+        return None if None in terms else terms
+
+    def scores(self, query):
+        terms = [self._vocabulary[i] for i in set(tokenize(query)) if i in self._vocabulary]
+        if not terms:
+            return np.zeros(self._weights.shape[1], dtype=np.float32)
+        return np.asarray(self._weights[terms].sum(axis=0)).ravel()
+
+    def search(self, query, positions, limit, match_all=False):
+        # best matching catalogue positions among `positions`, best first: bills sharing a term with the query,
+        # or with match_all (quoted queries) only bills containing every term of it
+        scores = self.scores(query)[positions]
+        if match_all:
+            terms = self._terms(query)
+            if not terms:
+                return positions[:0]
+            matched_terms = np.asarray((self._weights[terms] > 0).sum(axis=0)).ravel()[positions]
+            scores = np.where(matched_terms == len(terms), scores, 0)
+        matches = np.flatnonzero(scores > 0)
+        order = matches[np.argsort(-scores[matches], kind='stable')][:limit]
+        return positions[order]
+
+
+def fuse_rankings(rankings, limit):
+    # reciprocal rank fusion of several ranked lists of positions
+    scores = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking):
+            scores[position] = scores.get(position, 0) + 1 / (rrf_k + rank + 1)
+    return np.array(sorted(scores, key=lambda i: -scores[i])[:limit], dtype=np.intp)
+
+
+def get_bill_search_index(data):
+    return data.derived('bill_search_index', lambda snapshot: BillSearchIndex(get_bill_catalogue(snapshot)))
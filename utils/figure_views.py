@@ -0,0 +1,52 @@
+import dash_bootstrap_components as dbc
+import plotly.io as pio
+from dash import dcc, Input, Output, State, ClientsideFunction
+
+from utils import PARTY_COLOURS
+
+# charts with several views of the same data (e.g. percentage and count) are sent to the browser once as
+# aggregated arrays in a dcc.Store; the figure of the selected view is built client side by
+# assets/figure_views.js, instead of shipping every view's traces in one figure and hiding all but one
+
+figure_template = 'plotly_white'
+
+
+def view_toggle(id, options, value):
+    # button group choosing the view of a chart
+    return dbc.RadioItems(
+        id=id,
+        options=[{'label': label, 'value': view} for view, label in options.items()],
+        value=value,
+        className="btn-group btn-group-sm",
+        inputClassName="btn-check",
+        labelClassName="btn btn-outline-primary",
+        labelCheckedClassName="active"
+    )
+
+
+def template_store(id):
+    # the plotly template, sent once with the page layout rather than inside every figure
+    return dcc.Store(id=id, data=pio.templates[figure_template].to_plotly_json())
+
+
+def register_figure_view(app, graph_id, store_id, toggle_id, template_id, function_name):
+    app.clientside_callback(
+        ClientsideFunction(namespace='figure_views', function_name=function_name),
+        Output(graph_id, 'figure'),
+        [Input(store_id, 'data'),
+        Input(toggle_id, 'value')],
+        State(template_id, 'data')
+    )
+
+
+def bar_view_data(categories, parties, title, category_title, value_titles, hover_labels):
+    # categories: axis labels; parties: per party its name and, aligned, category positions and counts.
+    # Percentages of each party's total and the category order are derived in the browser.
+    return {
+        'title': title,
+        'category_title': category_title,
+        'value_titles': value_titles,
+        'hover_labels': hover_labels,
+        'categories': categories,
+        'parties': [{**party, 'colour': PARTY_COLOURS.get(party['name'])} for party in parties]
+    }
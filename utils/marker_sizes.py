@@ -0,0 +1,30 @@
+import numpy as np
+
+from utils import member_metrics_options, SIZE_MIN, SIZE_MAX
+
+# marker sizes of the scatter pages, scaled once per data snapshot for every metric in member_metrics_options
+# instead of row by row on each callback
+
+def scale_marker_sizes(values, size_min=SIZE_MIN, size_max=SIZE_MAX):
+    # linear scaling of values onto [size_min, size_max] over their whole range; missing values stay NaN
+    values = np.asarray(values, dtype=np.float64)
+    min_val, max_val = np.nanmin(values), np.nanmax(values)
+    if max_val == min_val:
+        sizes = np.full(len(values), (size_min + size_max) / 2)
+        sizes[np.isnan(values)] = np.nan
+    else:
+        sizes = size_min + (values - min_val) / (max_val - min_val) * (size_max - size_min)
+    return sizes.astype(np.float32)
+
+
+def get_marker_sizes(data, table):
+    # metric -> float32 sizes aligned with the rows of data[table]
+    def build(snapshot):
+        df = snapshot[table]
+        sizes = {}
+        for column in member_metrics_options.values():
+            if column in df.columns and df[column].notna().any():
+                sizes[column] = scale_marker_sizes(df[column])
+                sizes[column].flags.writeable = False
+        return sizes
+    return data.derived(('marker_sizes', table), build)
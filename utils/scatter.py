@@ -0,0 +1,16 @@
+import plotly.graph_objects as go
+
+from utils import WEBGL_POINT_THRESHOLD
+
+# scatter traces that stay light on the client: WebGL above a point threshold, and hover text
+# rendered by the browser from customdata instead of one concatenated string per point
+
+def scatter_trace(n_points):
+    # trace class for a figure showing n_points markers
+    return go.Scattergl if n_points > WEBGL_POINT_THRESHOLD else go.Scatter
+
+
+def hovertemplate(lines):
+    # lines of (label, plotly value reference), e.g. ("Member", "%{customdata[0]}")
+    # <extra></extra> hides the trace name box, as with hoverinfo='text'
+    return "<br>".join(f"{label}: {value}" for label, value in lines) + "<extra></extra>"
@@ -0,0 +1,74 @@
+import pandas as pd
+
+# parliament -> party -> constituency -> member lookups behind the dropdown cascades,
+# built once per data snapshot instead of filtering the full table on every dropdown change
+
+def _options(values):
+    return [{'label': i, 'value': i} for i in values]
+
+
+class SelectionIndex:
+    def __init__(self, df):
+        rows = df[['parliament', 'member_party', 'member_constituency', 'member_name']].drop_duplicates()
+
+        parties = {}
+        constituencies = {}
+        members = {}
+        constituency_of = {}
+
+        # None stands for "any party" / "any constituency"
+        for parliament, party, constituency, member in rows.itertuples(index=False):
+            if pd.isna(parliament):
+                continue
+            if not pd.isna(party):
+                parties.setdefault(parliament, set()).add(party)
+
+            for party_key in ((None,) if pd.isna(party) else (party, None)):
+                if not pd.isna(constituency):
+                    constituencies.setdefault((parliament, party_key), set()).add(constituency)
+                if pd.isna(member):
+                    continue
+                if not pd.isna(constituency):
+                    # first row wins, as with the previous .iloc[0] lookup
+                    constituency_of.setdefault((parliament, party_key, member), constituency)
+                for constituency_key in ((None,) if pd.isna(constituency) else (constituency, None)):
+                    members.setdefault((parliament, party_key, constituency_key), set()).add(member)
+
+        self._parties = {k: sorted(v) for k, v in parties.items()}
+        self._constituencies = {k: sorted(v) for k, v in constituencies.items()}
+        self._members = {k: sorted(v) for k, v in members.items()}
+        self._constituency_of = constituency_of
+
+        # ready-made option lists, with and without the leading 'All' entry
+        all_option = [{'label': 'All', 'value': 'All'}]
+        self._constituency_options = {k: (all_option + _options(v), _options(v)) for k, v in self._constituencies.items()}
+        self._member_options = {k: (all_option + _options(v), _options(v)) for k, v in self._members.items()}
+        self._empty = (all_option, [])
+
+    @staticmethod
+    def _key(value):
+        return None if value in (None, '', 'All') else value
+
+    def parties(self, parliament):
+        return self._parties.get(parliament, [])
+
+    def constituencies(self, parliament, party=None):
+        return self._constituencies.get((parliament, self._key(party)), [])
+
+    def members(self, parliament, party=None, constituency=None):
+        return self._members.get((parliament, self._key(party), self._key(constituency)), [])
+
+    def constituency_of(self, parliament, member, party=None):
+        return self._constituency_of.get((parliament, self._key(party), member))
+
+    def constituency_options(self, parliament, party=None, all_option=True):
+        options = self._constituency_options.get((parliament, self._key(party)), self._empty)
+        return options[0] if all_option else options[1]
+
+    def member_options(self, parliament, party=None, constituency=None, all_option=True):
+        options = self._member_options.get((parliament, self._key(party), self._key(constituency)), self._empty)
+        return options[0] if all_option else options[1]
+
+
+def get_selection_index(data, table):
+    return data.derived(('selection_index', table), lambda snapshot: SelectionIndex(snapshot[table]))